@@ -0,0 +1,42 @@
+"""
+Бенчмарк расчета расстояний Рай-Такси
+
+Сравнивает поштучный расчет (calculate_distance в цикле) с пакетным
+(calculate_distances) для разного числа водителей вокруг точки заказа.
+
+Запуск:
+    python -m benchmarks.distance
+"""
+
+import random
+import time
+
+from services.price_calculator import PriceCalculator, np
+
+REPEATS = 50
+BATCH_SIZES = (10, 100, 1000, 10000)
+CENTER = (55.7558, 37.6173)
+
+def main():
+    print(f"NumPy: {'да' if np is not None else 'нет'}")
+    print(f"{'водителей':>10} {'по одному, мс':>14} {'пакетом, мс':>12} {'ускорение':>10}")
+    rng = random.Random(42)
+    lat, lon = CENTER
+    for size in BATCH_SIZES:
+        lats = [lat + rng.uniform(-0.1, 0.1) for _ in range(size)]
+        lons = [lon + rng.uniform(-0.1, 0.1) for _ in range(size)]
+        
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            [PriceCalculator.calculate_distance(lat, lon, lat2, lon2) for lat2, lon2 in zip(lats, lons)]
+        scalar_ms = (time.perf_counter() - started) * 1000 / REPEATS
+        
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            PriceCalculator.calculate_distances(lat, lon, lats, lons)
+        batch_ms = (time.perf_counter() - started) * 1000 / REPEATS
+        
+        print(f"{size:>10} {scalar_ms:>14.3f} {batch_ms:>12.3f} {scalar_ms / batch_ms:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Бенчмарк кодирования карт Рай-Такси
+
+Для каждого формата и уровня размера печатает размер файла и время
+кодирования. Карта строится из локальных тайлов вокруг заданной точки,
+а если тайлов нет - используется синтетическая карта.
+
+Запуск:
+    python -m benchmarks.map_encoding [lat lon zoom]
+"""
+
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+from utils.map_renderer import IMAGE_EXTENSIONS, MapRenderer, encode_image
+from utils.maps import MAP_SIZE_TIERS
+
+REPEATS = 10
+QUALITY = 80 # Качество jpeg и webp
+
+def synthetic_map(width: int, height: int) -> Image.Image:
+    """Изображение, похожее на тайлы OSM: фон, кварталы, дороги и подписи"""
+    rng = random.Random(42)
+    image = Image.new('RGB', (width, height), (242, 239, 233))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle((x, y, x + rng.randrange(20, 80), y + rng.randrange(20, 80)), fill=(217, 208, 201))
+    for _ in range(25):
+        points = [(rng.randrange(width), rng.randrange(height)) for _ in range(3)]
+        draw.line(points, fill=rng.choice([(255, 255, 255), (247, 250, 191), (252, 214, 164)]), width=rng.randrange(3, 9))
+    for _ in range(30):
+        draw.text((rng.randrange(width), rng.randrange(height)), "ул. Ленина", fill=(80, 80, 80))
+    return image
+
+def build_image(width: int, height: int, args: list) -> Image.Image:
+    """Карта из тайлов, если они есть, иначе синтетическая"""
+    if len(args) >= 3:
+        lat, lon, zoom = float(args[0]), float(args[1]), int(args[2])
+        image = MapRenderer().compose(
+            lat, lon, zoom, width, height,
+            markers=[(lat, lon, 'red', 'A')], captions=[f"Откуда: {lat:.4f}, {lon:.4f}"]
+        )
+        if image is not None:
+            return image
+        print("⚠️ Нет тайлов для этой точки, используется синтетическая карта")
+    return synthetic_map(width, height)
+
+def main():
+    print(f"{'уровень':<8} {'формат':<6} {'размер, КБ':>11} {'кодирование, мс':>16}")
+    for tier, (width, height) in MAP_SIZE_TIERS.items():
+        image = build_image(width, height, sys.argv[1:])
+        for image_format in IMAGE_EXTENSIONS:
+            started = time.perf_counter()
+            for _ in range(REPEATS):
+                data = encode_image(image, image_format, QUALITY)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / REPEATS
+            print(f"{tier:<8} {image_format:<6} {len(data) / 1024:>11.1f} {elapsed_ms:>16.1f}")
+
+if __name__ == "__main__":
+    main()
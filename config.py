@@ -14,10 +14,45 @@ class Config:
     
     # База данных
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'taxi.db')
+    DB_READER_THREADS = int(os.getenv('DB_READER_THREADS', 2)) # Потоки для SELECT-запросов
+    DB_MAX_PENDING_QUERIES = int(os.getenv('DB_MAX_PENDING_QUERIES', 64)) # Максимум запросов в очереди
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 100)) # Порог медленного запроса (мс)
+    DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 5)) # Ожидание блокировки БД (сек)
+    DB_GROUP_COMMIT_WINDOW_MS = float(os.getenv('DB_GROUP_COMMIT_WINDOW_MS', 10)) # Окно групповой фиксации (0 - выкл.)
+    DB_GROUP_COMMIT_MAX_BATCH = int(os.getenv('DB_GROUP_COMMIT_MAX_BATCH', 32)) # Максимум фиксаций в пакете
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256)) # Кэш скомпилированных запросов на соединение
+    
+    # Настройки SQLite (PRAGMA для каждого соединения)
+    DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+    DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+    DB_WRITER_SYNCHRONOUS = os.getenv('DB_WRITER_SYNCHRONOUS', 'FULL') # Писатель: FULL - фиксация пакета ждет fsync WAL
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 32 * 1024 * 1024)) # Окно memory-mapped I/O (байт)
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 8192)) # Кэш страниц на соединение (КБ)
+    DB_TEMP_STORE = os.getenv('DB_TEMP_STORE', 'MEMORY')
     
     # Карты
     MAP_LINK_BASE_URL = os.getenv('MAP_LINK_BASE_URL', 'https://yandex.ru/maps/') # Base URL for Yandex Maps links
     NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+    MAP_TILES_DIR = os.getenv('MAP_TILES_DIR', 'static/tiles') # Папка с тайлами OSM {zoom}/{x}/{y}.png
+    MAP_TILE_URL = os.getenv('MAP_TILE_URL', 'https://tile.openstreetmap.org/{z}/{x}/{y}.png') # Источник тайлов для python -m utils.map_renderer
+    MAP_TILE_CACHE_SIZE = int(os.getenv('MAP_TILE_CACHE_SIZE', 128)) # Декодированных тайлов в памяти
+    MAP_RENDER_MODE = os.getenv('MAP_RENDER_MODE', 'thread') # Пул отрисовки карт: thread или process
+    MAP_RENDER_WORKERS = int(os.getenv('MAP_RENDER_WORKERS', 2)) # Рабочих в пуле отрисовки карт
+    MAP_RENDER_QUEUE_LIMIT = int(os.getenv('MAP_RENDER_QUEUE_LIMIT', 8)) # Карт в очереди, сверх этого ответ без карты
+    MAP_IMAGE_FORMAT = os.getenv('MAP_IMAGE_FORMAT', 'png8') # Формат карт: png, png8 (палитра), jpeg, webp
+    MAP_IMAGE_QUALITY = int(os.getenv('MAP_IMAGE_QUALITY', 80)) # Качество jpeg/webp (1-100)
+    MAP_SIZE_TIER = os.getenv('MAP_SIZE_TIER', 'auto') # Размер карт: high, medium, low или auto (по скорости загрузки)
+    MAP_CACHE_PRECISION = int(os.getenv('MAP_CACHE_PRECISION', 4)) # Знаков после запятой в координатах ключа кэша карт (~10 м)
+    MAP_CACHE_MAX_ROWS = int(os.getenv('MAP_CACHE_MAX_ROWS', 5000)) # Максимум file_id карт в БД
+    GEOCODER_TIMEOUT = float(os.getenv('GEOCODER_TIMEOUT', 5)) # Таймаут запроса к геокодеру (сек)
+    GEOCODER_MAX_CONCURRENT = int(os.getenv('GEOCODER_MAX_CONCURRENT', 4)) # Одновременных запросов к геокодеру
+    GEOCODER_RATE_LIMIT = float(os.getenv('GEOCODER_RATE_LIMIT', 1.0)) # Запросов в секунду к одному хосту (политика Nominatim)
+    GAZETTEER_MIN_SCORE = float(os.getenv('GAZETTEER_MIN_SCORE', 0.8)) # Минимальное сходство для нечеткого поиска в справочнике адресов
+    AUTOCOMPLETE_SUGGESTIONS = int(os.getenv('AUTOCOMPLETE_SUGGESTIONS', 5)) # Подсказок адреса в одном сообщении
+    AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv('AUTOCOMPLETE_MAX_ENTRIES', 5000)) # Максимум адресов в индексе подсказок
+    ROUTING_GRAPH_PATH = os.getenv('ROUTING_GRAPH_PATH', 'data/road_graph.bin') # Дорожный граф (python -m services.routing extract.osm)
+    ROUTING_MAX_SNAP_M = float(os.getenv('ROUTING_MAX_SNAP_M', 500)) # Максимальное расстояние от точки до дороги (м)
+    ROUTING_CACHE_SIZE = int(os.getenv('ROUTING_CACHE_SIZE', 1000)) # Маршрутов в кэше
     MAP_WIDTH = 600 # Still used for optimal zoom calculation, but not for Yandex link
     MAP_HEIGHT = 400 # Still used for optimal zoom calculation, but not for Yandex link
     MAP_ZOOM = 14 # Default zoom for Yandex links
@@ -28,6 +63,16 @@ class Config:
     MINIMUM_FARE = int(os.getenv('MINIMUM_FARE', 50))
     DELIVERY_BASE_FARE = int(os.getenv('DELIVERY_BASE_FARE', 80))
     
+    # Зоны города (цены между зонами из заранее посчитанной матрицы)
+    ZONE_BBOX = os.getenv('ZONE_BBOX', '') # Границы города: min_lat,min_lon,max_lat,max_lon (пусто - зоны отключены)
+    ZONE_CELL_KM = float(os.getenv('ZONE_CELL_KM', 1.0)) # Размер зоны (км)
+    
+    # Повышенный спрос (коэффициент цены по зонам)
+    SURGE_MAX_MULTIPLIER = float(os.getenv('SURGE_MAX_MULTIPLIER', 2.0)) # Максимальный коэффициент (1 - отключен)
+    SURGE_SENSITIVITY = float(os.getenv('SURGE_SENSITIVITY', 0.25)) # Рост коэффициента на каждый заказ сверх свободных водителей
+    SURGE_WINDOW = int(os.getenv('SURGE_WINDOW', 600)) # Сколько заказ без водителя учитывается в спросе (сек)
+    SURGE_INTERVAL = float(os.getenv('SURGE_INTERVAL', 5)) # Период пересчета коэффициентов (сек)
+    
     # Безопасность
     MAX_REQUESTS_PER_MINUTE = int(os.getenv('MAX_REQUESTS_PER_MINUTE', 30))
     MAX_REQUESTS_PER_HOUR = int(os.getenv('MAX_REQUESTS_PER_HOUR', 300))
@@ -39,11 +84,29 @@ class Config:
     # Кэширование
     CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))
     MAX_CACHE_SIZE = int(os.getenv('MAX_CACHE_SIZE', 100))
+    REVERSE_GEOCODE_CELL_M = float(os.getenv('REVERSE_GEOCODE_CELL_M', 20)) # Размер ячейки кэша адресов по координатам (м)
+    REVERSE_GEOCODE_MAX_ROWS = int(os.getenv('REVERSE_GEOCODE_MAX_ROWS', 10000)) # Максимум адресов по координатам в БД
+    QUOTE_TTL = int(os.getenv('QUOTE_TTL', 300)) # Сколько действует рассчитанная цена поездки (сек)
+    QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', 1000)) # Максимум рассчитанных цен в памяти
+    
+    # Состояния диалогов (FSM)
+    FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', 2)) # Период сохранения состояний в БД (сек)
+    FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 86400)) # Время жизни брошенного диалога (сек)
+    FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', 1000)) # Максимум состояний в памяти
     
     # Уведомления
     NOTIFICATION_TIMEOUT = int(os.getenv('NOTIFICATION_TIMEOUT', 30))
     DRIVER_SEARCH_TIMEOUT = int(os.getenv('DRIVER_SEARCH_TIMEOUT', 120))
     
+    # Поиск водителей
+    DRIVER_INDEX_CELL_KM = float(os.getenv('DRIVER_INDEX_CELL_KM', 1.0)) # Размер ячейки индекса водителей
+    DISPATCH_SEARCH_RADIUS_KM = float(os.getenv('DISPATCH_SEARCH_RADIUS_KM', 15)) # Радиус поиска водителей
+    DISPATCH_MAX_CANDIDATES = int(os.getenv('DISPATCH_MAX_CANDIDATES', 10)) # Максимум водителей для предложения заказа
+    DISPATCH_MODE = os.getenv('DISPATCH_MODE', 'broadcast') # 'broadcast' - волнами сразу нескольким, 'sequential' - по одному
+    DISPATCH_WAVE_SIZE = int(os.getenv('DISPATCH_WAVE_SIZE', 3)) # Водителей в одной волне рассылки
+    DISPATCH_MAX_CONCURRENT = int(os.getenv('DISPATCH_MAX_CONCURRENT', 20)) # Максимум одновременных поисков водителя
+    DISPATCH_MAX_ATTEMPTS = int(os.getenv('DISPATCH_MAX_ATTEMPTS', 3)) # Запусков поиска одного заказа (после перезапусков)
+    
     # Роли пользователей
     USER_ROLES = {
         'client': 'client',
@@ -132,6 +195,27 @@ class Config:
         'main_menu': '🏠 Главное меню'
     }
     
+    @classmethod
+    def get_sqlite_pragmas(cls):
+        """PRAGMA, применяемые к каждому соединению с БД"""
+        return {
+            'journal_mode': cls.DB_JOURNAL_MODE,
+            'synchronous': cls.DB_SYNCHRONOUS,
+            'mmap_size': cls.DB_MMAP_SIZE,
+            # Отрицательное значение cache_size задается в килобайтах
+            'cache_size': -cls.DB_CACHE_SIZE_KB,
+            'temp_store': cls.DB_TEMP_STORE
+        }
+    
+    @classmethod
+    def get_sqlite_writer_pragmas(cls):
+        """PRAGMA соединения-писателя поверх общих"""
+        return {
+            # В WAL при NORMAL фиксация не дожидается записи на диск,
+            # а групповая фиксация обещает вызывающим сохраненные данные
+            'synchronous': cls.DB_WRITER_SYNCHRONOUS
+        }
+    
     @classmethod
     def validate(cls):
         """Проверка корректности конфигурации"""
@@ -0,0 +1,271 @@
+"""
+Асинхронный движок SQLite для Рай-Такси
+
+Все запросы выполняются в отдельных рабочих потоках, поэтому event loop
+бота не блокируется ни на чтении, ни на fsync при подтверждении транзакции.
+Записи идут через единственный поток-писатель (сериализуются), чтения
+распределяются по небольшому пулу потоков-читателей. Каждое соединение
+открывается в режиме WAL, поэтому читатели не блокируют писателя и наоборот.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class QueryResult:
+    """Результат запроса, полностью прочитанный в рабочем потоке"""
+    
+    __slots__ = ('rows', 'rowcount', 'lastrowid', '_position')
+    
+    def __init__(self, rows: List[Any], rowcount: int, lastrowid: Optional[int]):
+        self.rows = rows
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+        self._position = 0
+    
+    def fetchone(self):
+        """Следующая строка результата (как у sqlite3.Cursor)"""
+        if self._position >= len(self.rows):
+            return None
+        row = self.rows[self._position]
+        self._position += 1
+        return row
+    
+    def fetchall(self) -> List[Any]:
+        """Оставшиеся строки результата (как у sqlite3.Cursor)"""
+        rows = self.rows[self._position:]
+        self._position = len(self.rows)
+        return rows
+
+class SQLiteEngine:
+    """Движок, выполняющий запросы SQLite вне event loop"""
+    
+    def __init__(self, db_path: str, reader_threads: int = 2,
+                 max_pending: int = 64, slow_query_ms: float = 100.0,
+                 pragmas: Dict[str, Any] = None, busy_timeout: float = 5.0,
+                 cached_statements: int = 128, writer_pragmas: Dict[str, Any] = None):
+        """
+        Args:
+            db_path: путь к файлу базы данных
+            reader_threads: количество потоков-читателей
+            max_pending: максимум запросов в очереди (back-pressure)
+            slow_query_ms: порог для логирования медленных запросов
+            pragmas: PRAGMA, применяемые к каждому соединению
+            busy_timeout: ожидание блокировки БД в секундах
+            cached_statements: размер кэша скомпилированных запросов
+            writer_pragmas: PRAGMA соединения-писателя, заменяющие общие
+        """
+        self.db_path = db_path
+        self.pragmas = pragmas or {}
+        self.writer_pragmas = writer_pragmas or {}
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.reader_threads = max(1, reader_threads)
+        self.max_pending = max(1, max_pending)
+        self.slow_query_ms = slow_query_ms
+        
+        self._writer = None
+        self._readers = None
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pending = None
+        
+        # Статистика по запросам
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queries': 0,
+            'reads': 0,
+            'writes': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'slow_queries': 0
+        }
+    
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли движок"""
+        return self._writer is not None
+    
+    def start(self):
+        """Запуск рабочих потоков"""
+        if self.is_running:
+            return
+        
+        self._writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='db-writer',
+            initializer=self._init_thread,
+            initargs=(False,)
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=self.reader_threads,
+            thread_name_prefix='db-reader',
+            initializer=self._init_thread,
+            initargs=(True,)
+        )
+        self._pending = asyncio.Semaphore(self.max_pending)
+        
+        # Открываем соединение писателя первым: оно переводит БД в режим WAL
+        # до того, как к ней подключатся читатели
+        self._writer.submit(self._ping).result()
+    
+    async def close(self):
+        """Остановка рабочих потоков и закрытие соединений"""
+        if not self.is_running:
+            return
+        
+        writer, readers = self._writer, self._readers
+        self._writer = None
+        self._readers = None
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, writer.shutdown, True)
+        await loop.run_in_executor(None, readers.shutdown, True)
+        
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Ошибка закрытия соединения с БД: {e}")
+            self._connections.clear()
+    
+    def _open_connection(self, readonly: bool) -> sqlite3.Connection:
+        """Открытие соединения для рабочего потока"""
+        connection = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        # Строки возвращаются обычными кортежами: их разбирают
+        # позиционные преобразователи из database/queries.py
+        connection.row_factory = None
+        
+        # journal_mode сохраняется в файле БД, поэтому его достаточно
+        # включить на соединении писателя
+        pragmas = self.pragmas if readonly else {**self.pragmas, **self.writer_pragmas}
+        for name, value in pragmas.items():
+            if readonly and name == 'journal_mode':
+                continue
+            connection.execute(f"PRAGMA {name} = {value}")
+        
+        # Читатели физически не могут ничего изменить
+        if readonly:
+            connection.execute("PRAGMA query_only = ON")
+        
+        return connection
+    
+    def _init_thread(self, readonly: bool):
+        """Инициализация рабочего потока: собственное соединение с БД"""
+        connection = self._open_connection(readonly)
+        self._local.connection = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+    
+    def _ping(self):
+        """Пустая задача для прогрева потока"""
+        return self._local.connection is not None
+    
+    @staticmethod
+    def is_read_query(query: str) -> bool:
+        """Является ли запрос чтением (может идти в поток-читатель)"""
+        head = query.lstrip()[:6].upper()
+        return head == 'SELECT' or head.startswith('WITH')
+    
+    def _run_query(self, query: str, params: tuple, is_read: bool) -> QueryResult:
+        """Выполнение запроса в рабочем потоке"""
+        connection = self._local.connection
+        started = time.perf_counter()
+        
+        cursor = connection.execute(query, params)
+        try:
+            rows = cursor.fetchall()
+            result = QueryResult(rows, cursor.rowcount, cursor.lastrowid)
+        finally:
+            cursor.close()
+        
+        self._record(query, (time.perf_counter() - started) * 1000, is_read)
+        return result
+    
+    def _run_many(self, query: str, params_seq: List[tuple]) -> int:
+        """Выполнение одного запроса для набора параметров в потоке-писателе"""
+        connection = self._local.connection
+        started = time.perf_counter()
+        
+        cursor = connection.executemany(query, params_seq)
+        try:
+            rowcount = cursor.rowcount
+        finally:
+            cursor.close()
+        
+        self._record(query, (time.perf_counter() - started) * 1000, False)
+        return rowcount
+    
+    def _run_on_writer(self, method: str):
+        """Вызов commit/rollback на соединении писателя"""
+        started = time.perf_counter()
+        getattr(self._local.connection, method)()
+        self._record(method.upper(), (time.perf_counter() - started) * 1000, False)
+    
+    def _record(self, query: str, elapsed_ms: float, is_read: bool):
+        """Учет времени выполнения запроса"""
+        with self._stats_lock:
+            self._stats['queries'] += 1
+            self._stats['reads' if is_read else 'writes'] += 1
+            self._stats['total_ms'] += elapsed_ms
+            if elapsed_ms > self._stats['max_ms']:
+                self._stats['max_ms'] = elapsed_ms
+            if elapsed_ms >= self.slow_query_ms:
+                self._stats['slow_queries'] += 1
+        
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(f"Медленный запрос ({elapsed_ms:.1f} мс): {' '.join(query.split())[:200]}")
+    
+    async def _submit(self, executor: ThreadPoolExecutor, func, *args):
+        """Отправка задачи в пул с ограничением длины очереди"""
+        if not self.is_running:
+            raise RuntimeError("Движок базы данных не запущен")
+        
+        async with self._pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+    
+    async def execute(self, query: str, params: tuple = ()) -> QueryResult:
+        """Выполнение SQL запроса (чтения - в читателях, записи - в писателе)"""
+        is_read = self.is_read_query(query)
+        executor = self._readers if is_read else self._writer
+        return await self._submit(executor, self._run_query, query, params, is_read)
+    
+    async def executemany(self, query: str, params_seq: List[tuple]) -> int:
+        """Пакетная запись: один переход в поток-писатель на весь набор"""
+        return await self._submit(self._writer, self._run_many, query, list(params_seq))
+    
+    async def commit(self):
+        """Подтверждение транзакции писателя"""
+        await self._submit(self._writer, self._run_on_writer, 'commit')
+    
+    async def rollback(self):
+        """Откат транзакции писателя"""
+        await self._submit(self._writer, self._run_on_writer, 'rollback')
+    
+    async def get_journal_mode(self) -> str:
+        """Текущий режим журнала БД"""
+        result = await self.execute("SELECT * FROM pragma_journal_mode")
+        row = result.fetchone()
+        return row[0] if row else ''
+    
+    def get_stats(self) -> Dict:
+        """Статистика выполнения запросов"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        
+        stats['avg_ms'] = stats['total_ms'] / stats['queries'] if stats['queries'] else 0.0
+        return stats
@@ -0,0 +1,250 @@
+"""
+Хранилище состояний FSM aiogram в SQLite для Рай-Такси
+
+Состояния диалогов (оформление заказа, регистрация водителя) хранятся
+в той же БД, что и заказы, поэтому переживают перезапуск бота. Чтения
+и записи обслуживаются из кэша в памяти, а изменения сбрасываются в БД
+пакетами раз в FSM_FLUSH_INTERVAL секунд (write-behind). Брошенные
+диалоги удаляются по истечении FSM_STATE_TTL.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .models import DatabaseManager
+from .queries import Queries
+
+logger = logging.getLogger(__name__)
+
+# Период удаления устаревших состояний из БД (сек)
+PURGE_INTERVAL = 3600
+
+class _Entry:
+    """Закэшированное состояние одного диалога"""
+    
+    __slots__ = ('state', 'data', 'updated_at', 'dirty')
+    
+    def __init__(self, state: Optional[str], data: Dict[str, Any], updated_at: float):
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+        self.dirty = False
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM с кэшем в памяти и отложенной записью в SQLite"""
+    
+    def __init__(self, db_manager: DatabaseManager, flush_interval: float = 2.0,
+                 state_ttl: float = 86400, cache_size: int = 1000):
+        """
+        Args:
+            db_manager: менеджер БД
+            flush_interval: период сброса изменений в БД в секундах
+            state_ttl: время жизни неактивного состояния в секундах
+            cache_size: максимум состояний в памяти
+        """
+        self.db = db_manager
+        self.flush_interval = max(0.1, flush_interval)
+        self.state_ttl = state_ttl
+        self.cache_size = max(1, cache_size)
+        
+        # Кэш состояний в порядке последнего обращения: {ключ: _Entry}
+        self._cache: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._flush_task = None
+        self._last_purge = 0.0
+        self._flush_lock = asyncio.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'flushes': 0, 'written': 0, 'failed': 0, 'expired': 0}
+    
+    async def start(self):
+        """Подготовка таблицы, удаление устаревших состояний и запуск сброса"""
+        if self._flush_task is not None:
+            return
+        
+        await self.db.execute(Queries.CREATE_FSM_STATES)
+        await self.db.commit()
+        await self.purge_expired()
+        
+        self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def close(self):
+        """Остановка фонового сброса и запись всех изменений"""
+        task, self._flush_task = self._flush_task, None
+        if task is None:
+            return
+        
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+    
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        """Строковый ключ записи для StorageKey"""
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+    
+    def _is_expired(self, entry: _Entry, now: float) -> bool:
+        """Устарело ли состояние"""
+        return self.state_ttl > 0 and now - entry.updated_at > self.state_ttl
+    
+    async def _get_entry(self, key: StorageKey) -> _Entry:
+        """Запись из кэша (при промахе загружается из БД)"""
+        storage_key = self._make_key(key)
+        now = time.time()
+        
+        entry = self._cache.get(storage_key)
+        if entry is not None:
+            self._stats['hits'] += 1
+            self._cache.move_to_end(storage_key)
+        else:
+            self._stats['misses'] += 1
+            cursor = await self.db.execute(Queries.FSM_STATE_BY_KEY, (storage_key,))
+            row = cursor.fetchone()
+            
+            # Пока шел запрос, запись могла появиться в кэше
+            entry = self._cache.get(storage_key)
+            if entry is None:
+                if row:
+                    state, data, updated_at = row
+                    entry = _Entry(state, json.loads(data) if data else {}, updated_at)
+                else:
+                    entry = _Entry(None, {}, now)
+                self._cache[storage_key] = entry
+        
+        if self._is_expired(entry, now):
+            # Брошенный диалог начинается заново
+            self._stats['expired'] += 1
+            entry.state = None
+            entry.data = {}
+            entry.updated_at = now
+            entry.dirty = True
+        
+        return entry
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Установка состояния"""
+        entry = await self._get_entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.updated_at = time.time()
+        entry.dirty = True
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получение состояния"""
+        entry = await self._get_entry(key)
+        return entry.state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        """Сохранение данных состояния"""
+        entry = await self._get_entry(key)
+        entry.data = copy.copy(data)
+        entry.updated_at = time.time()
+        entry.dirty = True
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получение данных состояния"""
+        entry = await self._get_entry(key)
+        return copy.copy(entry.data)
+    
+    async def _flush_loop(self):
+        """Периодический сброс изменений в БД"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.time() - self._last_purge >= PURGE_INTERVAL:
+                    await self.purge_expired()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения состояний FSM: {e}")
+    
+    async def purge_expired(self) -> int:
+        """
+        Удаление устаревших состояний из БД
+        
+        Returns:
+            Количество удаленных записей
+        """
+        self._last_purge = time.time()
+        if self.state_ttl <= 0:
+            return 0
+        
+        cursor = await self.db.execute(Queries.DELETE_STALE_FSM_STATES, (self._last_purge - self.state_ttl,))
+        await self.db.commit()
+        return cursor.rowcount
+    
+    async def flush(self):
+        """
+        Запись измененных состояний в БД одной транзакцией
+        и вытеснение лишних и устаревших записей из памяти
+        """
+        async with self._flush_lock:
+            now = time.time()
+            saved = []
+            deleted = []
+            # Записываемые записи и их время изменения на момент сброса
+            written = []
+            for storage_key, entry in self._cache.items():
+                if not entry.dirty:
+                    continue
+                if entry.state is None and not entry.data:
+                    # Пустое состояние не храним
+                    deleted.append((storage_key,))
+                else:
+                    try:
+                        data = json.dumps(entry.data, ensure_ascii=False) if entry.data else None
+                    except (TypeError, ValueError) as e:
+                        # Несериализуемые данные не блокируют сброс остальных записей:
+                        # состояние остается только в памяти до следующего изменения
+                        logger.error(f"Не удалось сохранить состояние FSM {storage_key}: {e}")
+                        entry.dirty = False
+                        self._stats['failed'] += 1
+                        continue
+                    saved.append((storage_key, entry.state, data, entry.updated_at))
+                written.append((entry, entry.updated_at))
+            
+            if written:
+                if saved:
+                    await self.db.executemany(Queries.SAVE_FSM_STATE, saved)
+                if deleted:
+                    await self.db.executemany(Queries.DELETE_FSM_STATE, deleted)
+                await self.db.commit()
+                
+                # Флаг снимается только после фиксации транзакции и только с записей,
+                # не изменившихся за время записи (при ошибке или отмене флаги не тронуты)
+                for entry, updated_at in written:
+                    if entry.updated_at == updated_at:
+                        entry.dirty = False
+                
+                self._stats['flushes'] += 1
+                self._stats['written'] += len(written)
+            
+            self._evict(now)
+    
+    def _evict(self, now: float):
+        """Удаление из памяти устаревших записей и записей сверх лимита"""
+        for storage_key in [
+            storage_key for storage_key, entry in self._cache.items()
+            if not entry.dirty and self._is_expired(entry, now)
+        ]:
+            del self._cache[storage_key]
+        
+        # Самые давние по обращению записи идут первыми
+        excess = len(self._cache) - self.cache_size
+        if excess > 0:
+            for storage_key in list(self._cache):
+                if excess <= 0:
+                    break
+                if not self._cache[storage_key].dirty:
+                    del self._cache[storage_key]
+                    excess -= 1
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика хранилища"""
+        stats = dict(self._stats)
+        stats['cached'] = len(self._cache)
+        stats['dirty'] = sum(1 for entry in self._cache.values() if entry.dirty)
+        return stats
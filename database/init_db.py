@@ -5,6 +5,7 @@
 import sqlite3
 import os
 from config import Config
+from database.queries import Queries
 
 def init_database():
     """Инициализация базы данных"""
@@ -95,33 +96,39 @@ def init_database():
         ''')
         
         # Создаем таблицу тарифов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                service_type TEXT NOT NULL,
-                base_fare REAL NOT NULL,
-                per_km_rate REAL NOT NULL,
-                minimum_fare REAL NOT NULL,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        cursor.execute(Queries.CREATE_PRICES)
+        
+        # Создаем таблицу очереди поиска водителей
+        cursor.execute(Queries.CREATE_DISPATCH_QUEUE)
+        
+        # Создаем таблицу состояний диалогов (FSM)
+        cursor.execute(Queries.CREATE_FSM_STATES)
+        
+        # Создаем таблицу кэша геокодирования
+        cursor.execute(Queries.CREATE_GEOCODE_CACHE)
+        cursor.execute(Queries.CREATE_REVERSE_GEOCODE_CACHE)
+        
+        # Создаем таблицу кэша отправленных карт
+        cursor.execute(Queries.CREATE_MAP_FILE_IDS)
+        
+        # Создаем таблицу фиксированных цен между зонами
+        cursor.execute(Queries.CREATE_ZONE_FIXED_PRICES)
+        
+        # Создаем таблицы офлайн-справочника адресов
+        cursor.execute(Queries.CREATE_GAZETTEER)
+        cursor.execute(Queries.CREATE_GAZETTEER_FTS)
         
         # Создаем индексы для оптимизации
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_client_id ON orders(client_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)')
         
-        # Вставляем базовые тарифы
-        cursor.execute('''
-            INSERT OR IGNORE INTO prices (service_type, base_fare, per_km_rate, minimum_fare)
-            VALUES 
-                ('taxi', ?, ?, ?),
-                ('delivery', ?, ?, ?)
-        ''', (
-            Config.BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE,
-            Config.DELIVERY_BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE
+        # Вставляем базовые тарифы (если их еще нет)
+        cursor.execute(Queries.SEED_PRICE, (
+            'taxi', Config.BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE, 'taxi'
+        ))
+        cursor.execute(Queries.SEED_PRICE, (
+            'delivery', Config.DELIVERY_BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE, 'delivery'
         ))
         
         # Подтверждаем изменения
@@ -2,11 +2,15 @@
 Модели данных для базы Рай-Такси
 """
 
+import asyncio
 import sqlite3
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 
+from config import Config
+from .engine import SQLiteEngine, QueryResult
+
 @dataclass
 class User:
     """Модель пользователя"""
@@ -109,45 +113,150 @@ class DatabaseManager:
     
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.connection = None
+        self.engine = None
+        
+        # Групповая фиксация: commit() нескольких обработчиков
+        # объединяется в одну транзакцию (один fsync)
+        self.commit_window = Config.DB_GROUP_COMMIT_WINDOW_MS / 1000
+        self.commit_max_batch = max(1, Config.DB_GROUP_COMMIT_MAX_BATCH)
+        self._commit_waiters = []
+        self._commit_timer = None
+        self._commit_tasks = set()
+        self._commit_stats = {'commit_requests': 0, 'commit_batches': 0}
     
     async def connect(self):
         """Подключение к базе данных"""
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row
+            if self.engine is None:
+                self.engine = SQLiteEngine(
+                    self.db_path,
+                    reader_threads=Config.DB_READER_THREADS,
+                    max_pending=Config.DB_MAX_PENDING_QUERIES,
+                    slow_query_ms=Config.DB_SLOW_QUERY_MS,
+                    pragmas=Config.get_sqlite_pragmas(),
+                    busy_timeout=Config.DB_BUSY_TIMEOUT,
+                    cached_statements=Config.DB_STATEMENT_CACHE_SIZE,
+                    writer_pragmas=Config.get_sqlite_writer_pragmas()
+                )
+            self.engine.start()
             return True
         except Exception as e:
             print(f"Ошибка подключения к БД: {e}")
+            self.engine = None
             return False
     
     async def disconnect(self):
         """Отключение от базы данных"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        if self.engine:
+            # Дожидаемся фиксации уже принятых изменений
+            self._flush_commits()
+            if self._commit_tasks:
+                await asyncio.gather(*self._commit_tasks, return_exceptions=True)
+            await self.engine.close()
+            self.engine = None
+    
+    async def execute(self, query: str, params: tuple = ()) -> QueryResult:
+        """Выполнение SQL запроса (в рабочем потоке, без блокировки event loop)"""
+        if not self.engine:
+            await self.connect()
+        
+        return await self.engine.execute(query, params)
     
-    async def execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
-        """Выполнение SQL запроса"""
-        if not self.connection:
+    async def executemany(self, query: str, params_seq: List[tuple]) -> int:
+        """Пакетное выполнение запроса на запись"""
+        if not self.engine:
             await self.connect()
         
-        cursor = self.connection.cursor()
-        cursor.execute(query, params)
-        return cursor
+        return await self.engine.executemany(query, params_seq)
     
     async def commit(self):
-        """Подтверждение изменений"""
-        if self.connection:
-            self.connection.commit()
+        """
+        Подтверждение изменений
+        
+        Вызовы из разных обработчиков собираются в пакет в течение
+        DB_GROUP_COMMIT_WINDOW_MS (или до DB_GROUP_COMMIT_MAX_BATCH вызовов)
+        и фиксируются одной транзакцией. Возврат происходит только после того,
+        как данные записаны на диск: писатель работает с synchronous=FULL
+        (DB_WRITER_SYNCHRONOUS), поэтому фиксация пакета ждет fsync WAL.
+        """
+        if not self.engine:
+            return
+        
+        self._commit_stats['commit_requests'] += 1
+        
+        if self.commit_window <= 0:
+            self._commit_stats['commit_batches'] += 1
+            await self.engine.commit()
+            return
+        
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._commit_waiters.append(waiter)
+        
+        if len(self._commit_waiters) >= self.commit_max_batch:
+            self._flush_commits()
+        elif self._commit_timer is None:
+            self._commit_timer = loop.call_later(self.commit_window, self._flush_commits)
+        
+        await waiter
+    
+    def _flush_commits(self):
+        """Запуск фиксации накопленного пакета"""
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        
+        waiters, self._commit_waiters = self._commit_waiters, []
+        if not waiters:
+            return
+        
+        task = asyncio.ensure_future(self._commit_batch(waiters))
+        self._commit_tasks.add(task)
+        task.add_done_callback(self._commit_tasks.discard)
+    
+    async def _commit_batch(self, waiters: list):
+        """Фиксация пакета и уведомление всех ожидающих"""
+        self._commit_stats['commit_batches'] += 1
+        try:
+            # Поток-писатель один, поэтому пакеты фиксируются строго по порядку
+            await self.engine.commit()
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
     
     async def rollback(self):
-        """Откат изменений"""
-        if self.connection:
-            self.connection.rollback()
+        """Откат изменений (отменяет и еще не зафиксированный пакет)"""
+        if not self.engine:
+            return
+        
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        
+        waiters, self._commit_waiters = self._commit_waiters, []
+        await self.engine.rollback()
+        
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(sqlite3.OperationalError("Транзакция отменена вызовом rollback()"))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика выполнения запросов"""
+        if not self.engine:
+            return {}
+        
+        stats = self.engine.get_stats()
+        stats.update(self._commit_stats)
+        return stats
     
-    def __enter__(self):
+    async def __aenter__(self):
+        await self.connect()
         return self
     
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.disconnect()
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
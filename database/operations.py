@@ -2,10 +2,9 @@
 Операции с базой данных Рай-Такси
 """
 
-import sqlite3
 from typing import Optional, List, Dict, Any
-from datetime import datetime
 from .models import User, Driver, Order, Location, Price, DatabaseManager
+from .queries import Queries, map_user_row, map_driver_row, map_order_row
 from config import Config
 
 class UserOperations:
@@ -14,271 +13,176 @@ class UserOperations:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
     
-    async def create_user(self, telegram_id: int, username: str, first_name: str, 
+    async def create_user(self, telegram_id: int, username: str, first_name: str,
                          last_name: str = None, phone: str = None) -> User:
         """Создание нового пользователя"""
-        query = '''
-            INSERT INTO users (telegram_id, username, first_name, last_name, phone)
-            VALUES (?, ?, ?, ?, ?)
-        '''
-        cursor = await self.db.execute(query, (telegram_id, username, first_name, last_name, phone))
+        await self.db.execute(Queries.CREATE_USER, (telegram_id, username, first_name, last_name, phone))
         await self.db.commit()
         
         return await self.get_user_by_telegram_id(telegram_id)
     
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Получение пользователя по Telegram ID"""
-        query = 'SELECT * FROM users WHERE telegram_id = ?'
-        cursor = await self.db.execute(query, (telegram_id,))
+        cursor = await self.db.execute(Queries.USER_BY_TELEGRAM_ID, (telegram_id,))
         row = cursor.fetchone()
-        
-        if row:
-            return User(
-                id=row['id'],
-                telegram_id=row['telegram_id'],
-                username=row['username'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                phone=row['phone'],
-                role=row['role'],
-                rating=row['rating'],
-                total_orders=row['total_orders'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            )
-        return None
+        return map_user_row(row) if row else None
     
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Получение пользователя по внутреннему ID"""
-        query = 'SELECT * FROM users WHERE id = ?'
-        cursor = await self.db.execute(query, (user_id,))
+        cursor = await self.db.execute(Queries.USER_BY_ID, (user_id,))
         row = cursor.fetchone()
-        
-        if row:
-            return User(
-                id=row['id'],
-                telegram_id=row['telegram_id'],
-                username=row['username'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                phone=row['phone'],
-                role=row['role'],
-                rating=row['rating'],
-                total_orders=row['total_orders'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            )
-        return None
-
+        return map_user_row(row) if row else None
+    
     async def update_user_role(self, telegram_id: int, role: str) -> bool:
         """Обновление роли пользователя"""
-        query = 'UPDATE users SET role = ? WHERE telegram_id = ?'
-        await self.db.execute(query, (role, telegram_id))
+        await self.db.execute(Queries.UPDATE_USER_ROLE, (role, telegram_id))
         await self.db.commit()
         return True
     
     async def update_user_phone(self, telegram_id: int, phone: str) -> bool:
         """Обновление номера телефона пользователя"""
-        query = 'UPDATE users SET phone = ? WHERE telegram_id = ?'
-        await self.db.execute(query, (phone, telegram_id))
+        await self.db.execute(Queries.UPDATE_USER_PHONE, (phone, telegram_id))
         await self.db.commit()
         return True
     
     async def get_all_users(self) -> List[User]:
         """Получение всех пользователей"""
-        query = 'SELECT * FROM users ORDER BY created_at DESC'
-        cursor = await self.db.execute(query)
-        users = []
-        
-        for row in cursor.fetchall():
-            users.append(User(
-                id=row['id'],
-                telegram_id=row['telegram_id'],
-                username=row['username'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                phone=row['phone'],
-                role=row['role'],
-                rating=row['rating'],
-                total_orders=row['total_orders'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            ))
-        
-        return users
+        cursor = await self.db.execute(Queries.ALL_USERS)
+        return list(map(map_user_row, cursor.fetchall()))
     
     async def get_recent_users(self, limit: int = 10) -> List[User]:
         """Получение последних пользователей"""
-        query = '''
-            SELECT * FROM users 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        '''
-        cursor = await self.db.execute(query, (limit,))
-        users = []
-        
-        for row in cursor.fetchall():
-            users.append(User(
-                id=row['id'],
-                telegram_id=row['telegram_id'],
-                username=row['username'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                phone=row['phone'],
-                role=row['role'],
-                rating=row['rating'],
-                total_orders=row['total_orders'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            ))
-        
-        return users
+        cursor = await self.db.execute(Queries.RECENT_USERS, (limit,))
+        return list(map(map_user_row, cursor.fetchall()))
     
     async def get_total_users(self) -> int:
         """Получение общего количества пользователей"""
-        query = 'SELECT COUNT(*) as count FROM users'
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_USERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
     
     async def get_user_id_by_telegram_id(self, telegram_id: int) -> Optional[int]:
         """Получение ID пользователя по Telegram ID"""
-        query = 'SELECT id FROM users WHERE telegram_id = ?'
-        cursor = await self.db.execute(query, (telegram_id,))
+        cursor = await self.db.execute(Queries.USER_ID_BY_TELEGRAM_ID, (telegram_id,))
         row = cursor.fetchone()
-        return row['id'] if row else None
+        return row[0] if row else None
     
     async def make_admin(self, telegram_id: int) -> bool:
         """Назначение пользователя администратором"""
-        query = 'UPDATE users SET role = "admin" WHERE telegram_id = ?'
-        await self.db.execute(query, (telegram_id,))
+        await self.db.execute(Queries.MAKE_ADMIN, (telegram_id,))
         await self.db.commit()
         return True
 
 class DriverOperations:
     """Операции с водителями"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, driver_index=None):
+        """
+        Args:
+            db_manager: менеджер БД
+            driver_index: пространственный индекс водителей, который нужно
+                обновлять вместе с БД (без него поиск идет по списку из БД)
+        """
         self.db = db_manager
+        self.driver_index = driver_index
     
-    async def create_driver(self, user_id: int, car_model: str, car_number: str, 
+    async def create_driver(self, user_id: int, car_model: str, car_number: str,
                            license_number: str) -> Driver:
         """Создание нового водителя"""
-        query = '''
-            INSERT INTO drivers (user_id, car_model, car_number, license_number)
-            VALUES (?, ?, ?, ?)
-        '''
-        cursor = await self.db.execute(query, (user_id, car_model, car_number, license_number))
+        await self.db.execute(Queries.CREATE_DRIVER, (user_id, car_model, car_number, license_number))
         await self.db.commit()
         
-        return await self.get_driver_by_user_id(user_id)
+        driver = await self.get_driver_by_user_id(user_id)
+        if driver and self.driver_index is not None:
+            self.driver_index.set_available(user_id, driver.is_available)
+        return driver
     
     async def get_driver_by_user_id(self, user_id: int) -> Optional[Driver]:
         """Получение водителя по ID пользователя"""
-        query = 'SELECT * FROM drivers WHERE user_id = ?'
-        cursor = await self.db.execute(query, (user_id,))
+        cursor = await self.db.execute(Queries.DRIVER_BY_USER_ID, (user_id,))
         row = cursor.fetchone()
-        
-        if row:
-            return Driver(
-                id=row['id'],
-                user_id=row['user_id'],
-                car_model=row['car_model'],
-                car_number=row['car_number'],
-                license_number=row['license_number'],
-                is_available=bool(row['is_available']),
-                current_location_lat=row['current_location_lat'],
-                current_location_lon=row['current_location_lon'],
-                rating=row['rating'],
-                total_trips=row['total_trips'],
-                total_earnings=row['total_earnings'],
-                created_at=datetime.fromisoformat(row['created_at'])
-            )
-        return None
+        return map_driver_row(row) if row else None
     
     async def update_driver_availability(self, user_id: int, is_available: bool) -> bool:
         """Обновление статуса доступности водителя"""
-        query = 'UPDATE drivers SET is_available = ? WHERE user_id = ?'
-        await self.db.execute(query, (is_available, user_id))
+        await self.db.execute(Queries.UPDATE_DRIVER_AVAILABILITY, (is_available, user_id))
         await self.db.commit()
+        if self.driver_index is not None:
+            self.driver_index.set_available(user_id, is_available)
         return True
     
     async def get_all_drivers(self) -> List[Driver]:
         """Получение всех водителей"""
-        query = 'SELECT * FROM drivers ORDER BY created_at DESC'
-        cursor = await self.db.execute(query)
-        drivers = []
-        
-        for row in cursor.fetchall():
-            drivers.append(Driver(
-                id=row['id'],
-                user_id=row['user_id'],
-                car_model=row['car_model'],
-                car_number=row['car_number'],
-                license_number=row['license_number'],
-                is_available=bool(row['is_available']),
-                current_location_lat=row['current_location_lat'],
-                current_location_lon=row['current_location_lon'],
-                rating=row['rating'],
-                total_trips=row['total_trips'],
-                total_earnings=row['total_earnings'],
-                created_at=datetime.fromisoformat(row['created_at'])
-            ))
-        
-        return drivers
+        cursor = await self.db.execute(Queries.ALL_DRIVERS)
+        return list(map(map_driver_row, cursor.fetchall()))
     
     async def get_online_drivers_count(self) -> int:
         """Получение количества онлайн водителей"""
-        query = 'SELECT COUNT(*) as count FROM drivers WHERE is_available = 1'
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_ONLINE_DRIVERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
     
     async def get_total_drivers(self) -> int:
         """Получение общего количества водителей"""
-        query = 'SELECT COUNT(*) as count FROM drivers'
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_DRIVERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
     
     async def update_driver_location(self, user_id: int, lat: float, lon: float) -> bool:
         """Обновление местоположения водителя"""
-        query = '''
-            UPDATE drivers 
-            SET current_location_lat = ?, current_location_lon = ?
-            WHERE user_id = ?
-        '''
-        await self.db.execute(query, (lat, lon, user_id))
+        await self.db.execute(Queries.UPDATE_DRIVER_LOCATION, (lat, lon, user_id))
         await self.db.commit()
+        if self.driver_index is not None:
+            self.driver_index.update_location(user_id, lat, lon)
         return True
     
     async def get_available_drivers(self) -> List[Driver]:
         """Получение доступных водителей"""
-        query = '''
-            SELECT d.* FROM drivers d
-            JOIN users u ON d.user_id = u.id
-            WHERE d.is_available = 1 AND u.is_active = 1
-        '''
-        cursor = await self.db.execute(query)
-        drivers = []
+        cursor = await self.db.execute(Queries.AVAILABLE_DRIVERS)
+        return list(map(map_driver_row, cursor.fetchall()))
+    
+    async def rebuild_driver_index(self) -> int:
+        """
+        Загрузка водителей в пространственный индекс
+        
+        Загружаются все водители: у водителей не на линии индекс хранит
+        последние координаты, чтобы после выхода на линию они сразу
+        искались по расстоянию.
+        
+        Returns:
+            Количество доступных водителей
+        """
+        cursor = await self.db.execute(Queries.INDEXED_DRIVERS)
+        drivers = list(map(map_driver_row, cursor.fetchall()))
+        if self.driver_index is not None:
+            self.driver_index.load(drivers)
+        return sum(1 for driver in drivers if driver.is_available)
+    
+    async def get_nearest_available_drivers(self, lat: float, lon: float,
+                                            limit: int = None, radius_km: float = None) -> List[Driver]:
+        """
+        Ближайшие доступные водители по пространственному индексу
+        
+        Водители без известных координат добавляются в конец списка.
+        """
+        if limit is None:
+            limit = Config.DISPATCH_MAX_CANDIDATES
+        if radius_km is None:
+            radius_km = Config.DISPATCH_SEARCH_RADIUS_KM
+        if self.driver_index is None:
+            return (await self.get_available_drivers())[:limit]
         
-        for row in cursor.fetchall():
-            drivers.append(Driver(
-                id=row['id'],
-                user_id=row['user_id'],
-                car_model=row['car_model'],
-                car_number=row['car_number'],
-                license_number=row['license_number'],
-                is_available=bool(row['is_available']),
-                current_location_lat=row['current_location_lat'],
-                current_location_lon=row['current_location_lon'],
-                rating=row['rating'],
-                total_trips=row['total_trips'],
-                total_earnings=row['total_earnings'],
-                created_at=datetime.fromisoformat(row['created_at'])
-            ))
+        user_ids = [user_id for user_id, _ in self.driver_index.nearest(lat, lon, limit, radius_km)]
+        if len(user_ids) < limit:
+            user_ids.extend(self.driver_index.get_unlocated_available()[:limit - len(user_ids)])
         
-        return drivers
+        if not user_ids:
+            return []
+        
+        cursor = await self.db.execute(Queries.available_drivers_by_user_ids(len(user_ids)), tuple(user_ids))
+        drivers = {driver.user_id: driver for driver in map(map_driver_row, cursor.fetchall())}
+        # Порядок как в индексе: от ближайшего к дальнему
+        return [drivers[user_id] for user_id in user_ids if user_id in drivers]
 
 class OrderOperations:
     """Операции с заказами"""
@@ -292,14 +196,7 @@ class OrderOperations:
                           destination_address: Optional[str] = None, description: str = None,
                           price: float = 0.0, distance: float = None) -> Order:
         """Создание нового заказа"""
-        query = '''
-            INSERT INTO orders (
-                client_id, order_type, status, pickup_lat, pickup_lon, pickup_address,
-                destination_lat, destination_lon, destination_address, description,
-                price, distance
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        '''
-        cursor = await self.db.execute(query, (
+        cursor = await self.db.execute(Queries.CREATE_ORDER, (
             client_id, order_type, 'new', pickup_lat, pickup_lon, pickup_address,
             destination_lat, destination_lon, destination_address, description,
             price, distance
@@ -310,230 +207,102 @@ class OrderOperations:
     
     async def get_order_by_id(self, order_id: int) -> Optional[Order]:
         """Получение заказа по ID"""
-        query = 'SELECT * FROM orders WHERE id = ?'
-        cursor = await self.db.execute(query, (order_id,))
+        cursor = await self.db.execute(Queries.ORDER_BY_ID, (order_id,))
         row = cursor.fetchone()
-        
-        if row:
-            return Order(
-                id=row['id'],
-                client_id=row['client_id'],
-                driver_id=row['driver_id'],
-                order_type=row['order_type'],
-                status=row['status'],
-                pickup_lat=row['pickup_lat'],
-                pickup_lon=row['pickup_lon'],
-                pickup_address=row['pickup_address'],
-                destination_lat=row['destination_lat'],
-                destination_lon=row['destination_lon'],
-                destination_address=row['destination_address'],
-                description=row['description'],
-                price=row['price'],
-                distance=row['distance'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                completed_at=datetime.fromisoformat(row['completed_at']) if row['completed_at'] else None,
-                cancelled_at=datetime.fromisoformat(row['cancelled_at']) if row['cancelled_at'] else None,
-                cancellation_reason=row['cancellation_reason']
-            )
-        return None
+        return map_order_row(row) if row else None
     
     async def update_order_status(self, order_id: int, status: str) -> bool:
         """Обновление статуса заказа"""
-        query = 'UPDATE orders SET status = ? WHERE id = ?'
-        await self.db.execute(query, (status, order_id))
+        await self.db.execute(Queries.UPDATE_ORDER_STATUS, (status, order_id))
         await self.db.commit()
         return True
     
+    async def cancel_order(self, order_id: int, reason: str = None) -> bool:
+        """Отмена заказа, если водитель еще не назначен"""
+        cursor = await self.db.execute(Queries.CANCEL_ACTIVE_ORDER, (reason, order_id))
+        await self.db.commit()
+        return cursor.rowcount > 0
+    
     async def assign_driver(self, order_id: int, driver_id: int) -> bool:
         """Назначение водителя на заказ"""
-        query = '''
-            UPDATE orders 
-            SET driver_id = ?, status = 'driver_assigned'
-            WHERE id = ?
-        '''
-        await self.db.execute(query, (driver_id, order_id))
+        await self.db.execute(Queries.ASSIGN_DRIVER, (driver_id, order_id))
         await self.db.commit()
         return True
     
     async def get_user_orders(self, user_id: int, limit: int = 10) -> List[Order]:
         """Получение заказов пользователя"""
-        query = '''
-            SELECT * FROM orders 
-            WHERE client_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        '''
-        cursor = await self.db.execute(query, (user_id, limit))
-        orders = []
-        
-        for row in cursor.fetchall():
-            orders.append(Order(
-                id=row['id'],
-                client_id=row['client_id'],
-                driver_id=row['driver_id'],
-                order_type=row['order_type'],
-                status=row['status'],
-                pickup_lat=row['pickup_lat'],
-                pickup_lon=row['pickup_lon'],
-                pickup_address=row['pickup_address'],
-                destination_lat=row['destination_lat'],
-                destination_lon=row['destination_lon'],
-                destination_address=row['destination_address'],
-                description=row['description'],
-                price=row['price'],
-                distance=row['distance'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                completed_at=datetime.fromisoformat(row['completed_at']) if row['completed_at'] else None,
-                cancelled_at=datetime.fromisoformat(row['cancelled_at']) if row['cancelled_at'] else None,
-                cancellation_reason=row['cancellation_reason']
-            ))
-        
-        return orders
+        cursor = await self.db.execute(Queries.USER_ORDERS, (user_id, limit))
+        return list(map(map_order_row, cursor.fetchall()))
     
     async def get_available_orders(self) -> List[Order]:
         """Получение доступных заказов для водителей"""
-        query = '''
-            SELECT * FROM orders 
-            WHERE status = 'new' OR status = 'searching_driver'
-            ORDER BY created_at ASC
-        '''
-        cursor = await self.db.execute(query)
-        orders = []
-        
-        for row in cursor.fetchall():
-            orders.append(Order(
-                id=row['id'],
-                client_id=row['client_id'],
-                driver_id=row['driver_id'],
-                order_type=row['order_type'],
-                status=row['status'],
-                pickup_lat=row['pickup_lat'],
-                pickup_lon=row['pickup_lon'],
-                pickup_address=row['pickup_address'],
-                destination_lat=row['destination_lat'],
-                destination_lon=row['destination_lon'],
-                destination_address=row['destination_address'],
-                description=row['description'],
-                price=row['price'],
-                distance=row['distance'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                completed_at=datetime.fromisoformat(row['completed_at']) if row['completed_at'] else None,
-                cancelled_at=datetime.fromisoformat(row['cancelled_at']) if row['cancelled_at'] else None,
-                cancellation_reason=row['cancellation_reason']
-            ))
-        
-        return orders
+        cursor = await self.db.execute(Queries.AVAILABLE_ORDERS)
+        return list(map(map_order_row, cursor.fetchall()))
     
     async def assign_driver_to_order(self, order_id: int, driver_id: int) -> bool:
         """Назначение водителя на заказ (для водителей)"""
-        query = '''
-            UPDATE orders 
-            SET driver_id = ?, status = 'driver_assigned'
-            WHERE id = ? AND (status = 'new' OR status = 'searching_driver')
-        '''
-        cursor = await self.db.execute(query, (driver_id, order_id))
+        cursor = await self.db.execute(Queries.ASSIGN_DRIVER_TO_AVAILABLE_ORDER, (driver_id, order_id))
         await self.db.commit()
         return cursor.rowcount > 0
     
     async def get_driver_orders(self, driver_id: int, limit: int = 10) -> List[Order]:
         """Получение заказов водителя"""
-        query = '''
-            SELECT * FROM orders 
-            WHERE driver_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        '''
-        cursor = await self.db.execute(query, (driver_id, limit))
-        orders = []
-        
-        for row in cursor.fetchall():
-            orders.append(Order(
-                id=row['id'],
-                client_id=row['client_id'],
-                driver_id=row['driver_id'],
-                order_type=row['order_type'],
-                status=row['status'],
-                pickup_lat=row['pickup_lat'],
-                pickup_lon=row['pickup_lon'],
-                pickup_address=row['pickup_address'],
-                destination_lat=row['destination_lat'],
-                destination_lon=row['destination_lon'],
-                destination_address=row['destination_address'],
-                description=row['description'],
-                price=row['price'],
-                distance=row['distance'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                completed_at=datetime.fromisoformat(row['completed_at']) if row['completed_at'] else None,
-                cancelled_at=datetime.fromisoformat(row['cancelled_at']) if row['cancelled_at'] else None,
-                cancellation_reason=row['cancellation_reason']
-            ))
-        
-        return orders
+        cursor = await self.db.execute(Queries.DRIVER_ORDERS, (driver_id, limit))
+        return list(map(map_order_row, cursor.fetchall()))
     
     async def get_recent_orders(self, limit: int = 10) -> List[Order]:
         """Получение последних заказов"""
-        query = '''
-            SELECT * FROM orders 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        '''
-        cursor = await self.db.execute(query, (limit,))
-        orders = []
-        
-        for row in cursor.fetchall():
-            orders.append(Order(
-                id=row['id'],
-                client_id=row['client_id'],
-                driver_id=row['driver_id'],
-                order_type=row['order_type'],
-                status=row['status'],
-                pickup_lat=row['pickup_lat'],
-                pickup_lon=row['pickup_lon'],
-                pickup_address=row['pickup_address'],
-                destination_lat=row['destination_lat'],
-                destination_lon=row['destination_lon'],
-                destination_address=row['destination_address'],
-                description=row['description'],
-                price=row['price'],
-                distance=row['distance'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                completed_at=datetime.fromisoformat(row['completed_at']) if row['completed_at'] else None,
-                cancelled_at=datetime.fromisoformat(row['cancelled_at']) if row['cancelled_at'] else None,
-                cancellation_reason=row['cancellation_reason']
-            ))
-        
-        return orders
+        cursor = await self.db.execute(Queries.RECENT_ORDERS, (limit,))
+        return list(map(map_order_row, cursor.fetchall()))
     
     async def get_total_orders(self) -> int:
         """Получение общего количества заказов"""
-        query = 'SELECT COUNT(*) as count FROM orders'
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_ORDERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
     
     async def get_active_orders_count(self) -> int:
         """Получение количества активных заказов"""
-        query = '''
-            SELECT COUNT(*) as count FROM orders 
-            WHERE status IN ('new', 'searching_driver', 'driver_assigned', 'in_progress')
-        '''
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_ACTIVE_ORDERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
     
     async def get_completed_orders_count(self) -> int:
         """Получение количества выполненных заказов"""
-        query = 'SELECT COUNT(*) as count FROM orders WHERE status = "completed"'
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_COMPLETED_ORDERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
     
     async def get_pending_orders_count(self) -> int:
         """Получение количества ожидающих заказов"""
-        query = '''
-            SELECT COUNT(*) as count FROM orders 
-            WHERE status IN ('new', 'searching_driver')
-        '''
-        cursor = await self.db.execute(query)
+        cursor = await self.db.execute(Queries.COUNT_PENDING_ORDERS)
         row = cursor.fetchone()
-        return row['count'] if row else 0
+        return row[0] if row else 0
+    
+    async def ensure_dispatch_queue(self):
+        """Создание таблицы очереди поиска водителей (для БД, созданных до ее появления)"""
+        await self.db.execute(Queries.CREATE_DISPATCH_QUEUE)
+        await self.db.commit()
+    
+    async def add_to_dispatch_queue(self, order_id: int) -> bool:
+        """Постановка заказа в очередь поиска водителя"""
+        await self.db.execute(Queries.ADD_TO_DISPATCH_QUEUE, (order_id,))
+        await self.db.commit()
+        return True
+    
+    async def mark_dispatch_started(self, order_id: int) -> bool:
+        """Отметка о запуске поиска водителя для заказа"""
+        await self.db.execute(Queries.MARK_DISPATCH_STARTED, (order_id,))
+        await self.db.commit()
+        return True
+    
+    async def remove_from_dispatch_queue(self, order_id: int) -> bool:
+        """Удаление заказа из очереди поиска водителя"""
+        await self.db.execute(Queries.REMOVE_FROM_DISPATCH_QUEUE, (order_id,))
+        await self.db.commit()
+        return True
+    
+    async def get_dispatch_queue(self) -> List[tuple]:
+        """Очередь поиска водителей: список (order_id, количество запусков)"""
+        cursor = await self.db.execute(Queries.DISPATCH_QUEUE)
+        return cursor.fetchall()
@@ -0,0 +1,394 @@
+"""
+Реестр SQL-запросов и быстрые преобразователи строк в модели Рай-Такси
+
+Каждый запрос объявлен здесь один раз, поэтому при выполнении используется
+одна и та же строка и sqlite3 берет уже скомпилированный оператор из своего
+кэша. Списки колонок и преобразователи строк генерируются из полей
+dataclass-моделей, так что SELECT и разбор результата не расходятся.
+"""
+
+from dataclasses import fields
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from .models import User, Driver, Order
+
+@lru_cache(maxsize=4096)
+def _parse_timestamp_cached(value: str) -> datetime:
+    """Разбор отметки времени SQLite (результат кэшируется)"""
+    return datetime.fromisoformat(value)
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Разбор отметки времени, допускающий NULL"""
+    return _parse_timestamp_cached(value) if value else None
+
+def model_columns(model) -> List[str]:
+    """Имена колонок в порядке полей модели"""
+    return [field.name for field in fields(model)]
+
+def make_row_mapper(model, converters: Dict[str, Callable] = None) -> Callable:
+    """
+    Генерация функции «строка -> модель» с позиционной распаковкой кортежа
+    
+    Args:
+        model: dataclass-модель
+        converters: преобразователи значений по имени колонки
+    
+    Returns:
+        Функция, принимающая кортеж в порядке model_columns(model)
+    """
+    converters = converters or {}
+    columns = model_columns(model)
+    
+    arguments = []
+    namespace = {'_model': model}
+    for column in columns:
+        if column in converters:
+            namespace[f'_convert_{column}'] = converters[column]
+            arguments.append(f'_convert_{column}({column})')
+        else:
+            arguments.append(column)
+    
+    source = (
+        f"def map_{model.__name__.lower()}_row(row):\n"
+        f"    ({', '.join(columns)},) = row\n"
+        f"    return _model({', '.join(arguments)})\n"
+    )
+    exec(source, namespace)
+    return namespace[f'map_{model.__name__.lower()}_row']
+
+USER_COLUMNS = ', '.join(model_columns(User))
+DRIVER_COLUMNS = ', '.join(model_columns(Driver))
+ORDER_COLUMNS = ', '.join(model_columns(Order))
+
+map_user_row = make_row_mapper(User, {
+    'created_at': parse_timestamp,
+    'is_active': bool
+})
+
+map_driver_row = make_row_mapper(Driver, {
+    'is_available': bool,
+    'created_at': parse_timestamp
+})
+
+map_order_row = make_row_mapper(Order, {
+    'created_at': parse_timestamp,
+    'completed_at': parse_timestamp,
+    'cancelled_at': parse_timestamp
+})
+
+class Queries:
+    """Все запросы операций с БД"""
+    
+    # Пользователи
+    CREATE_USER = '''
+        INSERT INTO users (telegram_id, username, first_name, last_name, phone)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+    USER_BY_TELEGRAM_ID = f'SELECT {USER_COLUMNS} FROM users WHERE telegram_id = ?'
+    USER_BY_ID = f'SELECT {USER_COLUMNS} FROM users WHERE id = ?'
+    UPDATE_USER_ROLE = 'UPDATE users SET role = ? WHERE telegram_id = ?'
+    UPDATE_USER_PHONE = 'UPDATE users SET phone = ? WHERE telegram_id = ?'
+    ALL_USERS = f'SELECT {USER_COLUMNS} FROM users ORDER BY created_at DESC'
+    RECENT_USERS = f'SELECT {USER_COLUMNS} FROM users ORDER BY created_at DESC LIMIT ?'
+    COUNT_USERS = 'SELECT COUNT(*) FROM users'
+    USER_ID_BY_TELEGRAM_ID = 'SELECT id FROM users WHERE telegram_id = ?'
+    MAKE_ADMIN = "UPDATE users SET role = 'admin' WHERE telegram_id = ?"
+    
+    # Водители
+    CREATE_DRIVER = '''
+        INSERT INTO drivers (user_id, car_model, car_number, license_number)
+        VALUES (?, ?, ?, ?)
+    '''
+    DRIVER_BY_USER_ID = f'SELECT {DRIVER_COLUMNS} FROM drivers WHERE user_id = ?'
+    UPDATE_DRIVER_AVAILABILITY = 'UPDATE drivers SET is_available = ? WHERE user_id = ?'
+    ALL_DRIVERS = f'SELECT {DRIVER_COLUMNS} FROM drivers ORDER BY created_at DESC'
+    COUNT_ONLINE_DRIVERS = 'SELECT COUNT(*) FROM drivers WHERE is_available = 1'
+    COUNT_DRIVERS = 'SELECT COUNT(*) FROM drivers'
+    UPDATE_DRIVER_LOCATION = '''
+        UPDATE drivers
+        SET current_location_lat = ?, current_location_lon = ?
+        WHERE user_id = ?
+    '''
+    AVAILABLE_DRIVERS = f'''
+        SELECT {', '.join('d.' + column for column in model_columns(Driver))}
+        FROM drivers d
+        JOIN users u ON d.user_id = u.id
+        WHERE d.is_available = 1 AND u.is_active = 1
+    '''
+    # Все водители для пространственного индекса: координаты и признак доступности
+    INDEXED_DRIVERS = f'''
+        SELECT {', '.join(
+            'd.is_available = 1 AND u.is_active = 1' if column == 'is_available' else 'd.' + column
+            for column in model_columns(Driver)
+        )}
+        FROM drivers d
+        JOIN users u ON d.user_id = u.id
+    '''
+    
+    # Заказы
+    CREATE_ORDER = '''
+        INSERT INTO orders (
+            client_id, order_type, status, pickup_lat, pickup_lon, pickup_address,
+            destination_lat, destination_lon, destination_address, description,
+            price, distance
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    ORDER_BY_ID = f'SELECT {ORDER_COLUMNS} FROM orders WHERE id = ?'
+    UPDATE_ORDER_STATUS = 'UPDATE orders SET status = ? WHERE id = ?'
+    CANCEL_ACTIVE_ORDER = '''
+        UPDATE orders
+        SET status = 'cancelled', cancelled_at = CURRENT_TIMESTAMP, cancellation_reason = ?
+        WHERE id = ? AND (status = 'new' OR status = 'searching_driver')
+    '''
+    ASSIGN_DRIVER = '''
+        UPDATE orders
+        SET driver_id = ?, status = 'driver_assigned'
+        WHERE id = ?
+    '''
+    USER_ORDERS = f'''
+        SELECT {ORDER_COLUMNS} FROM orders
+        WHERE client_id = ?
+        ORDER BY created_at DESC
+        LIMIT ?
+    '''
+    AVAILABLE_ORDERS = f'''
+        SELECT {ORDER_COLUMNS} FROM orders
+        WHERE status = 'new' OR status = 'searching_driver'
+        ORDER BY created_at ASC
+    '''
+    ASSIGN_DRIVER_TO_AVAILABLE_ORDER = '''
+        UPDATE orders
+        SET driver_id = ?, status = 'driver_assigned'
+        WHERE id = ? AND (status = 'new' OR status = 'searching_driver')
+    '''
+    DRIVER_ORDERS = f'''
+        SELECT {ORDER_COLUMNS} FROM orders
+        WHERE driver_id = ?
+        ORDER BY created_at DESC
+        LIMIT ?
+    '''
+    RECENT_ORDERS = f'''
+        SELECT {ORDER_COLUMNS} FROM orders
+        ORDER BY created_at DESC
+        LIMIT ?
+    '''
+    COUNT_ORDERS = 'SELECT COUNT(*) FROM orders'
+    COUNT_ACTIVE_ORDERS = '''
+        SELECT COUNT(*) FROM orders
+        WHERE status IN ('new', 'searching_driver', 'driver_assigned', 'in_progress')
+    '''
+    COUNT_COMPLETED_ORDERS = "SELECT COUNT(*) FROM orders WHERE status = 'completed'"
+    COUNT_PENDING_ORDERS = '''
+        SELECT COUNT(*) FROM orders
+        WHERE status IN ('new', 'searching_driver')
+    '''
+    COMPLETED_ORDER_ADDRESSES = '''
+        SELECT address, lat, lon, COUNT(*) AS uses FROM (
+            SELECT pickup_address AS address, pickup_lat AS lat, pickup_lon AS lon
+            FROM orders WHERE status = 'completed'
+            UNION ALL
+            SELECT destination_address, destination_lat, destination_lon
+            FROM orders WHERE status = 'completed'
+        )
+        WHERE address IS NOT NULL AND address NOT IN ('', 'Неизвестно', 'Неизвестный адрес')
+        GROUP BY address
+        ORDER BY uses DESC
+        LIMIT ?
+    '''
+    
+    # Очередь поиска водителей
+    CREATE_DISPATCH_QUEUE = '''
+        CREATE TABLE IF NOT EXISTS dispatch_queue (
+            order_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders (id)
+        )
+    '''
+    ADD_TO_DISPATCH_QUEUE = 'INSERT OR IGNORE INTO dispatch_queue (order_id) VALUES (?)'
+    MARK_DISPATCH_STARTED = '''
+        UPDATE dispatch_queue
+        SET attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+        WHERE order_id = ?
+    '''
+    REMOVE_FROM_DISPATCH_QUEUE = 'DELETE FROM dispatch_queue WHERE order_id = ?'
+    DISPATCH_QUEUE = 'SELECT order_id, attempts FROM dispatch_queue ORDER BY enqueued_at ASC, order_id ASC'
+    
+    # Состояния FSM
+    CREATE_FSM_STATES = '''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL NOT NULL
+        )
+    '''
+    FSM_STATE_BY_KEY = 'SELECT state, data, updated_at FROM fsm_states WHERE key = ?'
+    SAVE_FSM_STATE = 'INSERT OR REPLACE INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)'
+    DELETE_FSM_STATE = 'DELETE FROM fsm_states WHERE key = ?'
+    DELETE_STALE_FSM_STATES = 'DELETE FROM fsm_states WHERE updated_at < ?'
+    
+    # Кэш геокодирования
+    CREATE_GEOCODE_CACHE = '''
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            key TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            stored_at REAL NOT NULL
+        )
+    '''
+    GEOCODE_BY_KEY = 'SELECT lat, lon, stored_at FROM geocode_cache WHERE key = ? AND stored_at >= ?'
+    SAVE_GEOCODE = 'INSERT OR REPLACE INTO geocode_cache (key, lat, lon, stored_at) VALUES (?, ?, ?, ?)'
+    DELETE_STALE_GEOCODES = 'DELETE FROM geocode_cache WHERE stored_at < ?'
+    CREATE_REVERSE_GEOCODE_CACHE = '''
+        CREATE TABLE IF NOT EXISTS reverse_geocode_cache (
+            cell TEXT PRIMARY KEY,
+            address TEXT NOT NULL,
+            stored_at REAL NOT NULL
+        )
+    '''
+    REVERSE_GEOCODE_BY_CELL = 'SELECT address, stored_at FROM reverse_geocode_cache WHERE cell = ? AND stored_at >= ?'
+    SAVE_REVERSE_GEOCODE = 'INSERT OR REPLACE INTO reverse_geocode_cache (cell, address, stored_at) VALUES (?, ?, ?)'
+    DELETE_STALE_REVERSE_GEOCODES = 'DELETE FROM reverse_geocode_cache WHERE stored_at < ?'
+    TRIM_REVERSE_GEOCODES = '''
+        DELETE FROM reverse_geocode_cache
+        WHERE cell NOT IN (
+            SELECT cell FROM reverse_geocode_cache ORDER BY stored_at DESC LIMIT ?
+        )
+    '''
+    
+    # Кэш file_id отправленных карт
+    CREATE_MAP_FILE_IDS = '''
+        CREATE TABLE IF NOT EXISTS map_file_ids (
+            map_key TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            stored_at REAL NOT NULL
+        )
+    '''
+    MAP_FILE_ID_BY_KEY = 'SELECT file_id FROM map_file_ids WHERE map_key = ?'
+    SAVE_MAP_FILE_ID = 'INSERT OR REPLACE INTO map_file_ids (map_key, file_id, stored_at) VALUES (?, ?, ?)'
+    DELETE_MAP_FILE_ID = 'DELETE FROM map_file_ids WHERE map_key = ?'
+    TRIM_MAP_FILE_IDS = '''
+        DELETE FROM map_file_ids
+        WHERE map_key NOT IN (
+            SELECT map_key FROM map_file_ids ORDER BY stored_at DESC LIMIT ?
+        )
+    '''
+    
+    # Тарифы: базовые (без условий) и правила по дням недели, времени и зоне подачи
+    CREATE_PRICES = '''
+        CREATE TABLE IF NOT EXISTS prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_type TEXT NOT NULL,
+            base_fare REAL NOT NULL,
+            per_km_rate REAL NOT NULL,
+            minimum_fare REAL NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            days TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            zone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+    PRICES_COLUMNS = 'PRAGMA table_info(prices)'
+    # Колонки правил, которых нет в таблицах, созданных старыми версиями
+    PRICES_RULE_COLUMNS = {
+        'days': 'ALTER TABLE prices ADD COLUMN days TEXT',
+        'start_time': 'ALTER TABLE prices ADD COLUMN start_time TEXT',
+        'end_time': 'ALTER TABLE prices ADD COLUMN end_time TEXT',
+        'zone': 'ALTER TABLE prices ADD COLUMN zone TEXT'
+    }
+    SEED_PRICE = '''
+        INSERT INTO prices (service_type, base_fare, per_km_rate, minimum_fare)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM prices WHERE service_type = ?)
+    '''
+    ACTIVE_PRICES = '''
+        SELECT id, service_type, base_fare, per_km_rate, minimum_fare,
+               days, start_time, end_time, zone
+        FROM prices
+        WHERE is_active = 1
+    '''
+    INSERT_PRICE = '''
+        INSERT INTO prices (service_type, base_fare, per_km_rate, minimum_fare,
+                            days, start_time, end_time, zone)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    UPDATE_PRICE = '''
+        UPDATE prices
+        SET base_fare = ?, per_km_rate = ?, minimum_fare = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    '''
+    DEACTIVATE_PRICE = '''
+        UPDATE prices SET is_active = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND is_active = 1
+    '''
+    
+    # Фиксированные цены между зонами
+    CREATE_ZONE_FIXED_PRICES = '''
+        CREATE TABLE IF NOT EXISTS zone_fixed_prices (
+            from_zone TEXT NOT NULL,
+            to_zone TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            PRIMARY KEY (from_zone, to_zone)
+        )
+    '''
+    ZONE_FIXED_PRICES = 'SELECT from_zone, to_zone, price FROM zone_fixed_prices'
+    SAVE_ZONE_FIXED_PRICE = 'INSERT OR REPLACE INTO zone_fixed_prices (from_zone, to_zone, price) VALUES (?, ?, ?)'
+    DELETE_ZONE_FIXED_PRICE = 'DELETE FROM zone_fixed_prices WHERE from_zone = ? AND to_zone = ?'
+    
+    # Справочник адресов
+    CREATE_GAZETTEER = '''
+        CREATE TABLE IF NOT EXISTS gazetteer (
+            id INTEGER PRIMARY KEY,
+            address TEXT NOT NULL,
+            street TEXT NOT NULL,
+            house TEXT NOT NULL,
+            search_text TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL
+        )
+    '''
+    CREATE_GAZETTEER_FTS = '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS gazetteer_fts
+        USING fts5(search_text, content='gazetteer', content_rowid='id')
+    '''
+    INSERT_GAZETTEER = '''
+        INSERT INTO gazetteer (address, street, house, search_text, lat, lon)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    CLEAR_GAZETTEER = 'DELETE FROM gazetteer'
+    REBUILD_GAZETTEER_FTS = "INSERT INTO gazetteer_fts (gazetteer_fts) VALUES ('rebuild')"
+    COUNT_GAZETTEER = 'SELECT COUNT(*) FROM gazetteer'
+    SEARCH_GAZETTEER = '''
+        SELECT g.street, g.search_text, g.house, g.lat, g.lon
+        FROM gazetteer_fts f
+        JOIN gazetteer g ON g.id = f.rowid
+        WHERE gazetteer_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+    '''
+    
+    @staticmethod
+    def available_drivers_by_user_ids(count: int) -> str:
+        """Доступные водители из списка count пользователей (одним запросом)"""
+        placeholders = ', '.join('?' * count)
+        return f'''
+            SELECT {', '.join('d.' + column for column in model_columns(Driver))}
+            FROM drivers d
+            JOIN users u ON d.user_id = u.id
+            WHERE d.is_available = 1 AND u.is_active = 1 AND d.user_id IN ({placeholders})
+        '''
+    
+    @classmethod
+    def all(cls) -> List[str]:
+        """Все зарегистрированные запросы"""
+        return [
+            value for name, value in vars(cls).items()
+            if name.isupper() and isinstance(value, str)
+        ]
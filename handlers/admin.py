@@ -10,6 +10,10 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from config import Config
+from services.dispatch_scheduler import dispatch_scheduler
+from services.surge import surge_pricing
+from services.tariffs import SERVICE_TYPES, tariff_engine
+from services.zones import zone_matrix
 
 router = Router()
 
@@ -52,6 +56,147 @@ async def admin_command(message: Message):
     # Показываем панель администратора
     await show_admin_panel(message)
 
+async def is_admin(telegram_id: int) -> bool:
+    """Является ли пользователь администратором"""
+    user = await user_ops.get_user_by_telegram_id(telegram_id) if user_ops else None
+    return bool(user and user.role == 'admin')
+
+@router.message(Command("zones"))
+async def zones_command(message: Message):
+    """Сетка зон и фиксированные цены между зонами"""
+    if not await is_admin(message.from_user.id):
+        return
+    
+    if not zone_matrix.is_available:
+        await message.answer("🗺️ Зоны города не настроены (ZONE_BBOX) или не установлен NumPy")
+        return
+    
+    grid = zone_matrix.grid
+    zones_text = "🗺️ Зоны города\n\n"
+    zones_text += f"Сетка: {grid.rows} x {grid.cols} зон по {Config.ZONE_CELL_KM} км "
+    zones_text += f"({grid.label(0)} - северо-запад, {grid.label(grid.size - 1)} - юго-восток)\n\n"
+    
+    fixed_prices = zone_matrix.list_fixed_prices()
+    if fixed_prices:
+        zones_text += "📌 Фиксированные цены:\n"
+        for from_label, to_label, price in fixed_prices:
+            zones_text += f"   • {from_label} → {to_label}: {price} ₽\n"
+    else:
+        zones_text += "📌 Фиксированных цен нет\n"
+    
+    zones_text += "\nИзменить: /zone_price <из> <в> <цена|off>, например /zone_price B3 D5 350"
+    await message.answer(zones_text)
+
+@router.message(Command("zone_price"))
+async def zone_price_command(message: Message):
+    """Назначение фиксированной цены между зонами: /zone_price B3 D5 350"""
+    if not await is_admin(message.from_user.id):
+        return
+    
+    if not zone_matrix.is_available:
+        await message.answer("🗺️ Зоны города не настроены (ZONE_BBOX) или не установлен NumPy")
+        return
+    
+    args = (message.text or "").split()[1:]
+    if len(args) != 3:
+        await message.answer("Использование: /zone_price <из> <в> <цена|off>")
+        return
+    
+    from_zone = zone_matrix.grid.parse_label(args[0])
+    to_zone = zone_matrix.grid.parse_label(args[1])
+    if from_zone is None or to_zone is None:
+        await message.answer("❌ Неизвестная зона. Список зон: /zones")
+        return
+    
+    if args[2].lower() == 'off':
+        price = None
+    elif args[2].isdigit() and int(args[2]) > 0:
+        price = int(args[2])
+    else:
+        await message.answer("❌ Цена должна быть целым числом рублей или off")
+        return
+    
+    await zone_matrix.set_fixed_price(from_zone, to_zone, price)
+    
+    labels = f"{zone_matrix.grid.label(from_zone)} ↔ {zone_matrix.grid.label(to_zone)}"
+    if price is None:
+        await message.answer(f"✅ Фиксированная цена {labels} снята, цена считается по тарифу")
+    else:
+        await message.answer(f"✅ Фиксированная цена {labels}: {price} ₽")
+
+@router.message(Command("tariffs"))
+async def tariffs_command(message: Message):
+    """Все действующие правила тарифов"""
+    if not await is_admin(message.from_user.id):
+        return
+    
+    service_names = {'taxi': '🚕 Такси', 'delivery': '📦 Доставка'}
+    tariffs_text = "💰 Правила тарифов (сверху - приоритетнее)\n\n"
+    for tariff in tariff_engine.list_tariffs():
+        tariffs_text += f"#{tariff.id} {service_names.get(tariff.service_type, tariff.service_type)}, {tariff.describe()}: "
+        tariffs_text += f"{tariff.base_fare:.0f} ₽ + {tariff.per_km_rate:.0f} ₽/км, минимум {tariff.minimum_fare:.0f} ₽\n"
+    
+    tariffs_text += (
+        "\nДобавить: /tariff_rule <taxi|delivery> <дни|*> <ЧЧ:ММ-ЧЧ:ММ|*> <зона|*> <посадка> <за км> <минимум>\n"
+        "например /tariff_rule taxi 1-7 22:00-06:00 * 150 20 100\n"
+        "Отключить: /tariff_off <номер>"
+    )
+    await message.answer(tariffs_text)
+
+@router.message(Command("tariff_rule"))
+async def tariff_rule_command(message: Message):
+    """Правило тарифа: /tariff_rule taxi 6,7 * * 120 18 80"""
+    if not await is_admin(message.from_user.id):
+        return
+    
+    args = (message.text or "").split()[1:]
+    if len(args) != 7:
+        await message.answer("Использование: /tariff_rule <taxi|delivery> <дни|*> <ЧЧ:ММ-ЧЧ:ММ|*> <зона|*> <посадка> <за км> <минимум>")
+        return
+    
+    service_type, days, window, zone = args[:4]
+    rates = [parse_amount(value) for value in args[4:]]
+    if None in rates:
+        await message.answer("❌ Стоимость должна быть неотрицательным числом")
+        return
+    
+    start_time, _, end_time = window.partition('-') if window != '*' else (None, None, None)
+    if days == '*' and window == '*' and zone == '*':
+        await message.answer("❌ У правила должно быть хотя бы одно условие, базовый тариф меняется в панели тарифов")
+        return
+    if zone != '*' and (zone_matrix.grid is None or zone_matrix.grid.parse_label(zone) is None):
+        await message.answer("❌ Неизвестная зона. Список зон: /zones")
+        return
+    
+    try:
+        tariff_id = await tariff_engine.add_rule(
+            service_type, *rates,
+            days=None if days == '*' else days,
+            start_time=start_time, end_time=end_time,
+            zone=None if zone == '*' else zone
+        )
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+        return
+    
+    await message.answer(f"✅ Правило #{tariff_id} добавлено и уже действует. Все правила: /tariffs")
+
+@router.message(Command("tariff_off"))
+async def tariff_off_command(message: Message):
+    """Отключение правила тарифа: /tariff_off 5"""
+    if not await is_admin(message.from_user.id):
+        return
+    
+    args = (message.text or "").split()[1:]
+    if len(args) != 1 or not args[0].isdigit():
+        await message.answer("Использование: /tariff_off <номер>")
+        return
+    
+    if await tariff_engine.disable_rule(int(args[0])):
+        await message.answer(f"✅ Правило #{args[0]} отключено")
+    else:
+        await message.answer("❌ Правило не найдено или это базовый тариф. Все правила: /tariffs")
+
 async def show_admin_panel(message: Message):
     """Показывает панель администратора"""
     panel_text = "👑 Панель администратора\n\n"
@@ -237,15 +382,18 @@ async def admin_orders(callback: CallbackQuery):
 async def admin_tariffs(callback: CallbackQuery):
     """Управление тарифами"""
     tariffs_text = "💰 Управление тарифами\n\n"
-    tariffs_text += f"🚕 Такси:\n"
-    tariffs_text += f"   • Базовая стоимость: {Config.BASE_FARE} ₽\n"
-    tariffs_text += f"   • За километр: {Config.PER_KM_RATE} ₽\n"
-    tariffs_text += f"   • Минимальная стоимость: {Config.MINIMUM_FARE} ₽\n\n"
-    tariffs_text += f"📦 Доставка:\n"
-    tariffs_text += f"   • Базовая стоимость: {Config.DELIVERY_BASE_FARE} ₽\n"
-    tariffs_text += f"   • За километр: {Config.PER_KM_RATE} ₽\n"
-    tariffs_text += f"   • Минимальная стоимость: {Config.MINIMUM_FARE} ₽\n\n"
-    tariffs_text += "Выберите действие:"
+    for service_type, title in (('taxi', "🚕 Такси"), ('delivery', "📦 Доставка")):
+        tariff = tariff_engine.get_base_tariff(service_type)
+        tariffs_text += f"{title}:\n"
+        tariffs_text += f"   • Базовая стоимость: {tariff.base_fare:.0f} ₽\n"
+        tariffs_text += f"   • За километр: {tariff.per_km_rate:.0f} ₽\n"
+        tariffs_text += f"   • Минимальная стоимость: {tariff.minimum_fare:.0f} ₽\n\n"
+    rules_count = sum(1 for tariff in tariff_engine.list_tariffs() if not tariff.is_base)
+    tariffs_text += f"🕐 Правил по времени, дням и зонам: {rules_count} (/tariffs)\n"
+    if zone_matrix.is_available:
+        zone_stats = zone_matrix.get_stats()
+        tariffs_text += f"🗺️ Зоны: {zone_stats['zones']}, фиксированных цен: {zone_stats['fixed_prices']} (/zones)\n"
+    tariffs_text += "\nВыберите действие:"
     
     builder = InlineKeyboardBuilder()
     builder.button(text="✏️ Изменить тарифы", callback_data="admin_edit_tariffs")
@@ -261,6 +409,81 @@ async def admin_tariffs(callback: CallbackQuery):
         reply_markup=builder.as_markup()
     )
 
+@router.callback_query(F.data == "admin_edit_tariffs")
+async def admin_edit_tariffs(callback: CallbackQuery, state: FSMContext):
+    """Изменение базового тарифа: выбор услуги"""
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("🚫 Нет доступа", show_alert=True)
+        return
+    
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🚕 Такси", callback_data="admin_edit_tariff_taxi")
+    builder.button(text="📦 Доставка", callback_data="admin_edit_tariff_delivery")
+    builder.button(text="⬅️ Назад", callback_data="admin_tariffs")
+    builder.adjust(2, 1)
+    
+    await state.set_state(AdminSettingsStates.waiting_for_tariff_type)
+    await callback.message.edit_text("✏️ Какой тариф изменить?", reply_markup=builder.as_markup())
+
+@router.callback_query(AdminSettingsStates.waiting_for_tariff_type, F.data.startswith("admin_edit_tariff_"))
+async def admin_edit_tariff_type(callback: CallbackQuery, state: FSMContext):
+    """Изменение базового тарифа: ввод стоимости посадки"""
+    service_type = callback.data.replace("admin_edit_tariff_", "")
+    if service_type not in SERVICE_TYPES:
+        await callback.answer("❌ Неизвестная услуга", show_alert=True)
+        return
+    
+    tariff = tariff_engine.get_base_tariff(service_type)
+    await state.update_data(tariff_service_type=service_type)
+    await state.set_state(AdminSettingsStates.waiting_for_base_fare)
+    await callback.message.edit_text(
+        f"Базовая стоимость сейчас {tariff.base_fare:.0f} ₽\n\nВведите новую базовую стоимость (₽):"
+    )
+
+@router.message(AdminSettingsStates.waiting_for_base_fare, F.text)
+async def admin_edit_base_fare(message: Message, state: FSMContext):
+    """Изменение базового тарифа: ввод стоимости километра"""
+    base_fare = parse_amount(message.text)
+    if base_fare is None:
+        await message.answer("❌ Введите неотрицательное число")
+        return
+    
+    await state.update_data(tariff_base_fare=base_fare)
+    await state.set_state(AdminSettingsStates.waiting_for_per_km_rate)
+    await message.answer("Введите стоимость километра (₽):")
+
+@router.message(AdminSettingsStates.waiting_for_per_km_rate, F.text)
+async def admin_edit_per_km_rate(message: Message, state: FSMContext):
+    """Изменение базового тарифа: ввод минимальной стоимости"""
+    per_km_rate = parse_amount(message.text)
+    if per_km_rate is None:
+        await message.answer("❌ Введите неотрицательное число")
+        return
+    
+    await state.update_data(tariff_per_km_rate=per_km_rate)
+    await state.set_state(AdminSettingsStates.waiting_for_minimum_fare)
+    await message.answer("Введите минимальную стоимость поездки (₽):")
+
+@router.message(AdminSettingsStates.waiting_for_minimum_fare, F.text)
+async def admin_edit_minimum_fare(message: Message, state: FSMContext):
+    """Изменение базового тарифа: сохранение"""
+    minimum_fare = parse_amount(message.text)
+    if minimum_fare is None:
+        await message.answer("❌ Введите неотрицательное число")
+        return
+    
+    data = await state.get_data()
+    await state.clear()
+    await tariff_engine.set_base_tariff(
+        data['tariff_service_type'], data['tariff_base_fare'], data['tariff_per_km_rate'], minimum_fare
+    )
+    
+    await message.answer(
+        f"✅ Тариф изменен и уже действует: {data['tariff_base_fare']:.0f} ₽ + "
+        f"{data['tariff_per_km_rate']:.0f} ₽/км, минимум {minimum_fare:.0f} ₽",
+        reply_markup=get_back_to_admin_panel_keyboard()
+    )
+
 @router.callback_query(F.data == "admin_system")
 async def admin_system(callback: CallbackQuery):
     """Системные настройки"""
@@ -307,6 +530,13 @@ async def admin_monitoring(callback: CallbackQuery):
         monitoring_text += "📊 Статус в реальном времени:\n"
         monitoring_text += f"   🟢 Онлайн водителей: {online_drivers}\n"
         monitoring_text += f"   📋 Ожидающих заказов: {pending_orders}\n"
+        dispatch_stats = dispatch_scheduler.get_stats()
+        monitoring_text += f"   🔍 Поисков водителя: {dispatch_stats['running']}/{dispatch_stats['max_workers']} (в очереди: {dispatch_stats['queued']})\n"
+        if surge_pricing.is_enabled:
+            surge_stats = surge_pricing.get_stats()
+            monitoring_text += f"   ⚡ Повышенный спрос: {surge_stats['surge_zones']} зон, до x{surge_stats['max_multiplier']:.1f} "
+            monitoring_text += f"(ждут водителя: {surge_stats['waiting_orders']}, свободных водителей: {surge_stats['free_drivers']}, "
+            monitoring_text += f"на поездке: {surge_stats['busy_drivers']})\n"
         monitoring_text += f"   🕐 Время: {get_current_time()}\n\n"
         
         # Системные метрики
@@ -418,6 +648,14 @@ def get_current_time():
     now = datetime.now()
     return now.strftime("%d.%m.%Y %H:%M:%S")
 
+def parse_amount(text: str):
+    """Неотрицательная сумма в рублях из текста или None"""
+    try:
+        amount = float((text or "").strip().replace(',', '.'))
+    except ValueError:
+        return None
+    return amount if 0 <= amount < 1e6 else None
+
 def get_back_to_admin_panel_keyboard():
     """Клавиатура возврата к панели администратора"""
     builder = InlineKeyboardBuilder()
@@ -3,10 +3,12 @@
 """
 
 from aiogram import Router, F, Bot
-import io
 import asyncio
+import math
 import time
-from aiogram.types import Message, CallbackQuery, Location, ReplyKeyboardMarkup, KeyboardButton, InputFile
+from typing import Optional
+from aiogram.types import Message, CallbackQuery, Location, ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -14,12 +16,25 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from database.operations import UserOperations, OrderOperations
 from services.price_calculator import PriceCalculator
-from utils.maps import MapService
+from services.order_events import order_events
+from services.dispatch_scheduler import dispatch_scheduler
+from services.driver_index import driver_index
+from services.routing import road_router
+from services.surge import surge_pricing
+from services.tariffs import tariff_engine
+from services.zones import zone_matrix
+from utils.maps import map_service
+from utils.address_autocomplete import address_autocomplete
+from utils.quote_cache import FareQuote, quote_cache
 from utils.rate_limiter import TaxiOrderLimiter, DeliveryOrderLimiter
 from config import Config
 
 router = Router()
 
+# Ограничители заказов: общие для всех обработчиков, иначе счетчики теряются
+taxi_order_limiter = TaxiOrderLimiter()
+delivery_order_limiter = DeliveryOrderLimiter()
+
 class TaxiOrderStates(StatesGroup):
     """Состояния для заказа такси"""
     waiting_for_pickup = State()
@@ -352,8 +367,7 @@ async def order_taxi_callback(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     
     # Проверяем лимиты
-    limiter = TaxiOrderLimiter()
-    allowed, message = limiter.is_allowed(user_id)
+    allowed, message = taxi_order_limiter.is_allowed(user_id)
     if not allowed:
         await callback.answer(message, show_alert=True)
         return
@@ -375,8 +389,7 @@ async def order_delivery_callback(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     
     # Проверяем лимиты
-    limiter = DeliveryOrderLimiter()
-    allowed, message = limiter.is_allowed(user_id)
+    allowed, message = delivery_order_limiter.is_allowed(user_id)
     if not allowed:
         await callback.answer(message, show_alert=True)
         return
@@ -393,8 +406,7 @@ async def handle_pickup_location(message: Message, state: FSMContext):
     """Обработка местоположения отправления"""
     location = message.location
     
-    map_service = MapService()
-    pickup_address = map_service.reverse_geocode_coords(location.latitude, location.longitude)
+    pickup_address = await map_service.reverse_geocode_coords(location.latitude, location.longitude)
     
     await state.update_data(
         pickup_lat=location.latitude,
@@ -411,32 +423,25 @@ async def handle_pickup_location(message: Message, state: FSMContext):
 
 @router.message(TaxiOrderStates.waiting_for_pickup, F.text)
 async def handle_pickup_address(message: Message, state: FSMContext):
-    """Обработка адреса отправления (с геокодированием)"""
-    map_service = MapService()
-    geocoded_location = map_service.geocode_address(message.text)
+    """Обработка адреса отправления (с подсказками и геокодированием)"""
+    known = address_autocomplete.find(message.text)
+    if known:
+        pickup_address, pickup_lat, pickup_lon = known
+        await set_pickup_point(message, state, pickup_lat, pickup_lon, pickup_address)
+        return
+    
+    if await offer_address_suggestions(message, state, message.text):
+        return
+    
+    await geocode_pickup_address(message, state, message.text)
+
+async def geocode_pickup_address(message: Message, state: FSMContext, pickup_address: str):
+    """Геокодирование введенного адреса отправления"""
+    geocoded_location = await map_service.geocode_address(pickup_address)
 
     if geocoded_location:
         pickup_lat, pickup_lon = geocoded_location
-        await state.update_data(
-            pickup_lat=pickup_lat,
-            pickup_lon=pickup_lon,
-            pickup_address=message.text # Store the text address as well
-        )
-        await state.set_state(TaxiOrderStates.waiting_for_destination)
-        
-        map_service = MapService()
-        map_data = map_service.create_simple_map(pickup_lat, pickup_lon)
-        if map_data:
-            await message.answer_photo(
-                InputFile(io.BytesIO(map_data)),
-                caption=Config.MESSAGES['destination_needed'],
-                reply_markup=get_cancel_keyboard()
-            )
-        else:
-            await message.answer(
-                Config.MESSAGES['destination_needed'],
-                reply_markup=get_cancel_keyboard()
-            )
+        await set_pickup_point(message, state, pickup_lat, pickup_lon, pickup_address)
     else:
         # Removed debug print, replaced with logger.error in utils/maps.py
         await state.update_data(pickup_address="Неизвестно") # Ensure pickup_address is always set
@@ -449,6 +454,20 @@ async def handle_pickup_address(message: Message, state: FSMContext):
             reply_markup=get_cancel_keyboard()
         )
 
+async def set_pickup_point(message: Message, state: FSMContext, pickup_lat: float, pickup_lon: float, pickup_address: str):
+    """Сохранение точки отправления и запрос точки назначения"""
+    await state.update_data(
+        pickup_lat=pickup_lat,
+        pickup_lon=pickup_lon,
+        pickup_address=pickup_address # Store the text address as well
+    )
+    await state.set_state(TaxiOrderStates.waiting_for_destination)
+    
+    await answer_with_map(
+        message, Config.MESSAGES['destination_needed'], get_cancel_keyboard(),
+        pickup_lat, pickup_lon
+    )
+
 @router.message(TaxiOrderStates.waiting_for_destination, F.location)
 async def handle_destination_location(message: Message, state: FSMContext):
     """Обработка местоположения назначения"""
@@ -464,60 +483,17 @@ async def handle_destination_location(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    map_service = MapService()
-    destination_address = map_service.reverse_geocode_coords(location.latitude, location.longitude)
+    destination_address = await map_service.reverse_geocode_coords(location.latitude, location.longitude)
     
-    # Рассчитываем расстояние и цену
-    distance = PriceCalculator.calculate_distance(
-        pickup_lat, pickup_lon,
-        location.latitude, location.longitude
+    await set_destination_point(
+        message, state,
+        location.latitude, location.longitude,
+        destination_address if destination_address else "Неизвестный адрес"
     )
-    
-    price = PriceCalculator.calculate_taxi_price(distance)
-    
-    # Сохраняем данные о назначении
-    await state.update_data(
-        destination_lat=location.latitude,
-        destination_lon=location.longitude,
-        destination_address=destination_address if destination_address else "Неизвестный адрес",
-        distance=distance,
-        price=price
-    )
-    
-    await state.set_state(TaxiOrderStates.confirming_order)
-    
-    # Показываем подтверждение заказа
-    map_service = MapService()
-    map_data = map_service.create_simple_map(
-        data['pickup_lat'], data['pickup_lon'],
-        location.latitude, location.longitude # Use location.latitude, location.longitude here
-    )
-
-    confirmation_text = (
-        f"🚕 Подтвердите заказ такси:\n\n"
-        f"📍 Откуда: {data.get('pickup_address', 'Указанное местоположение')}\n"
-        f"🎯 Куда: {destination_address if destination_address else 'Указанное местоположение'}\n"
-        f"📏 Расстояние: {PriceCalculator.format_distance(distance)}\n"
-        f"💰 Стоимость: {PriceCalculator.format_price(price)}"
-    )
-
-    if map_data:
-        await message.answer_photo(
-            InputFile(io.BytesIO(map_data)),
-            caption=confirmation_text,
-            reply_markup=get_confirm_keyboard()
-        )
-    else:
-        await message.answer(
-            confirmation_text,
-            reply_markup=get_confirm_keyboard()
-        )
 
 @router.message(TaxiOrderStates.waiting_for_destination, F.text)
 async def handle_destination_address(message: Message, state: FSMContext):
-    """Обработка адреса назначения (с геокодированием)"""
-    destination_address = message.text
-    
+    """Обработка адреса назначения (с подсказками и геокодированием)"""
     data = await state.get_data()
     pickup_lat = data.get('pickup_lat')
     pickup_lon = data.get('pickup_lon')
@@ -527,8 +503,20 @@ async def handle_destination_address(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    map_service = MapService()
-    geocoded_location = map_service.geocode_address(destination_address)
+    known = address_autocomplete.find(message.text)
+    if known:
+        destination_address, destination_lat, destination_lon = known
+        await set_destination_point(message, state, destination_lat, destination_lon, destination_address)
+        return
+    
+    if await offer_address_suggestions(message, state, message.text):
+        return
+    
+    await geocode_destination_address(message, state, message.text)
+
+async def geocode_destination_address(message: Message, state: FSMContext, destination_address: str):
+    """Геокодирование введенного адреса назначения"""
+    geocoded_location = await map_service.geocode_address(destination_address)
 
     if geocoded_location:
         destination_lat, destination_lon = geocoded_location
@@ -540,75 +528,248 @@ async def handle_destination_address(message: Message, state: FSMContext):
         )
         return # Stop processing if geocoding fails
     
-    price, distance = PriceCalculator.calculate_taxi_price(
-        pickup_lat, pickup_lon,
-        destination_lat, destination_lon
+    await set_destination_point(message, state, destination_lat, destination_lon, destination_address)
+
+async def set_destination_point(message: Message, state: FSMContext, destination_lat: float, destination_lon: float, destination_address: str):
+    """Сохранение точки назначения, расчет цены и запрос подтверждения заказа"""
+    data = await state.get_data()
+    pickup_lat, pickup_lon = data['pickup_lat'], data['pickup_lon']
+    pickup_address = data.get('pickup_address', 'Указанное местоположение')
+    
+    # Действующий тариф (время, день недели, зона подачи) и коэффициент спроса - из памяти
+    tariff = tariff_engine.get_tariff('taxi', pickup_lat, pickup_lon)
+    surge = surge_pricing.get_multiplier(pickup_lat, pickup_lon)
+    
+    # Тот же маршрут по тем же тарифам уже рассчитывался - берем готовую цену
+    quote = quote_cache.lookup(
+        state.key.user_id, 'taxi',
+        pickup_lat, pickup_lon, pickup_address,
+        destination_lat, destination_lon, destination_address,
+        tariff.rates, surge
     )
+    if quote is None:
+        # Между зонами города цена берется из готовой матрицы, иначе
+        # считается по дорожному расстоянию (если граф дорог загружен)
+        zone_quote = zone_matrix.quote(pickup_lat, pickup_lon, destination_lat, destination_lon, tariff.rates, surge)
+        if zone_quote:
+            price, distance, duration = zone_quote
+        else:
+            route = await road_router.get_route(pickup_lat, pickup_lon, destination_lat, destination_lon)
+            price, distance = PriceCalculator.calculate_taxi_price(
+                pickup_lat, pickup_lon,
+                destination_lat, destination_lon,
+                *tariff.rates,
+                distance=route.distance_km if route else None,
+                surge=surge
+            )
+            duration = route.duration_min if route else None
+        
+        quote = quote_cache.store(
+            state.key.user_id, 'taxi',
+            pickup_lat, pickup_lon, pickup_address,
+            destination_lat, destination_lon, destination_address,
+            price, distance, duration, tariff.rates, surge
+        )
     
     await state.update_data(
         destination_address=destination_address,
         destination_lat=destination_lat,
         destination_lon=destination_lon,
-        distance=distance,
-        price=price
+        distance=quote.distance,
+        price=quote.price,
+        quote_id=quote.quote_id
     )
     
     await state.set_state(TaxiOrderStates.confirming_order)
+    await show_quote(message, quote)
+
+async def requote(message: Message, state: FSMContext) -> bool:
+    """
+    Новая котировка по маршруту из состояния диалога
     
-    map_service = MapService()
-    map_data = map_service.create_simple_map(
-        data['pickup_lat'], data['pickup_lon'],
-        destination_lat, destination_lon
+    Returns:
+        True, если маршрут сохранен и клиенту показана новая цена
+    """
+    data = await state.get_data()
+    if data.get('pickup_lat') is None or data.get('destination_lat') is None:
+        return False
+    
+    await message.answer("⏱ Цена устарела, мы пересчитали ее по вашему маршруту.")
+    await set_destination_point(
+        message, state,
+        data['destination_lat'], data['destination_lon'],
+        data.get('destination_address', 'Указанное местоположение')
     )
+    return True
 
+async def show_quote(message: Message, quote: FareQuote):
+    """Запрос подтверждения заказа по котировке (с картой маршрута)"""
     confirmation_text = (
         f"🚕 Подтвердите заказ такси:\n\n"
-        f"📍 Откуда: {data.get('pickup_address', 'Указанное местоположение')}\n"
-        f"🎯 Куда: {destination_address}\n"
-        f"📏 Расстояние: {PriceCalculator.format_distance(distance)}\n"
-        f"💰 Стоимость: {PriceCalculator.format_price(price)}"
+        f"📍 Откуда: {quote.pickup_address}\n"
+        f"🎯 Куда: {quote.destination_address}\n"
+        f"📏 Расстояние: {PriceCalculator.format_distance(quote.distance)}\n"
+        + (f"⏱ В пути: ~{PriceCalculator.format_time(math.ceil(quote.duration))}\n" if quote.duration else "")
+        + f"💰 Стоимость: {PriceCalculator.format_price(quote.price)}"
+        + (f"\n⚡ Повышенный спрос: x{quote.surge:.1f}" if quote.surge > 1.0 else "")
     )
+    
+    file_id = await answer_with_map(
+        message, confirmation_text, get_confirm_keyboard(quote.quote_id),
+        quote.pickup_lat, quote.pickup_lon,
+        quote.destination_lat, quote.destination_lon,
+        file_id=quote.map_file_id
+    )
+    if file_id and file_id != quote.map_file_id:
+        quote_cache.attach_map(quote, file_id)
 
-    if map_data:
-        await message.answer_photo(
-            InputFile(io.BytesIO(map_data)),
-            caption=confirmation_text,
-            reply_markup=get_confirm_keyboard()
-        )
-    else:
-        await message.answer(
-            confirmation_text,
-            reply_markup=get_confirm_keyboard()
-        )
+async def answer_with_map(message: Message, text: str, reply_markup,
+                          pickup_lat: float, pickup_lon: float,
+                          destination_lat: float = None, destination_lon: float = None,
+                          file_id: str = None) -> Optional[str]:
+    """
+    Ответ с картой маршрута (или текстом, если карту построить не удалось)
+    
+    Уже отправленная карта пересылается по file_id без отрисовки и загрузки.
+    
+    Args:
+        file_id: file_id карты этого маршрута, если он уже известен
+    
+    Returns:
+        file_id отправленной карты или None
+    """
+    key = map_data = None
+    if file_id is None:
+        key, file_id, map_data = await map_service.get_map(pickup_lat, pickup_lon, destination_lat, destination_lon)
+    
+    if file_id:
+        try:
+            await message.answer_photo(file_id, caption=text, reply_markup=reply_markup)
+            return file_id
+        except TelegramBadRequest as e:
+            # file_id недействителен: строим и загружаем карту заново
+            print(f"Карта {key or file_id} не отправлена по file_id: {e}")
+            if key is None:
+                key, _, _ = await map_service.get_map(pickup_lat, pickup_lon, destination_lat, destination_lon)
+            await map_service.forget_file_id(key)
+            key, _, map_data = await map_service.get_map(pickup_lat, pickup_lon, destination_lat, destination_lon)
+    
+    if not map_data:
+        await message.answer(text, reply_markup=reply_markup)
+        return None
+    
+    started = time.monotonic()
+    sent = await message.answer_photo(
+        BufferedInputFile(map_data, filename=map_service.map_filename(key)),
+        caption=text,
+        reply_markup=reply_markup
+    )
+    map_service.report_upload(len(map_data), time.monotonic() - started)
+    if not sent.photo:
+        return None
+    await map_service.remember_file_id(key, sent.photo[-1].file_id)
+    return sent.photo[-1].file_id
 
-@router.callback_query(F.data == "confirm_order")
-async def confirm_order(callback: CallbackQuery, state: FSMContext):
-    """Подтверждение заказа"""
+async def offer_address_suggestions(message: Message, state: FSMContext, text: str) -> bool:
+    """
+    Предложение известных адресов, начинающихся с введенного текста
+    
+    Returns:
+        True, если подсказки отправлены клиенту
+    """
+    suggestions = address_autocomplete.suggest(text)
+    if not suggestions:
+        return False
+    
+    # Подсказки храним в состоянии: кнопки ссылаются на них по номеру
+    await state.update_data(
+        address_typed=text,
+        address_suggestions=[list(suggestion) for suggestion in suggestions]
+    )
+    await message.answer(
+        "💡 Выберите адрес из списка или найдите введенный:",
+        reply_markup=get_address_suggestions_keyboard(suggestions)
+    )
+    return True
+
+@router.callback_query(F.data.startswith("address_suggestion_"))
+async def choose_address_suggestion(callback: CallbackQuery, state: FSMContext):
+    """Выбор адреса из подсказок"""
+    data = await state.get_data()
+    suggestions = data.get('address_suggestions') or []
+    try:
+        address, lat, lon = suggestions[int(callback.data.split("_")[2])]
+    except (ValueError, IndexError):
+        await callback.answer("❌ Подсказка устарела, введите адрес еще раз", show_alert=True)
+        return
+    
+    await callback.answer()
+    current_state = await state.get_state()
+    if current_state == TaxiOrderStates.waiting_for_pickup.state:
+        await set_pickup_point(callback.message, state, lat, lon, address)
+    elif current_state == TaxiOrderStates.waiting_for_destination.state:
+        await set_destination_point(callback.message, state, lat, lon, address)
+
+@router.callback_query(F.data == "address_search_typed")
+async def search_typed_address(callback: CallbackQuery, state: FSMContext):
+    """Геокодирование адреса в том виде, в котором его ввел клиент"""
     data = await state.get_data()
+    typed = data.get('address_typed')
+    if not typed:
+        await callback.answer("❌ Введите адрес еще раз", show_alert=True)
+        return
+    
+    await callback.answer("🔎 Ищем адрес...")
+    current_state = await state.get_state()
+    if current_state == TaxiOrderStates.waiting_for_pickup.state:
+        await geocode_pickup_address(callback.message, state, typed)
+    elif current_state == TaxiOrderStates.waiting_for_destination.state:
+        await geocode_destination_address(callback.message, state, typed)
+
+@router.callback_query(F.data.startswith("confirm_order"))
+async def confirm_order(callback: CallbackQuery, state: FSMContext):
+    """Подтверждение заказа по котировке"""
+    quote_id = callback.data[len("confirm_order_"):]
+    quote = quote_cache.get(quote_id, callback.from_user.id) if quote_id else None
+    if quote is None:
+        # Цена устарела (QUOTE_TTL) или бот перезапускался: пересчитываем ее
+        # по точкам из состояния диалога и просим подтвердить заново
+        await callback.answer()
+        if await requote(callback.message, state):
+            return
+        
+        # Кнопка от старого сообщения, маршрута в состоянии нет
+        await state.clear()
+        await callback.message.answer(
+            "⏱ Цена устарела. Пожалуйста, оформите заказ заново.",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
     
     # Создаем заказ в базе данных
     order = await order_ops.create_order(
         client_id=callback.from_user.id,
-        order_type='taxi',
-        pickup_lat=data['pickup_lat'],
-        pickup_lon=data['pickup_lon'],
-        pickup_address=data.get('pickup_address'), # Add pickup_address
-        destination_lat=data.get('destination_lat'),
-        destination_lon=data.get('destination_lon'),
-        destination_address=data.get('destination_address'), # Add destination_address
-        price=data['price'],
-        distance=data['distance']
+        order_type=quote.service_type,
+        pickup_lat=quote.pickup_lat,
+        pickup_lon=quote.pickup_lon,
+        pickup_address=quote.pickup_address,
+        destination_lat=quote.destination_lat,
+        destination_lon=quote.destination_lon,
+        destination_address=quote.destination_address,
+        price=quote.price,
+        distance=quote.distance
     )
     
     if order:
+        quote_cache.forget(quote.quote_id)
         await callback.message.edit_text(
             Config.MESSAGES['order_created'],
             reply_markup=get_main_menu_keyboard()
         )
         
-        # Запускаем процесс поиска и назначения водителя
-        await state.set_state(TaxiOrderStates.searching_for_driver)
-        await find_and_assign_driver(callback.message, order.id, state)
+        # Поиск водителя выполняется в фоне планировщиком
+        await state.clear()
+        await dispatch_scheduler.enqueue(order.id)
         
     else:
         await callback.message.edit_text(
@@ -830,23 +991,45 @@ async def handle_phone_number_text(message: Message, state: FSMContext):
 async def back_to_order_callback(callback: CallbackQuery, state: FSMContext):
     """Возврат к заказу"""
     await callback.answer("⬅️ Возвращаемся к заказу")
-    # Здесь можно добавить логику возврата к предыдущему шагу заказа
+    
+    # Рассчитанный заказ показываем снова - без геокодирования, расчета и карты
+    data = await state.get_data()
+    quote = quote_cache.get(data['quote_id'], callback.from_user.id) if data.get('quote_id') else None
+    if quote is not None:
+        await state.set_state(TaxiOrderStates.confirming_order)
+        await show_quote(callback.message, quote)
+        return
+    if await requote(callback.message, state):
+        return
+    
     await callback.message.edit_text(
         "⬅️ Возвращаемся к заказу...",
         reply_markup=get_cancel_keyboard()
     )
 
-async def find_and_assign_driver(message: Message, order_id: int, state: FSMContext):
+async def notify_client(chat_id: int, text: str, reply_markup=None):
+    """Отправка сообщения клиенту из фонового поиска водителя"""
+    try:
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+    except Exception as e:
+        print(f"Ошибка отправки сообщения клиенту {chat_id}: {e}")
+
+async def dispatch_order(order_id: int):
     """
     Находит доступных водителей и отправляет им запрос на принятие заказа.
-    """
-    await message.answer("🔍 Ищем ближайшего водителя...")
     
+    Выполняется планировщиком поиска в фоне, поэтому сообщения клиенту
+    отправляются по client_id заказа (Telegram ID клиента).
+    """
     order = await order_ops.get_order_by_id(order_id)
-    if not order:
-        await message.answer("❌ Заказ не найден. Попробуйте создать новый.", reply_markup=get_main_menu_keyboard())
-        await state.clear()
+    if not order or order.status not in (Config.ORDER_STATUSES['new'], Config.ORDER_STATUSES['searching_driver']):
+        # Заказ отменен или уже принят (например, пока бот был остановлен)
         return
+    
+    chat_id = order.client_id
+    # Пока водитель не найден, заказ учитывается в спросе своей зоны
+    surge_pricing.record_order(order_id, order.pickup_lat, order.pickup_lon)
+    await notify_client(chat_id, "🔍 Ищем ближайшего водителя...", get_cancel_search_keyboard(order_id))
 
     client_user = await user_ops.get_user_by_id(order.client_id)
     client_phone = client_user.phone if client_user else "Не указан"
@@ -854,84 +1037,242 @@ async def find_and_assign_driver(message: Message, order_id: int, state: FSMCont
     # Обновляем статус заказа на "searching_driver"
     await order_ops.update_order_status(order_id, Config.ORDER_STATUSES['searching_driver'])
 
-    # Получаем доступных водителей
+    # Получаем ближайших доступных водителей из пространственного индекса
     from database.operations import DriverOperations
-    driver_ops = DriverOperations(user_ops.db) # Assuming user_ops.db is accessible
-    available_drivers = await driver_ops.get_available_drivers()
+    driver_ops = DriverOperations(user_ops.db, driver_index)
+    available_drivers = await driver_ops.get_nearest_available_drivers(order.pickup_lat, order.pickup_lon)
 
     if not available_drivers:
-        await message.answer("😔 К сожалению, сейчас нет доступных водителей. Попробуйте позже.", reply_markup=get_main_menu_keyboard())
-        await order_ops.update_order_status(order_id, Config.ORDER_STATUSES['cancelled'])
-        await state.clear()
+        if await order_ops.cancel_order(order_id, "Нет свободных водителей"):
+            order_events.publish(order_id, order_events.CANCELLED)
+            await notify_client(chat_id, "😔 К сожалению, сейчас нет доступных водителей. Попробуйте позже.", get_main_menu_keyboard())
         return
 
-    # Сортируем водителей по расстоянию до точки отправления (простая эвристика)
-    # В реальном приложении здесь была бы более сложная логика с учетом трафика и т.д.
-    def sort_by_distance(driver):
-        if driver.current_location_lat and driver.current_location_lon:
-            return PriceCalculator.calculate_distance(
-                order.pickup_lat, order.pickup_lon,
-                driver.current_location_lat, driver.current_location_lon
-            )
-        return float('inf') # Отправляем водителей без координат в конец списка
+    # Подписываемся на события заказа до рассылки предложений,
+    # чтобы не пропустить мгновенный ответ водителя
+    events = order_events.subscribe(order_id)
+    try:
+        if Config.DISPATCH_MODE == 'broadcast':
+            # Рассылаем предложение сразу нескольким водителям расширяющимися волнами
+            accepted = await dispatch_broadcast(chat_id, order, client_phone, available_drivers, events)
+        else:
+            # Отправляем запрос водителям по очереди
+            accepted = await dispatch_sequential(chat_id, order, client_phone, available_drivers, events)
+        
+        if accepted is False:
+            # Отменяем заказ, только если его не успели принять в последний момент
+            if await order_ops.cancel_order(order_id, "Нет свободных водителей"):
+                order_events.publish(order_id, order_events.CANCELLED)
+                await notify_client(chat_id, "😔 К сожалению, ни один водитель не смог принять ваш заказ. Попробуйте позже.", get_main_menu_keyboard())
+            else:
+                updated_order = await order_ops.get_order_by_id(order_id)
+                await report_dispatch_result(chat_id, updated_order, {})
+    finally:
+        order_events.unsubscribe(order_id, events)
+
+def build_driver_offer(order, client_phone: str):
+    """Текст и клавиатура предложения заказа водителю"""
+    offer_text = (
+        f"🔔 Новый заказ #{order.id}!\n\n"
+        f"📍 Откуда: {order.pickup_address or f'{order.pickup_lat:.4f}, {order.pickup_lon:.4f}'}\n"
+        f"🎯 Куда: {order.destination_address or f'{order.destination_lat:.4f}, {order.destination_lon:.4f}'}\n"
+        f"📏 Расстояние: {PriceCalculator.format_distance(order.distance)}\n"
+        f"💰 Стоимость: {PriceCalculator.format_price(order.price)}\n\n"
+        f"📞 Телефон клиента: {client_phone}\n\n"
+        "Принять заказ?"
+    )
+    
+    builder = InlineKeyboardBuilder()
+    builder.button(text="✅ Принять", callback_data=f"driver_accept_order_{order.id}")
+    builder.button(text="❌ Отказаться", callback_data=f"driver_reject_order_{order.id}")
+    builder.button(text="📞 Позвонить клиенту", url=f"tel:{client_phone}") # Add call button
+    
+    return offer_text, builder.as_markup()
 
-    available_drivers.sort(key=sort_by_distance)
+async def send_driver_offer(driver, offer_text: str, reply_markup):
+    """
+    Отправка предложения заказа водителю
+    
+    Returns:
+        (пользователь-водитель, отправленное сообщение) или None при ошибке
+    """
+    driver_user = await user_ops.get_user_by_id(driver.user_id)
+    if not driver_user or not driver_user.telegram_id:
+        return None
+    
+    try:
+        sent = await bot.send_message(
+            chat_id=driver_user.telegram_id,
+            text=offer_text,
+            reply_markup=reply_markup
+        )
+        return driver_user, sent
+    except Exception as e:
+        print(f"Ошибка отправки запроса водителю {driver_user.telegram_id}: {e}")
+        return None
 
-    # Отправляем запрос водителям по очереди
-    for driver in available_drivers:
-        driver_user = await user_ops.get_user_by_id(driver.user_id) # Assuming get_user_by_id exists
-        if not driver_user or not driver_user.telegram_id:
-            continue
+async def withdraw_driver_offers(offers: dict, order_id: int, keep_user_id: int = None):
+    """
+    Отзыв разосланных предложений заказа
+    
+    Args:
+        offers: {user_id водителя: (пользователь-водитель, сообщение)}
+        order_id: ID заказа
+        keep_user_id: водитель, принявший заказ (его сообщение не трогаем)
+    """
+    async def withdraw(driver_user, sent):
+        try:
+            await bot.edit_message_text(
+                text=f"⌛ Заказ #{order_id} уже недоступен.",
+                chat_id=sent.chat.id,
+                message_id=sent.message_id
+            )
+        except Exception as e:
+            print(f"Не удалось отозвать предложение у водителя {driver_user.telegram_id}: {e}")
+    
+    await asyncio.gather(*[
+        withdraw(driver_user, sent)
+        for user_id, (driver_user, sent) in offers.items()
+        if user_id != keep_user_id
+    ])
 
-        offer_text = (
-            f"🔔 Новый заказ #{order.id}!\n\n"
-            f"📍 Откуда: {order.pickup_address or f'{order.pickup_lat:.4f}, {order.pickup_lon:.4f}'}\n"
-            f"🎯 Куда: {order.destination_address or f'{order.destination_lat:.4f}, {order.destination_lon:.4f}'}\n"
-            f"📏 Расстояние: {PriceCalculator.format_distance(order.distance)}\n"
-            f"💰 Стоимость: {PriceCalculator.format_price(order.price)}\n\n"
-            f"📞 Телефон клиента: {client_phone}\n\n"
-            "Принять заказ?"
-        )
+async def wait_for_driver_response(events, order_id: int, timeout: float, pending: set):
+    """
+    Ожидание ответа водителей по шине событий
+    
+    Args:
+        events: очередь подписки на события заказа
+        order_id: ID заказа
+        timeout: максимальное время ожидания в секундах
+        pending: водители, которые еще не ответили (отказавшиеся удаляются)
+    
+    Returns:
+        Обновленный заказ, если его приняли или отменили, иначе None
+        (таймаут или отказ всех водителей)
+    """
+    deadline = time.monotonic() + timeout
+    while pending:
+        event = await order_events.wait(events, deadline - time.monotonic())
+        if event is None:
+            return None
         
-        builder = InlineKeyboardBuilder()
-        builder.button(text="✅ Принять", callback_data=f"driver_accept_order_{order.id}")
-        builder.button(text="❌ Отказаться", callback_data=f"driver_reject_order_{order.id}")
-        builder.button(text="📞 Позвонить клиенту", url=f"tel:{client_phone}") # Add call button
+        if event.kind == order_events.REJECTED:
+            pending.discard(event.driver_id)
+            continue
         
-        try:
-            await bot.send_message(
-                chat_id=driver_user.telegram_id,
-                text=offer_text,
-                reply_markup=builder.as_markup()
-            )
-            await message.answer(f"➡️ Запрос отправлен водителю {driver_user.first_name} ({driver.car_model}). Ожидаем ответа...")
-            
-            # Ждем ответа водителя (например, 30 секунд)
-            # В реальном приложении здесь будет более сложная логика с таймаутами и очередями
-            await asyncio.sleep(Config.NOTIFICATION_TIMEOUT)
-            
-            # Проверяем статус заказа после ожидания
-            updated_order = await order_ops.get_order_by_id(order_id)
-            if updated_order.status == Config.ORDER_STATUSES['driver_assigned']:
-                await message.answer(f"✅ Водитель {driver_user.first_name} принял ваш заказ!")
-                await state.clear()
-                return # Заказ принят, выходим
-            elif updated_order.status == Config.ORDER_STATUSES['cancelled']:
-                await message.answer("❌ Заказ был отменен водителем или истек срок ожидания.", reply_markup=get_main_menu_keyboard())
-                await state.clear()
-                return
-            else:
-                await message.answer(f"Водитель {driver_user.first_name} не ответил или отказался. Ищем дальше...")
+        # Принятие или отмена: статус уже записан в БД
+        return await order_ops.get_order_by_id(order_id)
+    
+    return None
 
-        except Exception as e:
-            print(f"Ошибка отправки запроса водителю {driver_user.telegram_id}: {e}")
-            await message.answer(f"❌ Не удалось связаться с водителем {driver_user.first_name}. Ищем другого...")
+async def report_dispatch_result(chat_id: int, updated_order, offers: dict):
+    """
+    Сообщение клиенту об итоге поиска
+    
+    Returns:
+        True - водитель назначен, None - заказ отменен
+    """
+    if updated_order.status == Config.ORDER_STATUSES['driver_assigned']:
+        await withdraw_driver_offers(offers, updated_order.id, keep_user_id=updated_order.driver_id)
+        accepted_offer = offers.get(updated_order.driver_id)
+        driver_name = accepted_offer[0].first_name if accepted_offer else ""
+        await notify_client(chat_id, f"✅ Водитель {driver_name} принял ваш заказ!")
+        return True
+    
+    # Заказ отменен клиентом - он уже получил подтверждение отмены
+    await withdraw_driver_offers(offers, updated_order.id)
+    return None
+
+async def dispatch_sequential(chat_id: int, order, client_phone: str, drivers: list, events):
+    """
+    Предложение заказа водителям по одному
+    
+    Returns:
+        True - водитель назначен, False - никто не принял, None - заказ отменен
+    """
+    offer_text, reply_markup = build_driver_offer(order, client_phone)
+    
+    for driver in drivers:
+        offer = await send_driver_offer(driver, offer_text, reply_markup)
+        if not offer:
+            await notify_client(chat_id, "❌ Не удалось связаться с водителем. Ищем другого...")
             continue # Пробуем следующего водителя
+        
+        driver_user, sent = offer
+        await notify_client(chat_id, f"➡️ Запрос отправлен водителю {driver_user.first_name} ({driver.car_model}). Ожидаем ответа...")
+        
+        updated_order = await wait_for_driver_response(events, order.id, Config.NOTIFICATION_TIMEOUT, {driver.user_id})
+        if updated_order:
+            return await report_dispatch_result(chat_id, updated_order, {driver.user_id: offer})
+        
+        await withdraw_driver_offers({driver.user_id: offer}, order.id)
+        await notify_client(chat_id, f"Водитель {driver_user.first_name} не ответил или отказался. Ищем дальше...")
+    
+    return False
 
-    # Если ни один водитель не принял заказ
-    await message.answer("😔 К сожалению, ни один водитель не смог принять ваш заказ. Попробуйте позже.", reply_markup=get_main_menu_keyboard())
-    await order_ops.update_order_status(order_id, Config.ORDER_STATUSES['cancelled'])
-    await state.clear()
+async def dispatch_broadcast(chat_id: int, order, client_phone: str, drivers: list, events):
+    """
+    Одновременное предложение заказа нескольким ближайшим водителям
+    
+    Водители делятся на волны по DISPATCH_WAVE_SIZE. Предложения предыдущих
+    волн остаются в силе, поэтому заказ получает первый ответивший водитель,
+    а остальным предложения сразу отзываются. Если все водители волны
+    отказались, следующая волна рассылается без ожидания таймаута.
+    
+    Returns:
+        True - водитель назначен, False - никто не принял, None - заказ отменен
+    """
+    offer_text, reply_markup = build_driver_offer(order, client_phone)
+    offers = {}
+    pending = set()
+    wave_size = max(1, Config.DISPATCH_WAVE_SIZE)
+    
+    for wave_start in range(0, len(drivers), wave_size):
+        wave = drivers[wave_start:wave_start + wave_size]
+        results = await asyncio.gather(*[
+            send_driver_offer(driver, offer_text, reply_markup) for driver in wave
+        ])
+        
+        for driver, offer in zip(wave, results):
+            if offer:
+                offers[driver.user_id] = offer
+                pending.add(driver.user_id)
+        
+        if not pending:
+            continue
+        
+        await notify_client(chat_id, f"➡️ Заказ предложен водителям поблизости ({len(pending)}). Ожидаем ответа...")
+        
+        updated_order = await wait_for_driver_response(events, order.id, Config.NOTIFICATION_TIMEOUT, pending)
+        if updated_order:
+            return await report_dispatch_result(chat_id, updated_order, offers)
+    
+    await withdraw_driver_offers(offers, order.id)
+    return False
+
+@router.callback_query(F.data.startswith("cancel_search_"))
+async def cancel_search(callback: CallbackQuery, state: FSMContext):
+    """Отмена заказа клиентом во время поиска водителя"""
+    try:
+        order_id = int(callback.data.split("_")[2])
+    except ValueError:
+        await callback.answer("❌ Ошибка: неверный ID заказа", show_alert=True)
+        return
+    
+    order = await order_ops.get_order_by_id(order_id)
+    if not order or order.client_id != callback.from_user.id:
+        await callback.answer("❌ Заказ не найден", show_alert=True)
+        return
+    
+    if await order_ops.cancel_order(order_id, "Отменен клиентом"):
+        order_events.publish(order_id, order_events.CANCELLED)
+        await state.clear()
+        await callback.message.edit_text(
+            f"❌ Заказ #{order_id} отменен.",
+            reply_markup=get_main_menu_keyboard()
+        )
+    else:
+        await callback.answer("Заказ уже принят водителем или завершен.", show_alert=True)
 
 # Вспомогательные функции для клавиатур
 def get_phone_request_keyboard():
@@ -952,6 +1293,16 @@ def get_cancel_keyboard():
     builder.button(text=Config.BUTTONS['main_menu'], callback_data="main_menu")
     return builder.as_markup()
 
+def get_address_suggestions_keyboard(suggestions: list):
+    """Клавиатура подсказок адреса"""
+    builder = InlineKeyboardBuilder()
+    for number, (address, _, _) in enumerate(suggestions):
+        builder.button(text=f"📍 {address[:60]}", callback_data=f"address_suggestion_{number}")
+    builder.button(text="🔎 Найти введенный адрес", callback_data="address_search_typed")
+    builder.button(text=Config.BUTTONS['cancel'], callback_data="cancel_order")
+    builder.adjust(1)
+    return builder.as_markup()
+
 def get_location_keyboard():
     """Клавиатура для отправки местоположения"""
     keyboard = ReplyKeyboardMarkup(
@@ -963,10 +1314,10 @@ def get_location_keyboard():
     )
     return keyboard
 
-def get_confirm_keyboard():
-    """Клавиатура подтверждения"""
+def get_confirm_keyboard(quote_id: str):
+    """Клавиатура подтверждения заказа по котировке"""
     builder = InlineKeyboardBuilder()
-    builder.button(text=Config.BUTTONS['confirm'], callback_data="confirm_order")
+    builder.button(text=Config.BUTTONS['confirm'], callback_data=f"confirm_order_{quote_id}")
     builder.button(text=Config.BUTTONS['cancel'], callback_data="cancel_order")
     builder.button(text=Config.BUTTONS['main_menu'], callback_data="main_menu")
     return builder.as_markup()
@@ -978,6 +1329,12 @@ def get_back_keyboard():
     builder.button(text=Config.BUTTONS['main_menu'], callback_data="main_menu")
     return builder.as_markup()
 
+def get_cancel_search_keyboard(order_id: int):
+    """Клавиатура отмены поиска водителя"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text=Config.BUTTONS['cancel'], callback_data=f"cancel_search_{order_id}")
+    return builder.as_markup()
+
 def get_main_menu_keyboard():
     """Клавиатура главного меню"""
     builder = InlineKeyboardBuilder()
@@ -10,6 +10,8 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from config import Config
+from services.order_events import order_events
+from services.surge import surge_pricing
 from utils.validators import DataValidator
 
 router = Router()
@@ -342,6 +344,8 @@ async def driver_online(callback: CallbackQuery):
             return
         
         await driver_ops.update_driver_availability(user_db_id, True)
+        # Отдельного завершения поездки нет: выход на линию означает, что водитель свободен
+        surge_pricing.release_driver(user_db_id)
         await callback.answer("🟢 Вы стали доступным для заказов!")
         
         # Обновляем сообщение
@@ -436,10 +440,14 @@ async def driver_accept_order(callback: CallbackQuery):
         success = await order_ops.assign_driver_to_order(order_id, user_db_id)
         
         if success:
+            # Сразу сообщаем поиску водителя, что заказ принят
+            order_events.publish(order_id, order_events.ACCEPTED, user_db_id)
+            
             await callback.answer("✅ Заказ принят!")
             order = await order_ops.get_order_by_id(order_id)
             client_user = await user_ops.get_user_by_id(order.client_id)
             driver_user = await user_ops.get_user_by_id(user_db_id) # Get driver's user object
+            driver = await driver_ops.get_driver_by_user_id(user_db_id)
             
             driver_phone = driver_user.phone if driver_user else "Не указан"
             
@@ -491,19 +499,17 @@ async def driver_reject_order(callback: CallbackQuery):
         order_id = int(callback.data.split("_")[3])
         user_id = callback.from_user.id
         
-        # Просто уведомляем водителя, что заказ не принят
+        # Уведомляем водителя, что заказ не принят
         await callback.answer("❌ Вы отказались от заказа.")
         await callback.message.edit_text(
             f"Вы отказались от заказа #{order_id}.",
             reply_markup=get_back_to_driver_panel_keyboard()
         )
         
-        # В find_and_assign_driver будет логика перенаправления на другого водителя
-        # Здесь мы просто обновляем статус заказа, чтобы он снова стал "new" или "searching_driver"
-        # для возможности предложить его другому водителю.
-        # Однако, если мы хотим, чтобы find_and_assign_driver продолжил поиск,
-        # то не нужно менять статус здесь, а просто позволить таймауту сработать.
-        # Для простоты, пока не меняем статус здесь.
+        # Поиск водителя сразу переходит к следующим водителям, не дожидаясь таймаута
+        user_db_id = await user_ops.get_user_id_by_telegram_id(user_id)
+        if user_db_id:
+            order_events.publish(order_id, order_events.REJECTED, user_db_id)
         
     except ValueError:
         await callback.answer("❌ Ошибка: неверный ID заказа", show_alert=True)
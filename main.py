@@ -8,17 +8,28 @@ import sys
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 
 from config import Config
 from database.models import DatabaseManager
+from database.fsm_storage import SQLiteStorage
 from database.operations import UserOperations, OrderOperations, DriverOperations
-from handlers.client import router as client_router
+from handlers.client import router as client_router, dispatch_order
 from handlers.driver import router as driver_router
 from handlers.admin import router as admin_router
+from services.dispatch_scheduler import dispatch_scheduler
+from services.driver_index import driver_index
+from services.routing import road_router
+from services.surge import surge_pricing
+from services.tariffs import tariff_engine
+from services.zones import zone_matrix
 from utils.rate_limiter import RateLimiter
+from utils.maps import map_service
+from utils.geocode_cache import geocode_cache, reverse_geocode_cache
+from utils.map_cache import map_cache
+from utils.gazetteer import gazetteer
+from utils.address_autocomplete import address_autocomplete
 
 # Настройка логирования
 logging.basicConfig(
@@ -44,18 +55,23 @@ class RaiTaxiBot:
             logger.error(f"Ошибка конфигурации: {e}")
             sys.exit(1)
         
-        # Инициализируем бота и диспетчер
-        self.bot = Bot(token=Config.BOT_TOKEN)
-        self.storage = MemoryStorage()
-        self.dp = Dispatcher(storage=self.storage)
-        
         # Инициализируем базу данных
         self.db_manager = DatabaseManager(Config.DATABASE_PATH)
         
+        # Инициализируем бота и диспетчер (состояния диалогов хранятся в БД)
+        self.bot = Bot(token=Config.BOT_TOKEN)
+        self.storage = SQLiteStorage(
+            self.db_manager,
+            flush_interval=Config.FSM_FLUSH_INTERVAL,
+            state_ttl=Config.FSM_STATE_TTL,
+            cache_size=Config.FSM_CACHE_SIZE
+        )
+        self.dp = Dispatcher(storage=self.storage)
+        
         # Инициализируем операции с БД
         self.user_ops = UserOperations(self.db_manager)
         self.order_ops = OrderOperations(self.db_manager)
-        self.driver_ops = DriverOperations(self.db_manager)
+        self.driver_ops = DriverOperations(self.db_manager, driver_index)
         
         # Инициализируем систему защиты от спама
         self.rate_limiter = RateLimiter()
@@ -101,6 +117,54 @@ class RaiTaxiBot:
             logger.error("❌ Ошибка подключения к базе данных")
             return False
         
+        # Загружаем хранилище состояний диалогов
+        await self.storage.start()
+        
+        # Подключаем постоянный кэш геокодирования
+        expired = await geocode_cache.start(self.db_manager)
+        expired += await reverse_geocode_cache.start(self.db_manager)
+        logger.info(f"📍 Кэш геокодирования подключен, удалено устаревших адресов: {expired}")
+        
+        # Подключаем кэш отправленных карт
+        await map_cache.start(self.db_manager)
+        map_service.start()
+        
+        # Подключаем офлайн-справочник адресов
+        gazetteer_size = await gazetteer.start(self.db_manager)
+        logger.info(f"🏠 Справочник адресов: {gazetteer_size} адресов")
+        
+        # Загружаем дорожный граф для расчета маршрутов
+        graph_nodes = road_router.load()
+        if graph_nodes:
+            logger.info(f"🛣️ Дорожный граф загружен: {graph_nodes} узлов")
+        else:
+            logger.info(f"🛣️ Дорожный граф не найден ({Config.ROUTING_GRAPH_PATH}), расстояние считается по прямой")
+        
+        # Строим матрицу цен между зонами города
+        zones_count = await zone_matrix.start(self.db_manager)
+        if zones_count:
+            logger.info(f"🗺️ Матрица цен между зонами построена: {zones_count} зон")
+        
+        # Загружаем тарифы (после матрицы зон: она пересчитывается по тарифу)
+        tariffs_count = await tariff_engine.start(self.db_manager)
+        logger.info(f"💰 Тарифы загружены: {tariffs_count} правил")
+        
+        # Строим индекс подсказок адресов по выполненным заказам
+        suggestions_count = await address_autocomplete.load(self.db_manager)
+        logger.info(f"💡 Индекс подсказок адресов: {suggestions_count} адресов")
+        
+        # Запускаем расчет повышенного спроса (до заполнения индекса водителей:
+        # свободные водители считаются по его событиям)
+        surge_pricing.start()
+        
+        # Заполняем пространственный индекс водителей
+        drivers_count = await self.driver_ops.rebuild_driver_index()
+        logger.info(f"🗺️ Индекс водителей построен: {drivers_count} доступных")
+        
+        # Запускаем фоновый поиск водителей и продолжаем прерванные поиски
+        resumed = await dispatch_scheduler.start(self.order_ops, dispatch_order)
+        logger.info(f"🔍 Планировщик поиска водителей запущен, восстановлено поисков: {resumed}")
+        
         # Устанавливаем webhook если указан
         if webhook_url:
             await self.bot.set_webhook(url=webhook_url)
@@ -123,6 +187,18 @@ class RaiTaxiBot:
         # Удаляем webhook
         await self.bot.delete_webhook()
         
+        # Останавливаем поиски водителей (они продолжатся после запуска)
+        await dispatch_scheduler.stop()
+        
+        # Останавливаем расчет повышенного спроса
+        await surge_pricing.stop()
+        
+        # Сохраняем несохраненные состояния диалогов
+        await self.storage.close()
+        
+        # Закрываем HTTP-сессию геокодера
+        await map_service.close()
+        
         # Отключаемся от базы данных
         await self.db_manager.disconnect()
         
@@ -3,7 +3,34 @@
 """
 
 from .price_calculator import PriceCalculator
+from .driver_index import DriverSpatialIndex, driver_index
+from .order_events import OrderEvent, OrderEventBus, order_events
+from .dispatch_scheduler import DispatchScheduler, dispatch_scheduler
+from .routing import Route, RoadGraph, RoadRouter, road_router
+from .zones import ZoneGrid, ZoneMatrix, zone_matrix
+from .tariffs import Tariff, TariffTable, TariffEngine, tariff_engine
+from .surge import SurgePricing, surge_pricing
 
 __all__ = [
-    'PriceCalculator'
+    'PriceCalculator',
+    'DriverSpatialIndex',
+    'driver_index',
+    'OrderEvent',
+    'OrderEventBus',
+    'order_events',
+    'DispatchScheduler',
+    'dispatch_scheduler',
+    'Route',
+    'RoadGraph',
+    'RoadRouter',
+    'road_router',
+    'ZoneGrid',
+    'ZoneMatrix',
+    'zone_matrix',
+    'Tariff',
+    'TariffTable',
+    'TariffEngine',
+    'tariff_engine',
+    'SurgePricing',
+    'surge_pricing'
 ]
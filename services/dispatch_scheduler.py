@@ -0,0 +1,166 @@
+"""
+Планировщик поиска водителей Рай-Такси
+
+Поиск водителя для заказа выполняется фоновой задачей, а не внутри
+обработчика callback. Очередь заказов хранится в SQLite (таблица
+dispatch_queue), поэтому после перезапуска бота незавершенные поиски
+продолжаются. Одновременно выполняется не больше max_workers поисков.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class DispatchScheduler:
+    """Очередь поиска водителей с ограниченным пулом исполнителей"""
+    
+    def __init__(self, max_workers: int = 20, max_attempts: int = 3):
+        """
+        Args:
+            max_workers: максимум одновременно выполняемых поисков
+            max_attempts: сколько раз поиск заказа может быть запущен
+                (повторные запуски случаются после перезапуска бота)
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_attempts = max(1, max_attempts)
+        
+        self._order_ops = None
+        self._job: Optional[Callable[[int], Awaitable[None]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        # Заказы в очереди или в работе (защита от повторной постановки)
+        self._scheduled = set()
+        
+        self._stats = {
+            'enqueued': 0,
+            'resumed': 0,
+            'completed': 0,
+            'failed': 0,
+            'running': 0,
+            'max_running': 0
+        }
+    
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли планировщик"""
+        return bool(self._workers)
+    
+    async def start(self, order_operations, job: Callable[[int], Awaitable[None]]) -> int:
+        """
+        Запуск исполнителей и восстановление очереди из БД
+        
+        Args:
+            order_operations: операции с заказами (хранение очереди)
+            job: корутина поиска водителя, принимающая ID заказа
+        
+        Returns:
+            Количество восстановленных поисков
+        """
+        if self.is_running:
+            return 0
+        
+        self._order_ops = order_operations
+        self._job = job
+        self._queue = asyncio.Queue()
+        
+        await self._order_ops.ensure_dispatch_queue()
+        
+        resumed = 0
+        for order_id, attempts in await self._order_ops.get_dispatch_queue():
+            if attempts >= self.max_attempts:
+                # Поиск уже несколько раз прерывался - не запускаем его снова
+                logger.warning(f"Поиск водителя для заказа #{order_id} прерван {attempts} раз, заказ отменяется")
+                await self._order_ops.cancel_order(order_id, "Поиск водителя прерван")
+                await self._order_ops.remove_from_dispatch_queue(order_id)
+                continue
+            
+            self._scheduled.add(order_id)
+            self._queue.put_nowait(order_id)
+            resumed += 1
+        
+        self._stats['resumed'] += resumed
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f'dispatch-worker-{number}')
+            for number in range(self.max_workers)
+        ]
+        return resumed
+    
+    async def stop(self):
+        """
+        Остановка исполнителей
+        
+        Прерванные поиски остаются в таблице dispatch_queue и будут
+        продолжены при следующем запуске.
+        """
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._scheduled.clear()
+    
+    async def enqueue(self, order_id: int) -> bool:
+        """
+        Постановка заказа в очередь поиска
+        
+        Returns:
+            True, если заказ поставлен в очередь
+        """
+        if not self.is_running:
+            raise RuntimeError("Планировщик поиска водителей не запущен")
+        
+        if order_id in self._scheduled:
+            return False
+        
+        await self._order_ops.add_to_dispatch_queue(order_id)
+        self._scheduled.add(order_id)
+        self._queue.put_nowait(order_id)
+        self._stats['enqueued'] += 1
+        return True
+    
+    async def _worker(self):
+        """Исполнитель: берет заказы из очереди и выполняет поиск"""
+        while True:
+            order_id = await self._queue.get()
+            try:
+                await self._run(order_id)
+            except Exception as e:
+                logger.error(f"Ошибка обработки очереди поиска для заказа #{order_id}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, order_id: int):
+        """Выполнение поиска водителя для одного заказа"""
+        self._stats['running'] += 1
+        self._stats['max_running'] = max(self._stats['max_running'], self._stats['running'])
+        try:
+            # Отмечаем запуск до начала поиска, чтобы не перезапускать
+            # бесконечно заказ, на котором бот падает
+            await self._order_ops.mark_dispatch_started(order_id)
+            await self._job(order_id)
+            self._stats['completed'] += 1
+        except asyncio.CancelledError:
+            # Остановка бота: запись в очереди сохраняется для восстановления
+            raise
+        except Exception as e:
+            self._stats['failed'] += 1
+            logger.error(f"Ошибка поиска водителя для заказа #{order_id}: {e}")
+            await self._order_ops.cancel_order(order_id, "Ошибка поиска водителя")
+        finally:
+            self._stats['running'] -= 1
+            self._scheduled.discard(order_id)
+        
+        await self._order_ops.remove_from_dispatch_queue(order_id)
+    
+    def get_stats(self) -> Dict:
+        """Статистика планировщика"""
+        stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize() if self._queue else 0
+        stats['max_workers'] = self.max_workers
+        return stats
+
+# Общий планировщик процесса: запускается в main.py
+dispatch_scheduler = DispatchScheduler(Config.DISPATCH_MAX_CONCURRENT, Config.DISPATCH_MAX_ATTEMPTS)
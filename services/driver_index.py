@@ -0,0 +1,203 @@
+"""
+Пространственный индекс доступных водителей Рай-Такси
+
+Водители раскладываются по равномерной сетке (ячейки примерно одинакового
+размера в километрах). Поиск ближайших просматривает только ячейки внутри
+радиуса, поэтому его стоимость не зависит от размера автопарка.
+"""
+
+import heapq
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import Config
+from services.price_calculator import PriceCalculator
+
+# Километров в одном градусе широты
+KM_PER_DEGREE = 111.32
+
+class DriverSpatialIndex:
+    """Индекс доступных водителей на равномерной сетке"""
+    
+    def __init__(self, cell_size_km: float = 1.0):
+        """
+        Args:
+            cell_size_km: размер ячейки сетки в километрах
+        """
+        self.cell_size_km = cell_size_km
+        self.lat_step = cell_size_km / KM_PER_DEGREE
+        
+        # Последние известные координаты: {user_id: (lat, lon)}
+        self._positions: Dict[int, Tuple[float, float]] = {}
+        # Доступные водители
+        self._available: Set[int] = set()
+        # Сетка доступных водителей с координатами: {(row, col): {user_id, ...}}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        # Ячейка каждого водителя в сетке: {user_id: (row, col)}
+        self._driver_cells: Dict[int, Tuple[int, int]] = {}
+        # Подписчики на изменения: callback(user_id, (lat, lon) или None)
+        self._listeners: List[Callable[[int, Optional[Tuple[float, float]]], None]] = []
+    
+    def _row(self, lat: float) -> int:
+        """Номер строки сетки для широты"""
+        return math.floor(lat / self.lat_step)
+    
+    def _lon_step(self, row: int) -> float:
+        """Шаг ячейки по долготе для строки (ячейки сужаются к полюсам)"""
+        row_lat = (row + 0.5) * self.lat_step
+        return self.lat_step / max(math.cos(math.radians(row_lat)), 0.01)
+    
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Ячейка сетки для точки"""
+        row = self._row(lat)
+        return row, math.floor(lon / self._lon_step(row))
+    
+    def add_listener(self, callback: Callable[[int, Optional[Tuple[float, float]]], None]):
+        """
+        Подписка на изменения индекса
+        
+        callback(user_id, (lat, lon)) вызывается, когда доступный водитель
+        появляется в сетке, callback(user_id, None) - когда он из нее убран.
+        """
+        self._listeners.append(callback)
+    
+    def _place(self, user_id: int):
+        """Размещение водителя в сетке согласно его статусу и координатам"""
+        self._unplace(user_id)
+        
+        position = self._positions.get(user_id)
+        if user_id not in self._available or position is None:
+            return
+        
+        cell = self._cell(*position)
+        self._cells.setdefault(cell, set()).add(user_id)
+        self._driver_cells[user_id] = cell
+        for callback in self._listeners:
+            callback(user_id, position)
+    
+    def _unplace(self, user_id: int):
+        """Удаление водителя из сетки"""
+        cell = self._driver_cells.pop(user_id, None)
+        if cell is None:
+            return
+        
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(user_id)
+            if not members:
+                del self._cells[cell]
+        for callback in self._listeners:
+            callback(user_id, None)
+    
+    def load(self, drivers: Iterable):
+        """
+        Полная перестройка индекса
+        
+        Args:
+            drivers: водители (модели Driver) с координатами и признаком доступности
+        """
+        for user_id in list(self._driver_cells):
+            self._unplace(user_id)
+        self._positions.clear()
+        self._available.clear()
+        
+        for driver in drivers:
+            if driver.current_location_lat is not None and driver.current_location_lon is not None:
+                self._positions[driver.user_id] = (driver.current_location_lat, driver.current_location_lon)
+            if driver.is_available:
+                self._available.add(driver.user_id)
+            self._place(driver.user_id)
+    
+    def update_location(self, user_id: int, lat: float, lon: float):
+        """Обновление координат водителя"""
+        self._positions[user_id] = (lat, lon)
+        if user_id in self._available:
+            # Перемещаем только при смене ячейки
+            if self._driver_cells.get(user_id) != self._cell(lat, lon):
+                self._place(user_id)
+    
+    def set_available(self, user_id: int, is_available: bool):
+        """Обновление доступности водителя"""
+        if is_available:
+            self._available.add(user_id)
+        else:
+            self._available.discard(user_id)
+        self._place(user_id)
+    
+    def remove(self, user_id: int):
+        """Удаление водителя из индекса"""
+        self._unplace(user_id)
+        self._available.discard(user_id)
+        self._positions.pop(user_id, None)
+    
+    def nearest(self, lat: float, lon: float, k: int = 10,
+                radius_km: float = 10.0) -> List[Tuple[int, float]]:
+        """
+        Ближайшие доступные водители
+        
+        Args:
+            lat, lon: точка поиска (обычно точка подачи)
+            k: максимальное количество водителей
+            radius_km: радиус поиска в километрах
+        
+        Returns:
+            Список (user_id, расстояние_в_км), отсортированный по расстоянию
+        """
+        if k <= 0 or not self._cells:
+            return []
+        
+        radius_deg = radius_km / KM_PER_DEGREE
+        first_row = self._row(lat - radius_deg)
+        last_row = self._row(lat + radius_deg)
+        
+        # Водители из ячеек в пределах радиуса, расстояния считаются одним пакетом
+        user_ids = []
+        lats = []
+        lons = []
+        for row in range(first_row, last_row + 1):
+            lon_step = self._lon_step(row)
+            # Радиус в градусах долготы растет с широтой так же, как шаг ячейки
+            lon_radius = radius_deg * lon_step / self.lat_step
+            first_col = math.floor((lon - lon_radius) / lon_step)
+            last_col = math.floor((lon + lon_radius) / lon_step)
+            
+            for col in range(first_col, last_col + 1):
+                members = self._cells.get((row, col))
+                if not members:
+                    continue
+                for user_id in members:
+                    driver_lat, driver_lon = self._positions[user_id]
+                    user_ids.append(user_id)
+                    lats.append(driver_lat)
+                    lons.append(driver_lon)
+        
+        if not user_ids:
+            return []
+        
+        distances = PriceCalculator.calculate_distances(lat, lon, lats, lons)
+        candidates = [
+            (round(float(distance), 2), user_id)
+            for distance, user_id in zip(distances, user_ids)
+            if distance <= radius_km
+        ]
+        return [(user_id, distance) for distance, user_id in heapq.nsmallest(k, candidates)]
+    
+    def get_unlocated_available(self) -> List[int]:
+        """Доступные водители, координаты которых неизвестны"""
+        return [user_id for user_id in self._available if user_id not in self._positions]
+    
+    def get_position(self, user_id: int) -> Optional[Tuple[float, float]]:
+        """Последние известные координаты водителя"""
+        return self._positions.get(user_id)
+    
+    def get_stats(self) -> Dict:
+        """Статистика индекса"""
+        return {
+            'available_drivers': len(self._available),
+            'indexed_drivers': len(self._driver_cells),
+            'cells': len(self._cells),
+            'cell_size_km': self.cell_size_km
+        }
+
+# Общий индекс процесса: передается в DriverOperations в main.py
+driver_index = DriverSpatialIndex(Config.DRIVER_INDEX_CELL_KM)
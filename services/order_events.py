@@ -0,0 +1,85 @@
+"""
+Шина событий заказов Рай-Такси
+
+Обработчики водителей и клиентов публикуют события (принятие, отказ,
+отмена), а поиск водителя ждет их вместо периодического опроса БД.
+Слушатели всех событий (например, расчет повышенного спроса) получают
+каждое событие сразу при публикации. Шина работает внутри процесса и не
+хранит события без подписчиков.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+@dataclass
+class OrderEvent:
+    """Событие заказа"""
+    order_id: int
+    kind: str  # 'accepted', 'rejected' или 'cancelled'
+    driver_id: Optional[int] = None
+
+class OrderEventBus:
+    """Шина событий заказов с подписками по ID заказа"""
+    
+    ACCEPTED = 'accepted'
+    REJECTED = 'rejected'
+    CANCELLED = 'cancelled'
+    
+    def __init__(self):
+        # Подписчики: {order_id: {очередь, ...}}
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        # Слушатели всех заказов: callback(событие)
+        self._listeners: List[Callable[[OrderEvent], None]] = []
+    
+    def add_listener(self, callback: Callable[[OrderEvent], None]):
+        """Подписка на события всех заказов (callback вызывается синхронно)"""
+        self._listeners.append(callback)
+    
+    def subscribe(self, order_id: int) -> asyncio.Queue:
+        """Подписка на события заказа"""
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(order_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, order_id: int, queue: asyncio.Queue):
+        """Отписка от событий заказа"""
+        queues = self._subscribers.get(order_id)
+        if queues is None:
+            return
+        
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[order_id]
+    
+    def publish(self, order_id: int, kind: str, driver_id: int = None) -> int:
+        """
+        Публикация события заказа
+        
+        Returns:
+            Количество подписчиков, получивших событие
+        """
+        queues = self._subscribers.get(order_id, ())
+        event = OrderEvent(order_id, kind, driver_id)
+        for queue in queues:
+            queue.put_nowait(event)
+        for callback in self._listeners:
+            callback(event)
+        return len(queues)
+    
+    async def wait(self, queue: asyncio.Queue, timeout: float) -> Optional[OrderEvent]:
+        """
+        Ожидание следующего события из очереди подписки
+        
+        Returns:
+            Событие или None по истечении таймаута
+        """
+        if timeout <= 0:
+            return None
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+# Общая шина процесса
+order_events = OrderEventBus()
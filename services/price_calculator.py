@@ -3,9 +3,41 @@
 """
 
 import math
-from typing import Tuple, Optional
+from typing import Sequence, Tuple, Optional, Union
 from config import Config
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Радиус Земли в километрах
+EARTH_RADIUS_KM = 6371
+
+# С какого размера пакета NumPy быстрее цикла на Python
+NUMPY_MIN_BATCH = 16
+
+Coordinate = Union[float, Sequence[float]]
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками в километрах (без округления)"""
+    # Переводим координаты в радианы
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+    
+    # Разности координат
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    
+    # Формула гаверсинуса
+    a = (math.sin(dlat / 2) ** 2 + 
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    
+    return EARTH_RADIUS_KM * c
+
 class PriceCalculator:
     """Калькулятор стоимости поездок и доставки"""
     
@@ -15,34 +47,43 @@ class PriceCalculator:
         Расчет расстояния между двумя точками (формула гаверсинуса)
         Возвращает расстояние в километрах
         """
-        # Радиус Земли в километрах
-        R = 6371
-        
-        # Переводим координаты в радианы
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        # Разности координат
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        # Формула гаверсинуса
-        a = (math.sin(dlat / 2) ** 2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        # Округляем до 2 знаков после запятой
+        return round(_haversine_km(lat1, lon1, lat2, lon2), 2)
+    
+    @staticmethod
+    def calculate_distances(lat1: Coordinate, lon1: Coordinate,
+                            lats2: Sequence[float], lons2: Sequence[float]) -> Sequence[float]:
+        """
+        Пакетный расчет расстояний (формула гаверсинуса) за один проход
         
-        distance = R * c
+        Args:
+            lat1, lon1: одна точка или массивы точек той же длины, что lats2
+                (массивы NumPy транслируются: столбец и строка дают матрицу)
+            lats2, lons2: массивы координат
         
-        # Округляем до 2 знаков после запятой
-        return round(distance, 2)
+        Returns:
+            Расстояния в километрах без округления: массив NumPy, если он
+            установлен и точек много, иначе список
+        """
+        single = not hasattr(lat1, '__len__')
+        if np is not None and (len(lats2) >= NUMPY_MIN_BATCH or isinstance(lat1, np.ndarray)):
+            lat1_rad, lon1_rad = np.radians(lat1), np.radians(lon1)
+            lat2_rad, lon2_rad = np.radians(np.asarray(lats2, dtype=float)), np.radians(np.asarray(lons2, dtype=float))
+            a = (np.sin((lat2_rad - lat1_rad) / 2) ** 2 +
+                 np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin((lon2_rad - lon1_rad) / 2) ** 2)
+            a = np.minimum(a, 1.0)
+            return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        
+        if single:
+            return [_haversine_km(lat1, lon1, lat2, lon2) for lat2, lon2 in zip(lats2, lons2)]
+        return [_haversine_km(*points) for points in zip(lat1, lon1, lats2, lons2)]
     
     @staticmethod
     def calculate_taxi_price(pickup_lat: float, pickup_lon: float,
                            destination_lat: float, destination_lon: float,
                            base_fare: float = None, per_km_rate: float = None,
-                           minimum_fare: float = None) -> Tuple[float, float]:
+                           minimum_fare: float = None, distance: float = None,
+                           surge: float = 1.0) -> Tuple[float, float]:
         """
         Расчет стоимости поездки на такси
         
@@ -52,6 +93,8 @@ class PriceCalculator:
             base_fare: базовая стоимость (по умолчанию из конфига)
             per_km_rate: стоимость за километр (по умолчанию из конфига)
             minimum_fare: минимальная стоимость (по умолчанию из конфига)
+            distance: дорожное расстояние в км (по умолчанию - по прямой)
+            surge: коэффициент повышенного спроса
         
         Returns:
             Tuple[цена, расстояние_в_км]
@@ -64,10 +107,11 @@ class PriceCalculator:
         if minimum_fare is None:
             minimum_fare = Config.MINIMUM_FARE
         
-        # Рассчитываем расстояние
-        distance = PriceCalculator.calculate_distance(
-            pickup_lat, pickup_lon, destination_lat, destination_lon
-        )
+        # Рассчитываем расстояние, если маршрут не построен
+        if distance is None:
+            distance = PriceCalculator.calculate_distance(
+                pickup_lat, pickup_lon, destination_lat, destination_lon
+            )
         
         # Рассчитываем стоимость
         price = base_fare + (distance * per_km_rate)
@@ -76,6 +120,9 @@ class PriceCalculator:
         if price < minimum_fare:
             price = minimum_fare
         
+        # Повышенный спрос
+        price *= surge
+        
         # Округляем до целых рублей
         price = round(price)
         
@@ -86,7 +133,7 @@ class PriceCalculator:
                                destination_lat: float, destination_lon: float,
                                item_weight: float = 1.0, is_urgent: bool = False,
                                base_fare: float = None, per_km_rate: float = None,
-                               minimum_fare: float = None) -> Tuple[float, float]:
+                               minimum_fare: float = None, surge: float = 1.0) -> Tuple[float, float]:
         """
         Расчет стоимости доставки
         
@@ -98,6 +145,7 @@ class PriceCalculator:
             base_fare: базовая стоимость (по умолчанию из конфига)
             per_km_rate: стоимость за километр (по умолчанию из конфига)
             minimum_fare: минимальная стоимость (по умолчанию из конфига)
+            surge: коэффициент повышенного спроса
         
         Returns:
             Tuple[цена, расстояние_в_км]
@@ -137,6 +185,9 @@ class PriceCalculator:
         if price < minimum_fare:
             price = minimum_fare
         
+        # Повышенный спрос
+        price *= surge
+        
         # Округляем до целых рублей
         price = round(price)
         
@@ -0,0 +1,457 @@
+"""
+Локальная маршрутизация по дорожному графу Рай-Такси
+
+Граф дорог зоны обслуживания строится из выгрузки OSM и хранится в
+компактных массивах (смежность в формате CSR: смещения, концы ребер,
+длины и время проезда). Маршрут ищется алгоритмом A* по времени в пути
+с эвристикой "прямая на максимальной скорости" и возвращает дорожное
+расстояние, время и линию маршрута без обращения к сети.
+
+Построение графа:
+    python -m services.routing extract.osm
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ElementTree
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Километров в одном градусе широты
+KM_PER_DEGREE = 111.32
+
+# Скорость по типу дороги (км/ч), если в OSM не указана maxspeed
+ROAD_SPEEDS = {
+    'motorway': 90, 'motorway_link': 45,
+    'trunk': 70, 'trunk_link': 40,
+    'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 35,
+    'tertiary': 40, 'tertiary_link': 30,
+    'unclassified': 30, 'residential': 25,
+    'living_street': 10, 'service': 15,
+}
+
+# Скорость на участке от точки до ближайшего узла графа (км/ч)
+ACCESS_SPEED = 20
+
+GRAPH_MAGIC = b'RTG1'
+GRAPH_HEADER = struct.Struct('<4sII')
+
+@dataclass
+class Route:
+    """Найденный маршрут"""
+    distance_km: float
+    duration_min: float
+    points: List[Tuple[float, float]]
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между точками в метрах"""
+    lat1_rad, lat2_rad = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((lat2_rad - lat1_rad) / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371000 * math.asin(math.sqrt(min(1.0, a)))
+
+class RoadGraph:
+    """Дорожный граф в массивах"""
+    
+    def __init__(self, lat: array, lon: array, offsets: array, targets: array,
+                 lengths: array, durations: array):
+        """
+        Args:
+            lat, lon: координаты узлов
+            offsets: начало ребер узла i в targets (длина - узлов + 1)
+            targets: конечные узлы ребер
+            lengths: длины ребер в метрах
+            durations: время проезда ребер в секундах
+        """
+        self.lat = lat
+        self.lon = lon
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.durations = durations
+    
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+    
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+    
+    @classmethod
+    def from_edges(cls, coords: List[Tuple[float, float]],
+                   edges: List[Tuple[int, int, float, float]]) -> 'RoadGraph':
+        """
+        Граф из списка ребер
+        
+        Args:
+            coords: координаты узлов [(lat, lon), ...]
+            edges: ребра [(из, в, длина_м, время_с), ...]
+        """
+        edges.sort()
+        offsets = array('I', [0] * (len(coords) + 1))
+        for source, _, _, _ in edges:
+            offsets[source + 1] += 1
+        for index in range(len(coords)):
+            offsets[index + 1] += offsets[index]
+        
+        return cls(
+            array('d', (lat for lat, _ in coords)),
+            array('d', (lon for _, lon in coords)),
+            offsets,
+            array('I', (edge[1] for edge in edges)),
+            array('f', (edge[2] for edge in edges)),
+            array('f', (edge[3] for edge in edges))
+        )
+    
+    def save(self, path: str):
+        """Запись графа в двоичный файл"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, self.node_count, self.edge_count))
+            for values in (self.lat, self.lon, self.offsets, self.targets, self.lengths, self.durations):
+                values.tofile(f)
+    
+    @classmethod
+    def load(cls, path: str) -> 'RoadGraph':
+        """Чтение графа из двоичного файла"""
+        with open(path, 'rb') as f:
+            magic, nodes, edges = GRAPH_HEADER.unpack(f.read(GRAPH_HEADER.size))
+            if magic != GRAPH_MAGIC:
+                raise ValueError(f"{path} не является файлом дорожного графа")
+            
+            arrays = []
+            for typecode, count in (('d', nodes), ('d', nodes), ('I', nodes + 1),
+                                    ('I', edges), ('f', edges), ('f', edges)):
+                values = array(typecode)
+                values.fromfile(f, count)
+                arrays.append(values)
+        return cls(*arrays)
+
+class RoadRouter:
+    """Поиск маршрутов по дорожному графу"""
+    
+    def __init__(self, graph_path: str = None, max_snap_m: float = None,
+                 cache_size: int = None, snap_cell_km: float = 0.25):
+        """
+        Args:
+            graph_path: файл дорожного графа
+            max_snap_m: максимальное расстояние от точки до дороги в метрах
+            cache_size: максимум маршрутов в кэше
+            snap_cell_km: размер ячейки сетки поиска ближайшего узла
+        """
+        self.graph_path = graph_path or Config.ROUTING_GRAPH_PATH
+        self.max_snap_m = max_snap_m or Config.ROUTING_MAX_SNAP_M
+        self.cache_size = max(1, cache_size or Config.ROUTING_CACHE_SIZE)
+        self.lat_step = snap_cell_km / KM_PER_DEGREE
+        
+        self.graph: Optional[RoadGraph] = None
+        # Узлы графа по ячейкам сетки: {(row, col): [узел, ...]}
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        # Максимальная скорость в графе (м/с) для эвристики A*
+        self._max_speed = 1.0
+        # Маршруты по округленным точкам: {ключ: Route или None}
+        self._cache: 'OrderedDict[tuple, Optional[Route]]' = OrderedDict()
+        self._stats = {'routes': 0, 'cache_hits': 0, 'not_found': 0}
+    
+    @property
+    def is_available(self) -> bool:
+        """Загружен ли граф"""
+        return self.graph is not None and self.graph.node_count > 0
+    
+    def load(self) -> int:
+        """
+        Загрузка дорожного графа
+        
+        Returns:
+            Количество узлов (0, если файла графа нет)
+        """
+        if not os.path.exists(self.graph_path):
+            return 0
+        
+        graph = RoadGraph.load(self.graph_path)
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for node in range(graph.node_count):
+            cells.setdefault(self._cell(graph.lat[node], graph.lon[node]), []).append(node)
+        
+        max_speed = 1.0
+        for length, duration in zip(graph.lengths, graph.durations):
+            if duration > 0:
+                max_speed = max(max_speed, length / duration)
+        
+        self.graph = graph
+        self._cells = cells
+        self._max_speed = max_speed
+        self._cache.clear()
+        return graph.node_count
+    
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Ячейка сетки для точки"""
+        row = math.floor(lat / self.lat_step)
+        lon_step = self.lat_step / max(math.cos(math.radians((row + 0.5) * self.lat_step)), 0.01)
+        return row, math.floor(lon / lon_step)
+    
+    def snap(self, lat: float, lon: float) -> Optional[Tuple[int, float]]:
+        """
+        Ближайший к точке узел графа
+        
+        Returns:
+            (узел, расстояние_в_метрах) или None, если дорога дальше max_snap_m
+        """
+        row, col = self._cell(lat, lon)
+        rings = int(self.max_snap_m / 1000 / (self.lat_step * KM_PER_DEGREE)) + 1
+        
+        best = None
+        for d_row in range(-rings, rings + 1):
+            for d_col in range(-rings, rings + 1):
+                for node in self._cells.get((row + d_row, col + d_col), ()):
+                    distance = haversine_m(lat, lon, self.graph.lat[node], self.graph.lon[node])
+                    if best is None or distance < best[1]:
+                        best = (node, distance)
+        
+        if best is None or best[1] > self.max_snap_m:
+            return None
+        return best
+    
+    def find_route(self, pickup_lat: float, pickup_lon: float,
+                   destination_lat: float, destination_lon: float) -> Optional[Route]:
+        """
+        Поиск самого быстрого маршрута (A*)
+        
+        Returns:
+            Маршрут или None, если граф не загружен, точка далеко от дорог
+            или маршрута между точками нет
+        """
+        if not self.is_available:
+            return None
+        
+        start = self.snap(pickup_lat, pickup_lon)
+        finish = self.snap(destination_lat, destination_lon)
+        if start is None or finish is None:
+            return None
+        
+        graph = self.graph
+        source, target = start[0], finish[0]
+        target_lat, target_lon = graph.lat[target], graph.lon[target]
+        cos_lat = math.cos(math.radians(target_lat))
+        meters_per_degree = KM_PER_DEGREE * 1000
+        max_speed = self._max_speed
+        
+        def heuristic(node: int) -> float:
+            # Равнопромежуточная проекция: на масштабе города точнее гаверсинуса не нужно
+            dx = (graph.lon[node] - target_lon) * cos_lat
+            dy = graph.lat[node] - target_lat
+            return math.sqrt(dx * dx + dy * dy) * meters_per_degree / max_speed
+        
+        offsets, targets, durations = graph.offsets, graph.targets, graph.durations
+        best_time = {source: 0.0}
+        previous: Dict[int, Tuple[int, int]] = {}
+        heap = [(heuristic(source), 0.0, source)]
+        
+        while heap:
+            _, elapsed, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if elapsed > best_time[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                candidate = elapsed + durations[edge]
+                if candidate < best_time.get(neighbour, math.inf):
+                    best_time[neighbour] = candidate
+                    previous[neighbour] = (node, edge)
+                    heapq.heappush(heap, (candidate + heuristic(neighbour), candidate, neighbour))
+        else:
+            return None
+        
+        # Восстанавливаем путь от конца к началу
+        length = 0.0
+        nodes = [target]
+        node = target
+        while node != source:
+            node, edge = previous[node]
+            length += graph.lengths[edge]
+            nodes.append(node)
+        nodes.reverse()
+        
+        # Участки от точек до дороги проезжаются медленно
+        access_m = start[1] + finish[1]
+        duration_s = best_time[target] + access_m / (ACCESS_SPEED / 3.6)
+        points = ([(pickup_lat, pickup_lon)] +
+                  [(graph.lat[node], graph.lon[node]) for node in nodes] +
+                  [(destination_lat, destination_lon)])
+        return Route(round((length + access_m) / 1000, 2), round(duration_s / 60, 1), points)
+    
+    def one_to_many(self, lat: float, lon: float,
+                    destinations: List[Tuple[float, float]]) -> List[Optional[Tuple[float, float]]]:
+        """
+        Дорожные расстояния от точки до многих точек (один проход Дейкстры)
+        
+        Returns:
+            Для каждой точки назначения (расстояние_км, время_мин) самого
+            быстрого маршрута или None, если маршрута нет
+        """
+        results: List[Optional[Tuple[float, float]]] = [None] * len(destinations)
+        if not self.is_available:
+            return results
+        
+        start = self.snap(lat, lon)
+        if start is None:
+            return results
+        
+        # Узлы назначения: {узел: [(номер точки, расстояние до дороги), ...]}
+        wanted: Dict[int, List[Tuple[int, float]]] = {}
+        for index, (destination_lat, destination_lon) in enumerate(destinations):
+            finish = self.snap(destination_lat, destination_lon)
+            if finish is not None:
+                wanted.setdefault(finish[0], []).append((index, finish[1]))
+        
+        graph = self.graph
+        offsets, targets, durations, lengths = graph.offsets, graph.targets, graph.durations, graph.lengths
+        best_time = {start[0]: 0.0}
+        best_length = {start[0]: 0.0}
+        heap = [(0.0, start[0])]
+        remaining = len(wanted)
+        
+        while heap and remaining:
+            elapsed, node = heapq.heappop(heap)
+            if elapsed > best_time[node]:
+                continue
+            
+            for index, access_m in wanted.get(node, ()):
+                access_m += start[1]
+                duration_s = elapsed + access_m / (ACCESS_SPEED / 3.6)
+                results[index] = (round((best_length[node] + access_m) / 1000, 2), round(duration_s / 60, 1))
+            if node in wanted:
+                remaining -= 1
+            
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                candidate = elapsed + durations[edge]
+                if candidate < best_time.get(neighbour, math.inf):
+                    best_time[neighbour] = candidate
+                    best_length[neighbour] = best_length[node] + lengths[edge]
+                    heapq.heappush(heap, (candidate, neighbour))
+        
+        return results
+    
+    async def get_route(self, pickup_lat: float, pickup_lon: float,
+                        destination_lat: float, destination_lon: float) -> Optional[Route]:
+        """
+        Маршрут из кэша или новый (поиск выполняется вне цикла событий)
+        
+        Returns:
+            Маршрут или None, если его не удалось построить
+        """
+        if not self.is_available:
+            return None
+        
+        key = tuple(round(value, 5) for value in (pickup_lat, pickup_lon, destination_lat, destination_lon))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self._stats['cache_hits'] += 1
+            return self._cache[key]
+        
+        try:
+            route = await asyncio.to_thread(self.find_route, *key)
+        except Exception as e:
+            logger.error(f"Ошибка построения маршрута: {e}")
+            return None
+        
+        self._stats['routes' if route is not None else 'not_found'] += 1
+        self._cache[key] = route
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return route
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика маршрутизации"""
+        stats = dict(self._stats)
+        stats['nodes'] = self.graph.node_count if self.graph else 0
+        stats['edges'] = self.graph.edge_count if self.graph else 0
+        return stats
+
+def parse_speed(value: Optional[str]) -> Optional[float]:
+    """Скорость из тега maxspeed (км/ч) или None"""
+    if not value:
+        return None
+    digits = value.split()[0]
+    try:
+        speed = float(digits)
+    except ValueError:
+        return None
+    return speed * 1.609 if 'mph' in value else speed
+
+def build_graph(osm_path: str) -> RoadGraph:
+    """
+    Построение дорожного графа из выгрузки OSM XML
+    
+    В граф попадают дороги, доступные автомобилю, с учетом одностороннего
+    движения. Номера узлов сжимаются до непрерывного диапазона.
+    """
+    coords: Dict[str, Tuple[float, float]] = {}
+    ways = []
+    for _, element in ElementTree.iterparse(osm_path, events=('end',)):
+        if element.tag == 'node':
+            coords[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+            element.clear()
+        elif element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            highway = tags.get('highway')
+            if highway in ROAD_SPEEDS and tags.get('access') not in ('no', 'private'):
+                refs = [ref.get('ref') for ref in element.iter('nd')]
+                oneway = tags.get('oneway')
+                if oneway is None and (tags.get('junction') == 'roundabout' or highway == 'motorway'):
+                    oneway = 'yes'
+                speed = parse_speed(tags.get('maxspeed')) or ROAD_SPEEDS[highway]
+                ways.append((refs, oneway, speed))
+            element.clear()
+    
+    numbers: Dict[str, int] = {}
+    node_coords: List[Tuple[float, float]] = []
+    edges: List[Tuple[int, int, float, float]] = []
+    
+    def number(ref: str) -> int:
+        if ref not in numbers:
+            numbers[ref] = len(node_coords)
+            node_coords.append(coords[ref])
+        return numbers[ref]
+    
+    for refs, oneway, speed in ways:
+        refs = [ref for ref in refs if ref in coords]
+        if oneway == '-1':
+            refs.reverse()
+        speed_mps = speed / 3.6
+        for ref_from, ref_to in zip(refs, refs[1:]):
+            first, second = number(ref_from), number(ref_to)
+            length = haversine_m(*coords[ref_from], *coords[ref_to])
+            edges.append((first, second, length, length / speed_mps))
+            if oneway not in ('yes', 'true', '1', '-1'):
+                edges.append((second, first, length, length / speed_mps))
+    
+    return RoadGraph.from_edges(node_coords, edges)
+
+# Общий маршрутизатор процесса: граф загружается в main.py
+road_router = RoadRouter()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        print("Использование: python -m services.routing <extract.osm>")
+        sys.exit(1)
+    
+    print(f"🛣️ Построение дорожного графа из {sys.argv[1]}...")
+    graph = build_graph(sys.argv[1])
+    graph.save(Config.ROUTING_GRAPH_PATH)
+    print(f"✅ Граф сохранен в {Config.ROUTING_GRAPH_PATH}: {graph.node_count} узлов, {graph.edge_count} ребер")
@@ -0,0 +1,240 @@
+"""
+Повышенный спрос Рай-Такси
+
+Для каждой зоны города в памяти ведутся счетчики: свободные водители
+(по событиям пространственного индекса водителей, без водителей на
+поездке) и заказы, которым еще ищется водитель (не дольше SURGE_WINDOW).
+Принятие и отмена заказа приходят из шины событий заказов. Раз в
+SURGE_INTERVAL секунд по счетчикам зоны и соседних с ней зон считается
+коэффициент цены от 1 до SURGE_MAX_MULTIPLIER. Расчет цены только берет
+готовый коэффициент зоны - без запросов к БД.
+
+Без сетки зон (ZONE_BBOX) весь город считается одной зоной.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from services.driver_index import driver_index
+from services.order_events import OrderEvent, order_events
+from services.zones import zone_matrix
+
+logger = logging.getLogger(__name__)
+
+# Зона "весь город", если сетка зон не настроена
+CITY_ZONE = 0
+
+# Доля разницы, на которую коэффициент сдвигается за один пересчет
+SMOOTHING = 0.5
+
+class SurgePricing:
+    """Коэффициенты повышенного спроса по зонам"""
+    
+    def __init__(self, max_multiplier: float = None, sensitivity: float = None,
+                 window: int = None, interval: float = None):
+        """
+        Args:
+            max_multiplier: максимальный коэффициент (1 - повышение отключено)
+            sensitivity: рост коэффициента на каждый заказ сверх свободных водителей
+            window: сколько секунд заказ без водителя учитывается в спросе
+            interval: период пересчета коэффициентов в секундах
+        """
+        self.max_multiplier = max(1.0, max_multiplier or Config.SURGE_MAX_MULTIPLIER)
+        self.sensitivity = sensitivity if sensitivity is not None else Config.SURGE_SENSITIVITY
+        self.window = window or Config.SURGE_WINDOW
+        self.interval = interval or Config.SURGE_INTERVAL
+        
+        # Свободные водители: {зона: количество} и зона каждого доступного водителя
+        self._supply: Counter = Counter()
+        self._driver_zones: Dict[int, int] = {}
+        # Водители на поездке (не считаются свободными): {user_id: order_id}
+        self._busy: Dict[int, int] = {}
+        # Заказы без водителя в порядке появления: {order_id: (зона, время)} и их сумма по зонам
+        self._open_orders: 'OrderedDict[int, Tuple[int, float]]' = OrderedDict()
+        self._demand: Counter = Counter()
+        # Опубликованные коэффициенты (словарь заменяется целиком)
+        self.multipliers: Dict[int, float] = {}
+        
+        self._task = None
+        self._stats = {'orders': 0, 'updates': 0}
+    
+    @property
+    def is_enabled(self) -> bool:
+        """Включено ли повышение цен"""
+        return self.max_multiplier > 1.0
+    
+    def start(self):
+        """Подписка на изменения водителей и запуск пересчета"""
+        if self._task is not None or not self.is_enabled:
+            return
+        
+        driver_index.add_listener(self.on_driver_changed)
+        order_events.add_listener(self.on_order_event)
+        self._task = asyncio.create_task(self._update_loop())
+    
+    async def stop(self):
+        """Остановка пересчета"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    
+    def _zone(self, lat: float, lon: float) -> Optional[int]:
+        """Зона точки (None - вне города)"""
+        grid = zone_matrix.grid
+        if grid is None:
+            return CITY_ZONE
+        return grid.zone_of(lat, lon)
+    
+    def _neighbours(self, zone: int) -> List[int]:
+        """Зона и соседние с ней зоны"""
+        grid = zone_matrix.grid
+        if grid is None:
+            return [zone]
+        
+        row, col = divmod(zone, grid.cols)
+        return [
+            other_row * grid.cols + other_col
+            for other_row in range(max(0, row - 1), min(grid.rows, row + 2))
+            for other_col in range(max(0, col - 1), min(grid.cols, col + 2))
+        ]
+    
+    def _add_supply(self, zone: int, delta: int):
+        """Изменение числа свободных водителей зоны"""
+        self._supply[zone] += delta
+        if self._supply[zone] <= 0:
+            del self._supply[zone]
+    
+    def on_driver_changed(self, user_id: int, position: Optional[Tuple[float, float]]):
+        """Водитель стал доступен в точке position или перестал быть доступным (None)"""
+        zone = self._driver_zones.pop(user_id, None)
+        if zone is not None and user_id not in self._busy:
+            self._add_supply(zone, -1)
+        
+        if position is not None:
+            zone = self._zone(*position)
+            if zone is not None:
+                self._driver_zones[user_id] = zone
+                if user_id not in self._busy:
+                    self._add_supply(zone, 1)
+    
+    def on_order_event(self, event: OrderEvent):
+        """Принятый или отмененный заказ больше не ждет водителя"""
+        if event.kind == order_events.ACCEPTED:
+            self._close_order(event.order_id)
+            if event.driver_id is not None:
+                self._set_busy(event.driver_id, event.order_id)
+        elif event.kind == order_events.CANCELLED:
+            self._close_order(event.order_id)
+            for user_id, order_id in list(self._busy.items()):
+                if order_id == event.order_id:
+                    self.release_driver(user_id)
+    
+    def _set_busy(self, user_id: int, order_id: int):
+        """Водитель уехал на заказ и не считается свободным"""
+        if user_id not in self._busy:
+            zone = self._driver_zones.get(user_id)
+            if zone is not None:
+                self._add_supply(zone, -1)
+        self._busy[user_id] = order_id
+    
+    def release_driver(self, user_id: int):
+        """Водитель освободился после поездки"""
+        if self._busy.pop(user_id, None) is None:
+            return
+        
+        zone = self._driver_zones.get(user_id)
+        if zone is not None:
+            self._add_supply(zone, 1)
+    
+    def record_order(self, order_id: int, pickup_lat: float, pickup_lon: float):
+        """Учет заказа, которому ищется водитель, в зоне подачи"""
+        zone = self._zone(pickup_lat, pickup_lon)
+        if zone is None or not self.is_enabled or order_id in self._open_orders:
+            return
+        
+        self._expire(time.time())
+        self._open_orders[order_id] = (zone, time.time())
+        self._demand[zone] += 1
+        self._stats['orders'] += 1
+    
+    def _close_order(self, order_id: int):
+        """Снятие заказа из спроса"""
+        order = self._open_orders.pop(order_id, None)
+        if order is None:
+            return
+        
+        zone = order[0]
+        self._demand[zone] -= 1
+        if self._demand[zone] <= 0:
+            del self._demand[zone]
+    
+    def _expire(self, now: float):
+        """Снятие заказов, ждущих водителя дольше окна (поиск прерван без события)"""
+        while self._open_orders:
+            order_id, (_, created) = next(iter(self._open_orders.items()))
+            if now - created < self.window:
+                return
+            self._close_order(order_id)
+    
+    def update(self):
+        """Пересчет коэффициентов по текущим счетчикам"""
+        self._expire(time.time())
+        
+        zones = set(self.multipliers)
+        for zone in self._demand:
+            zones.update(self._neighbours(zone))
+        
+        multipliers = {}
+        for zone in zones:
+            neighbours = self._neighbours(zone)
+            demand = sum(self._demand[other] for other in neighbours)
+            supply = sum(self._supply[other] for other in neighbours)
+            target = 1.0 + self.sensitivity * max(0, demand - supply)
+            target = round(min(target, self.max_multiplier), 1)
+            
+            # Плавное изменение, чтобы цена не скакала между пересчетами;
+            # шаг округляется в сторону цели, чтобы коэффициент ее достигал
+            current = self.multipliers.get(zone, 1.0)
+            value = round((current + (target - current) * SMOOTHING) * 10, 6)
+            multiplier = (math.ceil(value) if target > current else math.floor(value)) / 10
+            if multiplier > 1.0:
+                multipliers[zone] = multiplier
+        
+        self.multipliers = multipliers
+        self._stats['updates'] += 1
+    
+    async def _update_loop(self):
+        """Периодический пересчет коэффициентов"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.update()
+            except Exception as e:
+                logger.error(f"Ошибка пересчета повышенного спроса: {e}")
+    
+    def get_multiplier(self, pickup_lat: float, pickup_lon: float) -> float:
+        """Коэффициент цены для точки подачи"""
+        if not self.multipliers:
+            return 1.0
+        return self.multipliers.get(self._zone(pickup_lat, pickup_lon), 1.0)
+    
+    def get_stats(self) -> Dict:
+        """Статистика повышенного спроса"""
+        stats = dict(self._stats)
+        stats['free_drivers'] = sum(self._supply.values())
+        stats['busy_drivers'] = len(self._busy)
+        stats['waiting_orders'] = sum(self._demand.values())
+        stats['surge_zones'] = len(self.multipliers)
+        stats['max_multiplier'] = max(self.multipliers.values(), default=1.0)
+        return stats
+
+# Общие коэффициенты процесса: пересчет запускается в main.py
+surge_pricing = SurgePricing()
@@ -0,0 +1,346 @@
+"""
+Тарифы Рай-Такси
+
+Активные строки таблицы prices компилируются в неизменяемую таблицу
+тарифов в памяти: для каждого вида услуги и каждого часа недели заранее
+отобраны подходящие правила в порядке приоритета. Поиск тарифа не
+обращается к БД - это проход по нескольким правилам одного часа.
+
+Правило может ограничиваться днями недели (1 - понедельник, 7 -
+воскресенье), временем суток ("22:00"-"06:00", через полночь) и зоной
+подачи ("B3"). Из подходящих правил выбирается самое конкретное:
+зона, затем время, затем дни; при равенстве - более новое. Строка без
+условий - базовый тариф услуги.
+
+После изменения тарифов таблица собирается заново и подменяется одной
+ссылкой, поэтому расчеты никогда не видят наполовину обновленные тарифы.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from config import Config
+from database.queries import Queries
+from services.zones import zone_matrix
+
+logger = logging.getLogger(__name__)
+
+SERVICE_TYPES = ('taxi', 'delivery')
+
+MINUTES_PER_DAY = 24 * 60
+HOURS_PER_WEEK = 7 * 24
+
+def parse_days(value: Optional[str]) -> Optional[FrozenSet[int]]:
+    """
+    Дни недели из строки "1-5" или "6,7" (пусто или "*" - все дни)
+    
+    Raises:
+        ValueError: если строка не разбирается
+    """
+    if not value or value.strip() == '*':
+        return None
+    
+    days = set()
+    for part in value.replace(' ', '').split(','):
+        first, _, last = part.partition('-')
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= 7:
+            raise ValueError(f"Неверные дни недели: {value}")
+        days.update(range(first, last + 1))
+    return frozenset(days)
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """
+    Минута суток из строки "ЧЧ:ММ" (пусто - без ограничения)
+    
+    Raises:
+        ValueError: если строка не разбирается
+    """
+    if not value:
+        return None
+    hours, minutes = (int(part) for part in value.split(':'))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Неверное время: {value}")
+    return hours * 60 + minutes
+
+def format_days(days: Optional[FrozenSet[int]]) -> str:
+    """Дни недели для отображения: "1-5", "6,7" или "*" """
+    if not days:
+        return '*'
+    
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day - 1:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ','.join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+@dataclass(frozen=True)
+class Tariff:
+    """Тариф (правило таблицы prices)"""
+    id: Optional[int]
+    service_type: str
+    base_fare: float
+    per_km_rate: float
+    minimum_fare: float
+    days: Optional[FrozenSet[int]] = None  # ISO-дни недели
+    start_minute: Optional[int] = None     # начало окна, минута суток
+    end_minute: Optional[int] = None       # конец окна (не включительно)
+    zone: Optional[str] = None             # зона подачи
+    
+    @property
+    def rates(self) -> Tuple[float, float, float]:
+        """(посадка, за км, минимум)"""
+        return self.base_fare, self.per_km_rate, self.minimum_fare
+    
+    @property
+    def is_base(self) -> bool:
+        """Тариф без условий"""
+        return self.days is None and self.start_minute is None and self.zone is None
+    
+    @property
+    def specificity(self) -> int:
+        """Приоритет правила: зона важнее времени, время важнее дней"""
+        return (4 if self.zone else 0) + (2 if self.start_minute is not None else 0) + (1 if self.days else 0)
+    
+    def in_window(self, minute: int) -> bool:
+        """Попадает ли минута суток в окно времени правила"""
+        if self.start_minute is None:
+            return True
+        if self.start_minute < self.end_minute:
+            return self.start_minute <= minute < self.end_minute
+        # Окно через полночь
+        return minute >= self.start_minute or minute < self.end_minute
+    
+    def overlaps_hour(self, hour: int) -> bool:
+        """Пересекается ли окно времени с часом суток"""
+        if self.start_minute is None:
+            return True
+        first, last = hour * 60, hour * 60 + 59
+        if self.start_minute < self.end_minute:
+            return first < self.end_minute and last >= self.start_minute
+        return last >= self.start_minute or first < self.end_minute
+    
+    def describe(self) -> str:
+        """Условия правила для отображения"""
+        if self.is_base:
+            return "базовый"
+        conditions = [f"дни {format_days(self.days)}"] if self.days else []
+        if self.start_minute is not None:
+            conditions.append("{:02d}:{:02d}-{:02d}:{:02d}".format(
+                *divmod(self.start_minute, 60), *divmod(self.end_minute, 60)
+            ))
+        if self.zone:
+            conditions.append(f"зона {self.zone}")
+        return ", ".join(conditions)
+
+class TariffTable:
+    """Неизменяемая скомпилированная таблица тарифов"""
+    
+    def __init__(self, tariffs: List[Tariff]):
+        """
+        Args:
+            tariffs: активные правила всех услуг
+        """
+        ordered = sorted(tariffs, key=lambda tariff: (-tariff.specificity, -(tariff.id or 0)))
+        self.tariffs: Tuple[Tariff, ...] = tuple(ordered)
+        
+        # Базовый тариф услуги: из БД или из настроек
+        self.base: Dict[str, Tariff] = {
+            'taxi': Tariff(None, 'taxi', Config.BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE),
+            'delivery': Tariff(None, 'delivery', Config.DELIVERY_BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE)
+        }
+        for tariff in reversed(ordered):
+            if tariff.is_base:
+                self.base[tariff.service_type] = tariff
+        
+        # Для каждого часа недели - правила с условиями, которые могут в нем действовать
+        self.hours: Dict[str, Tuple[Tuple[Tariff, ...], ...]] = {}
+        for service_type in self.base:
+            rules = [tariff for tariff in ordered if tariff.service_type == service_type and not tariff.is_base]
+            self.hours[service_type] = tuple(
+                tuple(
+                    rule for rule in rules
+                    if (not rule.days or hour // 24 + 1 in rule.days) and rule.overlaps_hour(hour % 24)
+                )
+                for hour in range(HOURS_PER_WEEK)
+            )
+    
+    def find(self, service_type: str, when: datetime, zone: Optional[str] = None) -> Tariff:
+        """Действующий тариф услуги в момент when для зоны подачи zone"""
+        base = self.base.get(service_type) or self.base['taxi']
+        rules = self.hours.get(service_type)
+        if rules is None:
+            return base
+        
+        minute = when.hour * 60 + when.minute
+        for rule in rules[when.weekday() * 24 + when.hour]:
+            if (rule.zone is None or rule.zone == zone) and rule.in_window(minute):
+                return rule
+        return base
+
+class TariffEngine:
+    """Тарифы из БД с перезагрузкой без перезапуска бота"""
+    
+    def __init__(self):
+        self.db = None
+        self.table = TariffTable([])
+        # Номер версии таблицы: растет при каждой перезагрузке
+        self.version = 0
+        self._lock = asyncio.Lock()
+        self._stats = {'lookups': 0, 'reloads': 0}
+    
+    async def start(self, db_manager) -> int:
+        """
+        Подготовка таблицы prices и загрузка тарифов
+        
+        Returns:
+            Количество активных правил
+        """
+        self.db = db_manager
+        await self.db.execute(Queries.CREATE_PRICES)
+        
+        # Добавляем колонки правил в таблицу, созданную старой версией
+        cursor = await self.db.execute(Queries.PRICES_COLUMNS)
+        columns = {row[1] for row in cursor.fetchall()}
+        for column, query in Queries.PRICES_RULE_COLUMNS.items():
+            if column not in columns:
+                await self.db.execute(query)
+        
+        await self.db.execute(Queries.SEED_PRICE, (
+            'taxi', Config.BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE, 'taxi'
+        ))
+        await self.db.execute(Queries.SEED_PRICE, (
+            'delivery', Config.DELIVERY_BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE, 'delivery'
+        ))
+        await self.db.commit()
+        
+        return await self.reload()
+    
+    async def reload(self) -> int:
+        """
+        Перечитывание тарифов из БД и атомарная подмена таблицы
+        
+        Returns:
+            Количество активных правил
+        """
+        async with self._lock:
+            cursor = await self.db.execute(Queries.ACTIVE_PRICES)
+            tariffs = []
+            for row in cursor.fetchall():
+                try:
+                    tariffs.append(self._tariff_from_row(row))
+                except ValueError as e:
+                    logger.error(f"Тариф {row[0]} пропущен: {e}")
+            
+            table = TariffTable(tariffs)
+            self.table = table
+            self.version += 1
+            self._stats['reloads'] += 1
+            
+            # Матрица цен между зонами считается по базовому тарифу такси
+            zone_matrix.reprice(*table.base['taxi'].rates)
+            return len(tariffs)
+    
+    @staticmethod
+    def _tariff_from_row(row) -> Tariff:
+        """Правило из строки таблицы prices"""
+        tariff_id, service_type, base_fare, per_km_rate, minimum_fare, days, start_time, end_time, zone = row
+        start_minute, end_minute = parse_time(start_time), parse_time(end_time)
+        if (start_minute is None) != (end_minute is None) or (start_minute is not None and start_minute == end_minute):
+            raise ValueError(f"неверное окно времени {start_time}-{end_time}")
+        return Tariff(
+            tariff_id, service_type, base_fare, per_km_rate, minimum_fare,
+            days=parse_days(days),
+            start_minute=start_minute,
+            end_minute=end_minute,
+            zone=zone.strip().upper() if zone else None
+        )
+    
+    def get_tariff(self, service_type: str = 'taxi', pickup_lat: float = None,
+                   pickup_lon: float = None, when: datetime = None) -> Tariff:
+        """
+        Действующий тариф услуги (без обращения к БД)
+        
+        Args:
+            service_type: 'taxi' или 'delivery'
+            pickup_lat, pickup_lon: точка подачи (для правил по зонам)
+            when: момент заказа (по умолчанию - сейчас)
+        """
+        self._stats['lookups'] += 1
+        zone = None
+        grid = zone_matrix.grid
+        if grid is not None and pickup_lat is not None:
+            zone_index = grid.zone_of(pickup_lat, pickup_lon)
+            if zone_index is not None:
+                zone = grid.label(zone_index)
+        return self.table.find(service_type, when or datetime.now(), zone)
+    
+    def get_base_tariff(self, service_type: str = 'taxi') -> Tariff:
+        """Базовый тариф услуги"""
+        return self.table.base.get(service_type) or self.table.base['taxi']
+    
+    def list_tariffs(self) -> List[Tariff]:
+        """Активные правила в порядке приоритета"""
+        return list(self.table.tariffs)
+    
+    async def set_base_tariff(self, service_type: str, base_fare: float,
+                              per_km_rate: float, minimum_fare: float):
+        """Изменение базового тарифа услуги"""
+        base = self.table.base.get(service_type)
+        if base is not None and base.id is not None:
+            await self.db.execute(Queries.UPDATE_PRICE, (base_fare, per_km_rate, minimum_fare, base.id))
+        else:
+            await self.db.execute(Queries.INSERT_PRICE, (
+                service_type, base_fare, per_km_rate, minimum_fare, None, None, None, None
+            ))
+        await self.db.commit()
+        await self.reload()
+    
+    async def add_rule(self, service_type: str, base_fare: float, per_km_rate: float,
+                       minimum_fare: float, days: str = None, start_time: str = None,
+                       end_time: str = None, zone: str = None) -> int:
+        """
+        Добавление правила с условиями
+        
+        Returns:
+            Номер правила
+        
+        Raises:
+            ValueError: если условия правила не разбираются
+        """
+        if service_type not in SERVICE_TYPES:
+            raise ValueError(f"Неизвестная услуга: {service_type}")
+        # Проверяем условия до записи в БД
+        self._tariff_from_row((None, service_type, base_fare, per_km_rate, minimum_fare,
+                               days, start_time, end_time, zone))
+        
+        cursor = await self.db.execute(Queries.INSERT_PRICE, (
+            service_type, base_fare, per_km_rate, minimum_fare,
+            days, start_time, end_time, zone.upper() if zone else None
+        ))
+        await self.db.commit()
+        await self.reload()
+        return cursor.lastrowid
+    
+    async def disable_rule(self, tariff_id: int) -> bool:
+        """Отключение правила; базовые тарифы не отключаются"""
+        if any(tariff.id == tariff_id for tariff in self.table.base.values()):
+            return False
+        cursor = await self.db.execute(Queries.DEACTIVATE_PRICE, (tariff_id,))
+        await self.db.commit()
+        await self.reload()
+        return cursor.rowcount > 0
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика тарифов"""
+        stats = dict(self._stats)
+        stats['rules'] = len(self.table.tariffs)
+        return stats
+
+# Общие тарифы процесса: загружаются в main.py
+tariff_engine = TariffEngine()
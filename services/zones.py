@@ -0,0 +1,272 @@
+"""
+Зоны города и матрица цен между ними для Рай-Такси
+
+Город делится на сетку зон (ячейки ZONE_CELL_KM внутри ZONE_BBOX),
+зона обозначается буквой ряда и номером столбца, как на карте: "B3".
+Для всех пар зон заранее считаются дорожное расстояние и время между
+центрами зон и стоимость поездки (матрицы NumPy), поэтому цена поездки
+между разными зонами - это поиск в матрице. Администратор может
+назначить фиксированную цену между парой зон.
+
+Матрица расстояний строится при запуске, матрица цен пересчитывается
+при изменении тарифов (reprice). Без NumPy зональные цены отключены.
+"""
+
+import asyncio
+import logging
+import math
+import string
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from database.queries import Queries
+from services.price_calculator import PriceCalculator
+from services.routing import RoadRouter, road_router
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Километров в одном градусе широты
+KM_PER_DEGREE = 111.32
+
+# Минут на километр, если дорожный граф не загружен (как в estimate_waiting_time)
+MINUTES_PER_KM = 2
+
+class ZoneGrid:
+    """Сетка зон над городом"""
+    
+    def __init__(self, bbox: Tuple[float, float, float, float], cell_km: float):
+        """
+        Args:
+            bbox: (min_lat, min_lon, max_lat, max_lon)
+            cell_km: размер зоны в километрах
+        """
+        self.min_lat, self.min_lon, self.max_lat, self.max_lon = bbox
+        self.lat_step = cell_km / KM_PER_DEGREE
+        mid_lat = (self.min_lat + self.max_lat) / 2
+        self.lon_step = self.lat_step / max(math.cos(math.radians(mid_lat)), 0.01)
+        self.rows = max(1, math.ceil((self.max_lat - self.min_lat) / self.lat_step))
+        self.cols = max(1, math.ceil((self.max_lon - self.min_lon) / self.lon_step))
+    
+    @classmethod
+    def from_config(cls) -> Optional['ZoneGrid']:
+        """Сетка из ZONE_BBOX или None, если зоны не настроены"""
+        try:
+            bbox = tuple(float(value) for value in Config.ZONE_BBOX.split(','))
+        except ValueError:
+            return None
+        if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+            return None
+        return cls(bbox, Config.ZONE_CELL_KM)
+    
+    @property
+    def size(self) -> int:
+        """Количество зон"""
+        return self.rows * self.cols
+    
+    def zone_of(self, lat: float, lon: float) -> Optional[int]:
+        """Номер зоны точки или None, если точка вне города"""
+        # Ряды нумеруются с севера, как на карте
+        row = math.floor((self.max_lat - lat) / self.lat_step)
+        col = math.floor((lon - self.min_lon) / self.lon_step)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+    
+    def center(self, zone: int) -> Tuple[float, float]:
+        """Координаты центра зоны"""
+        row, col = divmod(zone, self.cols)
+        return self.max_lat - (row + 0.5) * self.lat_step, self.min_lon + (col + 0.5) * self.lon_step
+    
+    def label(self, zone: int) -> str:
+        """Обозначение зоны: "B3" """
+        row, col = divmod(zone, self.cols)
+        letters = ''
+        row += 1
+        while row:
+            row, remainder = divmod(row - 1, 26)
+            letters = string.ascii_uppercase[remainder] + letters
+        return f"{letters}{col + 1}"
+    
+    def parse_label(self, label: str) -> Optional[int]:
+        """Номер зоны по обозначению или None"""
+        label = label.strip().upper()
+        letters = label.rstrip(string.digits)
+        digits = label[len(letters):]
+        if not letters or not digits or not letters.isalpha() or not letters.isascii():
+            return None
+        
+        row = 0
+        for letter in letters:
+            row = row * 26 + string.ascii_uppercase.index(letter) + 1
+        row, col = row - 1, int(digits) - 1
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+
+class ZoneMatrix:
+    """Матрицы расстояний, времени и цен между зонами"""
+    
+    def __init__(self, grid: ZoneGrid = None, router: RoadRouter = None):
+        """
+        Args:
+            grid: сетка зон (по умолчанию из настроек)
+            router: маршрутизатор для дорожных расстояний
+        """
+        self.grid = grid
+        self.router = router or road_router
+        self.db = None
+        
+        self.distance = None  # км, zones x zones
+        self.duration = None  # мин
+        self.fare = None      # ₽
+        # Фиксированные цены администратора: {(из, в): цена}
+        self.fixed_prices: Dict[Tuple[int, int], int] = {}
+        self._tariff = (Config.BASE_FARE, Config.PER_KM_RATE, Config.MINIMUM_FARE)
+        self._stats = {'quotes': 0, 'fixed_quotes': 0, 'misses': 0}
+    
+    @property
+    def is_available(self) -> bool:
+        """Построена ли матрица"""
+        return self.fare is not None
+    
+    async def start(self, db_manager) -> int:
+        """
+        Загрузка фиксированных цен и построение матриц
+        
+        Returns:
+            Количество зон (0, если зоны не настроены или нет NumPy)
+        """
+        self.db = db_manager
+        await self.db.execute(Queries.CREATE_ZONE_FIXED_PRICES)
+        await self.db.commit()
+        
+        if self.grid is None:
+            self.grid = ZoneGrid.from_config()
+        if self.grid is None:
+            return 0
+        if np is None:
+            logger.warning("NumPy не установлен, зональные цены отключены")
+            return 0
+        
+        cursor = await self.db.execute(Queries.ZONE_FIXED_PRICES)
+        for from_label, to_label, price in cursor.fetchall():
+            from_zone, to_zone = self.grid.parse_label(from_label), self.grid.parse_label(to_label)
+            if from_zone is not None and to_zone is not None:
+                self.fixed_prices[(from_zone, to_zone)] = price
+        
+        # Построение матрицы - сотни поисков по графу, выполняем вне цикла событий
+        distance, duration = await asyncio.to_thread(self._build)
+        self.distance, self.duration = distance, duration
+        self.reprice(*self._tariff)
+        return self.grid.size
+    
+    def _build(self):
+        """Матрицы расстояний и времени между центрами зон"""
+        size = self.grid.size
+        centers = [self.grid.center(zone) for zone in range(size)]
+        lat = np.array([center[0] for center in centers])
+        lon = np.array([center[1] for center in centers])
+        
+        # По прямой - для пар, между которыми нет маршрута по дорогам
+        distance = PriceCalculator.calculate_distances(lat[:, None], lon[:, None], lat, lon).astype(np.float32)
+        duration = distance * MINUTES_PER_KM
+        
+        if self.router.is_available:
+            for zone, (center_lat, center_lon) in enumerate(centers):
+                for other, result in enumerate(self.router.one_to_many(center_lat, center_lon, centers)):
+                    if result is not None:
+                        distance[zone, other], duration[zone, other] = result
+        
+        return distance, duration
+    
+    def reprice(self, base_fare: float, per_km_rate: float, minimum_fare: float):
+        """Пересчет матрицы цен по тарифу (при изменении тарифов)"""
+        self._tariff = (base_fare, per_km_rate, minimum_fare)
+        if self.distance is None:
+            return
+        
+        fare = np.rint(np.maximum(base_fare + self.distance * per_km_rate, minimum_fare)).astype(np.int32)
+        for (from_zone, to_zone), price in self.fixed_prices.items():
+            fare[from_zone, to_zone] = price
+        self.fare = fare
+    
+    def quote(self, pickup_lat: float, pickup_lon: float,
+              destination_lat: float, destination_lon: float,
+              rates: Tuple[float, float, float] = None,
+              surge: float = 1.0) -> Optional[Tuple[int, float, float]]:
+        """
+        Цена поездки по матрице зон
+        
+        Args:
+            rates: (посадка, за км, минимум) действующего тарифа, если он
+                отличается от тарифа матрицы (ночной, выходной и т.п.)
+            surge: коэффициент повышенного спроса (к фиксированным ценам
+                не применяется)
+        
+        Returns:
+            (цена, расстояние_км, время_мин) или None, если точки вне зон
+            или в одной зоне без фиксированной цены
+        """
+        if not self.is_available:
+            return None
+        
+        from_zone = self.grid.zone_of(pickup_lat, pickup_lon)
+        to_zone = self.grid.zone_of(destination_lat, destination_lon)
+        if from_zone is None or to_zone is None:
+            self._stats['misses'] += 1
+            return None
+        
+        fixed = (from_zone, to_zone) in self.fixed_prices
+        if from_zone == to_zone and not fixed:
+            # Внутри зоны расстояние между центрами ничего не говорит о поездке
+            self._stats['misses'] += 1
+            return None
+        
+        self._stats['fixed_quotes' if fixed else 'quotes'] += 1
+        distance = round(float(self.distance[from_zone, to_zone]), 2)
+        if fixed or rates is None or tuple(rates) == self._tariff:
+            price = int(self.fare[from_zone, to_zone])
+        else:
+            base_fare, per_km_rate, minimum_fare = rates
+            price = round(max(base_fare + distance * per_km_rate, minimum_fare))
+        if not fixed and surge != 1.0:
+            price = round(price * surge)
+        return price, distance, round(float(self.duration[from_zone, to_zone]), 1)
+    
+    async def set_fixed_price(self, from_zone: int, to_zone: int, price: Optional[int]):
+        """
+        Назначение (или снятие, если price=None) фиксированной цены
+        между зонами в обе стороны
+        """
+        for pair in {(from_zone, to_zone), (to_zone, from_zone)}:
+            labels = (self.grid.label(pair[0]), self.grid.label(pair[1]))
+            if price is None:
+                self.fixed_prices.pop(pair, None)
+                await self.db.execute(Queries.DELETE_ZONE_FIXED_PRICE, labels)
+            else:
+                self.fixed_prices[pair] = price
+                await self.db.execute(Queries.SAVE_ZONE_FIXED_PRICE, labels + (price,))
+        await self.db.commit()
+        self.reprice(*self._tariff)
+    
+    def list_fixed_prices(self) -> List[Tuple[str, str, int]]:
+        """Фиксированные цены: [(из, в, цена), ...]"""
+        return sorted(
+            (self.grid.label(from_zone), self.grid.label(to_zone), price)
+            for (from_zone, to_zone), price in self.fixed_prices.items()
+        )
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика зональных цен"""
+        stats = dict(self._stats)
+        stats['zones'] = self.grid.size if self.grid and self.is_available else 0
+        stats['fixed_prices'] = len(self.fixed_prices)
+        return stats
+
+# Общая матрица процесса: строится в main.py
+zone_matrix = ZoneMatrix()
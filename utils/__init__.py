@@ -2,12 +2,34 @@
 Утилиты для Рай-Такси
 """
 
-from .maps import MapService
+from .maps import MapService, map_service
+from .geocoder import GeocodingClient
+from .geocode_cache import GeocodeCache, ReverseGeocodeCache, geocode_cache, reverse_geocode_cache, normalize_address
+from .gazetteer import Gazetteer, gazetteer
+from .map_cache import MapCache, map_cache
+from .address_autocomplete import AddressAutocomplete, address_autocomplete
+from .quote_cache import FareQuote, QuoteCache, quote_cache
 from .validators import DataValidator
 from .rate_limiter import RateLimiter
 
 __all__ = [
     'MapService',
+    'map_service',
+    'GeocodingClient',
+    'GeocodeCache',
+    'geocode_cache',
+    'ReverseGeocodeCache',
+    'reverse_geocode_cache',
+    'normalize_address',
+    'Gazetteer',
+    'gazetteer',
+    'MapCache',
+    'map_cache',
+    'AddressAutocomplete',
+    'address_autocomplete',
+    'FareQuote',
+    'QuoteCache',
+    'quote_cache',
     'DataValidator',
     'RateLimiter'
 ]
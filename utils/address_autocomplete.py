@@ -0,0 +1,114 @@
+"""
+Автодополнение адресов Рай-Такси
+
+Индекс строится из адресов выполненных заказов и успешно найденных
+геокодером адресов. Ключи - нормализованные адреса без типов улиц,
+причем индексируется начало каждого слова, поэтому "ленин" находит
+"ул. Ленина, 5". Поиск - бинарный поиск по отсортированному списку
+ключей, он занимает микросекунды и не обращается ни к БД, ни к сети.
+"""
+
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from database.queries import Queries
+from utils.geocode_cache import normalize_address
+from utils.gazetteer import street_key
+
+# Сколько ключей просматривать при поиске по короткому префиксу
+MAX_SCANNED_KEYS = 500
+
+class AddressAutocomplete:
+    """Префиксный индекс известных адресов"""
+    
+    def __init__(self, max_entries: int = None):
+        """
+        Args:
+            max_entries: максимум адресов в индексе
+        """
+        self.max_entries = max_entries or Config.AUTOCOMPLETE_MAX_ENTRIES
+        
+        # Адреса: [[адрес, lat, lon, вес], ...]
+        self._entries: List[list] = []
+        # Номер адреса по ключу: {ключ: номер}
+        self._by_key: Dict[str, int] = {}
+        # Отсортированные пары (ключ с начала слова, номер адреса)
+        self._prefixes: List[Tuple[str, int]] = []
+    
+    @staticmethod
+    def make_key(address: str) -> str:
+        """Ключ адреса в индексе"""
+        return street_key(normalize_address(address))
+    
+    def add(self, address: str, lat: float, lon: float, weight: int = 1):
+        """Добавление адреса (повторное добавление повышает его вес)"""
+        key = self.make_key(address)
+        if not key:
+            return
+        
+        number = self._by_key.get(key)
+        if number is not None:
+            self._entries[number][3] += weight
+            return
+        
+        if len(self._entries) >= self.max_entries:
+            return
+        
+        number = len(self._entries)
+        self._entries.append([address, lat, lon, weight])
+        self._by_key[key] = number
+        
+        # Индексируем ключ с начала каждого слова
+        words = key.split(' ')
+        for index in range(len(words)):
+            bisect.insort(self._prefixes, (' '.join(words[index:]), number))
+    
+    def find(self, text: str) -> Optional[Tuple[str, float, float]]:
+        """Точное совпадение адреса: (адрес, lat, lon) или None"""
+        number = self._by_key.get(self.make_key(text))
+        if number is None:
+            return None
+        address, lat, lon, _ = self._entries[number]
+        return address, lat, lon
+    
+    def suggest(self, text: str, limit: int = None) -> List[Tuple[str, float, float]]:
+        """
+        Подсказки по началу адреса
+        
+        Returns:
+            До limit адресов (адрес, lat, lon), популярные первыми
+        """
+        limit = limit or Config.AUTOCOMPLETE_SUGGESTIONS
+        prefix = self.make_key(text)
+        if not prefix:
+            return []
+        
+        found = set()
+        position = bisect.bisect_left(self._prefixes, (prefix, -1))
+        end = min(len(self._prefixes), position + MAX_SCANNED_KEYS)
+        while position < end and self._prefixes[position][0].startswith(prefix):
+            found.add(self._prefixes[position][1])
+            position += 1
+        
+        best = sorted(found, key=lambda number: -self._entries[number][3])[:limit]
+        return [tuple(self._entries[number][:3]) for number in best]
+    
+    async def load(self, db_manager) -> int:
+        """
+        Заполнение индекса адресами выполненных заказов
+        
+        Returns:
+            Количество адресов в индексе
+        """
+        cursor = await db_manager.execute(Queries.COMPLETED_ORDER_ADDRESSES, (self.max_entries,))
+        for address, lat, lon, uses in cursor.fetchall():
+            if lat is not None and lon is not None:
+                self.add(address, lat, lon, uses)
+        return len(self._entries)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Общий индекс процесса: заполняется в main.py
+address_autocomplete = AddressAutocomplete()
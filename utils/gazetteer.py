@@ -0,0 +1,253 @@
+"""
+Офлайн-справочник адресов (газеттир) Рай-Такси
+
+Адреса зоны обслуживания загружаются в SQLite из CSV или выгрузки OSM
+и индексируются FTS5. Поиск по префиксам слов и нечеткое сравнение
+выполняются локально, поэтому геокодирование работает без сети, а
+Nominatim используется только для адресов, которых нет в справочнике.
+
+Загрузка справочника:
+    python -m utils.gazetteer addresses.csv   # колонки: street, house, lat, lon[, city]
+    python -m utils.gazetteer extract.osm     # выгрузка OSM XML с addr:street/addr:housenumber
+"""
+
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import xml.etree.ElementTree as ElementTree
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import Config
+from database.queries import Queries
+from utils.geocode_cache import normalize_address
+
+logger = logging.getLogger(__name__)
+
+# Типы улиц и населенных пунктов: в справочнике и в запросе они часто
+# указаны по-разному, поэтому при сравнении не учитываются
+STREET_TYPE_WORDS = {
+    'улица', 'проспект', 'проезд', 'переулок', 'площадь', 'шоссе', 'бульвар',
+    'набережная', 'тупик', 'микрорайон', 'город', 'поселок'
+}
+
+def street_key(normalized: str) -> str:
+    """Нормализованное название без типа улицы ("улица ленина" -> "ленина")"""
+    return ' '.join(word for word in normalized.split(' ') if word and word not in STREET_TYPE_WORDS)
+
+def normalize_house(house: str) -> str:
+    """Нормализация номера дома ("5 А" -> "5а", "10 к.2" -> "10 корпус 2")"""
+    normalized = normalize_address(house)
+    # "5 а" и "5а" - один и тот же дом
+    parts = normalized.split(' ')
+    if len(parts) == 2 and parts[0].isdigit() and len(parts[1]) == 1:
+        return parts[0] + parts[1]
+    return normalized.replace('-', '')
+
+def split_house(normalized: str) -> Tuple[str, str]:
+    """
+    Разделение нормализованного адреса на улицу и номер дома
+    
+    Номер дома - все, начиная с первого слова, содержащего цифру.
+    """
+    tokens = normalized.split(' ')
+    for index, token in enumerate(tokens):
+        if any(char.isdigit() for char in token):
+            return ' '.join(tokens[:index]), normalize_house(' '.join(tokens[index:]))
+    return normalized, ''
+
+class Gazetteer:
+    """Локальный геокодер по справочнику адресов в SQLite"""
+    
+    def __init__(self, min_score: float = None, candidates: int = 50):
+        """
+        Args:
+            min_score: минимальное сходство улицы для нечеткого совпадения (0..1)
+            candidates: максимум кандидатов из полнотекстового индекса
+        """
+        self.min_score = min_score if min_score is not None else Config.GAZETTEER_MIN_SCORE
+        self.candidates = candidates
+        self.db = None
+        self.size = 0
+        self._stats = {'hits': 0, 'fuzzy_hits': 0, 'misses': 0}
+    
+    @property
+    def is_available(self) -> bool:
+        """Загружен ли справочник"""
+        return self.db is not None and self.size > 0
+    
+    async def start(self, db_manager) -> int:
+        """
+        Подключение справочника
+        
+        Returns:
+            Количество адресов в справочнике
+        """
+        self.db = db_manager
+        await self.db.execute(Queries.CREATE_GAZETTEER)
+        await self.db.execute(Queries.CREATE_GAZETTEER_FTS)
+        await self.db.commit()
+        
+        cursor = await self.db.execute(Queries.COUNT_GAZETTEER)
+        row = cursor.fetchone()
+        self.size = row[0] if row else 0
+        return self.size
+    
+    @staticmethod
+    def _match_query(words: List[str], prefix_length: int = None, operator: str = 'AND') -> str:
+        """Запрос FTS5 по префиксам слов"""
+        terms = []
+        for word in words:
+            term = word[:prefix_length] if prefix_length else word
+            terms.append('"' + term.replace('"', '') + '"*')
+        return f' {operator} '.join(terms)
+    
+    async def _candidates(self, match: str) -> List[tuple]:
+        """Кандидаты из полнотекстового индекса: (улица, город и улица, дом, lat, lon)"""
+        cursor = await self.db.execute(Queries.SEARCH_GAZETTEER, (match, self.candidates))
+        return cursor.fetchall()
+    
+    def _best(self, street: str, house: str, rows: Iterable[tuple]) -> Optional[Tuple[float, Tuple[float, float]]]:
+        """Лучший кандидат: (сходство улицы, (lat, lon))"""
+        best = None
+        for row_street, row_search_text, row_house, lat, lon in rows:
+            if house and row_house != house:
+                continue
+            # Запрос мог быть как с городом, так и без него
+            score = max(
+                SequenceMatcher(None, street, row_street).ratio(),
+                SequenceMatcher(None, street, row_search_text).ratio()
+            )
+            if best is None or score > best[0]:
+                best = (score, (lat, lon))
+        return best
+    
+    async def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        """
+        Поиск координат адреса в справочнике
+        
+        Returns:
+            (lat, lon) или None, если адрес не найден
+        """
+        if not self.is_available:
+            return None
+        
+        street, house = split_house(normalize_address(address))
+        street = street_key(street)
+        words = street.split(' ') if street else []
+        if not words:
+            return None
+        
+        try:
+            # Все слова улицы как префиксы: "ленин" находит "ленина"
+            best = self._best(street, house, await self._candidates(self._match_query(words)))
+            if best is not None:
+                self._stats['hits'] += 1
+                return best[1]
+            
+            # Опечатки: ищем по началу слов и отбираем по сходству
+            significant = [word for word in words if len(word) >= 4] or words
+            rows = await self._candidates(self._match_query(significant, prefix_length=3, operator='OR'))
+            best = self._best(street, house, rows)
+        except Exception as e:
+            logger.error(f"Ошибка поиска в справочнике адресов: {e}")
+            return None
+        
+        if best is not None and best[0] >= self.min_score:
+            self._stats['fuzzy_hits'] += 1
+            return best[1]
+        
+        self._stats['misses'] += 1
+        return None
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика поиска"""
+        stats = dict(self._stats)
+        stats['size'] = self.size
+        return stats
+
+# Общий справочник процесса: подключается в main.py
+gazetteer = Gazetteer()
+
+def read_csv(path: str) -> Iterator[Tuple[str, str, str, float, float]]:
+    """Адреса из CSV: (город, улица, дом, lat, lon)"""
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            try:
+                yield (row.get('city') or '', row['street'], row['house'],
+                       float(row['lat']), float(row['lon']))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Пропущена строка справочника {row}: {e}")
+
+def read_osm(path: str) -> Iterator[Tuple[str, str, str, float, float]]:
+    """
+    Адреса из выгрузки OSM XML: (город, улица, дом, lat, lon)
+    
+    Для зданий-линий берется центр их точек.
+    """
+    nodes = {}
+    for _, element in ElementTree.iterparse(path, events=('end',)):
+        if element.tag not in ('node', 'way'):
+            continue
+        
+        tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+        if element.tag == 'node':
+            lat, lon = float(element.get('lat')), float(element.get('lon'))
+            nodes[element.get('id')] = (lat, lon)
+        else:
+            points = [nodes[ref.get('ref')] for ref in element.iter('nd') if ref.get('ref') in nodes]
+            if not points:
+                element.clear()
+                continue
+            lat = sum(point[0] for point in points) / len(points)
+            lon = sum(point[1] for point in points) / len(points)
+        
+        if 'addr:street' in tags and 'addr:housenumber' in tags:
+            yield tags.get('addr:city', ''), tags['addr:street'], tags['addr:housenumber'], lat, lon
+        
+        # Точки нужны только для вычисления центров зданий
+        for child in list(element):
+            element.remove(child)
+
+def import_addresses(path: str, db_path: str = None) -> int:
+    """
+    Загрузка справочника адресов из CSV или OSM XML (заменяет текущий)
+    
+    Returns:
+        Количество загруженных адресов
+    """
+    reader = read_osm if path.lower().endswith('.osm') else read_csv
+    conn = sqlite3.connect(db_path or Config.DATABASE_PATH)
+    try:
+        conn.execute(Queries.CREATE_GAZETTEER)
+        conn.execute(Queries.CREATE_GAZETTEER_FTS)
+        conn.execute(Queries.CLEAR_GAZETTEER)
+        
+        rows = []
+        for city, street, house, lat, lon in reader(path):
+            full_address = ', '.join(part for part in (city, street, house) if part)
+            street_normalized = street_key(normalize_address(street))
+            search_text = street_key(normalize_address(f"{city} {street}"))
+            rows.append((full_address, street_normalized, normalize_house(house), search_text, lat, lon))
+        conn.executemany(Queries.INSERT_GAZETTEER, rows)
+        
+        # Перестраиваем полнотекстовый индекс по загруженным адресам
+        conn.execute(Queries.REBUILD_GAZETTEER_FTS)
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        print("Использование: python -m utils.gazetteer <addresses.csv|extract.osm>")
+        sys.exit(1)
+    
+    print(f"📥 Загрузка справочника адресов из {sys.argv[1]}...")
+    count = import_addresses(sys.argv[1])
+    print(f"✅ Загружено адресов: {count}")
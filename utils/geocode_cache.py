@@ -0,0 +1,296 @@
+"""
+Кэш геокодирования Рай-Такси
+
+Двухуровневый кэш: ограниченный LRU в памяти перед таблицей SQLite.
+Для прямого геокодирования ключом служит нормализованный адрес, поэтому
+"ул. Ленина, д.5" и "улица ленина 5" попадают в одну запись. Для обратного
+ключом служит ячейка сетки, к которой привязываются координаты. Повторные
+запросы разрешаются без обращения к сети, в том числе после перезапуска.
+"""
+
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import Config
+from database.queries import Queries
+
+logger = logging.getLogger(__name__)
+
+# Сокращения в адресах и их полные формы
+ADDRESS_ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'наб': 'набережная',
+    'туп': 'тупик',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'г': 'город',
+    'пос': 'поселок',
+    'корп': 'корпус',
+    'к': 'корпус',
+    'стр': 'строение',
+}
+
+# Слова, не влияющие на результат геокодирования
+ADDRESS_FILLER_WORDS = {'д', 'дом'}
+
+_ADDRESS_TOKEN = re.compile(r'[0-9a-zа-я]+(?:[/-][0-9a-zа-я]+)*')
+
+def normalize_address(address: str) -> str:
+    """
+    Нормализация адреса для ключа кэша
+    
+    Приводит к нижнему регистру, заменяет "ё" на "е", раскрывает
+    сокращения и убирает знаки препинания и лишние пробелы.
+    """
+    tokens = _ADDRESS_TOKEN.findall(address.lower().replace('ё', 'е'))
+    return ' '.join(
+        ADDRESS_ABBREVIATIONS.get(token, token)
+        for token in tokens
+        if token not in ADDRESS_FILLER_WORDS
+    )
+
+class LRUCache:
+    """Ограниченный кэш в памяти с вытеснением давно неиспользуемых записей и TTL"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Args:
+            max_size: максимум записей
+            ttl: время жизни записи в секундах (0 - без ограничения)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        # {ключ: (значение, время_сохранения)}
+        self._items: 'OrderedDict[Any, Tuple[Any, float]]' = OrderedDict()
+    
+    def get(self, key) -> Optional[Any]:
+        """Значение из кэша или None"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        
+        value, stored_at = item
+        if self.ttl > 0 and time.time() - stored_at > self.ttl:
+            del self._items[key]
+            return None
+        
+        self._items.move_to_end(key)
+        return value
+    
+    def set(self, key, value, stored_at: float = None):
+        """Сохранение значения в кэш"""
+        self._items[key] = (value, stored_at if stored_at is not None else time.time())
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+    
+    def delete(self, key):
+        """Удаление значения из кэша"""
+        self._items.pop(key, None)
+    
+    def clear(self):
+        """Очистка кэша"""
+        self._items.clear()
+    
+    def __len__(self) -> int:
+        return len(self._items)
+
+class GeocodeCache:
+    """Кэш "адрес -> координаты" в памяти и в SQLite"""
+    
+    def __init__(self, max_size: int = None, ttl: float = None):
+        """
+        Args:
+            max_size: максимум адресов в памяти
+            ttl: время жизни записи в секундах
+        """
+        self.ttl = ttl if ttl is not None else Config.CACHE_TTL
+        self.memory = LRUCache(max_size or Config.MAX_CACHE_SIZE, self.ttl)
+        self.db = None
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stored': 0}
+    
+    async def start(self, db_manager) -> int:
+        """
+        Подключение постоянного уровня кэша
+        
+        Returns:
+            Количество удаленных устаревших записей
+        """
+        self.db = db_manager
+        await self.db.execute(Queries.CREATE_GEOCODE_CACHE)
+        cursor = await self.db.execute(Queries.DELETE_STALE_GEOCODES, (self._expiry_threshold(),))
+        await self.db.commit()
+        return cursor.rowcount
+    
+    def _expiry_threshold(self) -> float:
+        """Время сохранения, раньше которого запись считается устаревшей"""
+        return time.time() - self.ttl if self.ttl > 0 else 0.0
+    
+    async def get(self, address: str) -> Optional[Tuple[float, float]]:
+        """Координаты адреса из кэша или None"""
+        key = normalize_address(address)
+        if not key:
+            return None
+        
+        coords = self.memory.get(key)
+        if coords is not None:
+            self._stats['memory_hits'] += 1
+            return coords
+        
+        if self.db is not None:
+            try:
+                cursor = await self.db.execute(Queries.GEOCODE_BY_KEY, (key, self._expiry_threshold()))
+                row = cursor.fetchone()
+            except Exception as e:
+                logger.error(f"Ошибка чтения кэша геокодирования: {e}")
+                row = None
+            
+            if row:
+                lat, lon, stored_at = row
+                coords = (lat, lon)
+                self.memory.set(key, coords, stored_at)
+                self._stats['db_hits'] += 1
+                return coords
+        
+        self._stats['misses'] += 1
+        return None
+    
+    async def set(self, address: str, coords: Tuple[float, float]):
+        """Сохранение координат адреса"""
+        key = normalize_address(address)
+        if not key:
+            return
+        
+        stored_at = time.time()
+        self.memory.set(key, coords, stored_at)
+        self._stats['stored'] += 1
+        
+        if self.db is not None:
+            try:
+                await self.db.execute(Queries.SAVE_GEOCODE, (key, coords[0], coords[1], stored_at))
+                await self.db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи кэша геокодирования: {e}")
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        stats = dict(self._stats)
+        stats['memory_size'] = len(self.memory)
+        return stats
+
+class ReverseGeocodeCache:
+    """
+    Кэш "координаты -> адрес" в памяти и в SQLite
+    
+    Координаты привязываются к ячейке сетки размером cell_size_m метров,
+    поэтому точки, отправленные от одного подъезда, дают одну запись.
+    """
+    
+    def __init__(self, cell_size_m: float = None, max_size: int = None,
+                 ttl: float = None, max_rows: int = None):
+        """
+        Args:
+            cell_size_m: размер ячейки сетки в метрах
+            max_size: максимум ячеек в памяти
+            ttl: время жизни записи в секундах
+            max_rows: максимум записей в таблице SQLite
+        """
+        self.cell_size_m = cell_size_m or Config.REVERSE_GEOCODE_CELL_M
+        self.lat_step = self.cell_size_m / 111320.0
+        self.ttl = ttl if ttl is not None else Config.CACHE_TTL
+        self.max_rows = max_rows or Config.REVERSE_GEOCODE_MAX_ROWS
+        self.memory = LRUCache(max_size or Config.MAX_CACHE_SIZE, self.ttl)
+        self.db = None
+        self._stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stored': 0}
+    
+    async def start(self, db_manager) -> int:
+        """
+        Подключение постоянного уровня кэша
+        
+        Returns:
+            Количество удаленных устаревших и лишних записей
+        """
+        self.db = db_manager
+        await self.db.execute(Queries.CREATE_REVERSE_GEOCODE_CACHE)
+        expired = await self.db.execute(Queries.DELETE_STALE_REVERSE_GEOCODES, (self._expiry_threshold(),))
+        trimmed = await self.db.execute(Queries.TRIM_REVERSE_GEOCODES, (self.max_rows,))
+        await self.db.commit()
+        return expired.rowcount + trimmed.rowcount
+    
+    def _expiry_threshold(self) -> float:
+        """Время сохранения, раньше которого запись считается устаревшей"""
+        return time.time() - self.ttl if self.ttl > 0 else 0.0
+    
+    def cell_key(self, lat: float, lon: float) -> str:
+        """Ключ ячейки сетки для точки"""
+        row = math.floor(lat / self.lat_step)
+        # Шаг по долготе подбирается так, чтобы ячейка оставалась примерно квадратной
+        row_lat = (row + 0.5) * self.lat_step
+        lon_step = self.lat_step / max(math.cos(math.radians(row_lat)), 0.01)
+        return f"{row}:{math.floor(lon / lon_step)}"
+    
+    async def get(self, lat: float, lon: float) -> Optional[str]:
+        """Адрес точки из кэша или None"""
+        key = self.cell_key(lat, lon)
+        
+        address = self.memory.get(key)
+        if address is not None:
+            self._stats['memory_hits'] += 1
+            return address
+        
+        if self.db is not None:
+            try:
+                cursor = await self.db.execute(Queries.REVERSE_GEOCODE_BY_CELL, (key, self._expiry_threshold()))
+                row = cursor.fetchone()
+            except Exception as e:
+                logger.error(f"Ошибка чтения кэша обратного геокодирования: {e}")
+                row = None
+            
+            if row:
+                address, stored_at = row
+                self.memory.set(key, address, stored_at)
+                self._stats['db_hits'] += 1
+                return address
+        
+        self._stats['misses'] += 1
+        return None
+    
+    async def set(self, lat: float, lon: float, address: str):
+        """Сохранение адреса точки"""
+        key = self.cell_key(lat, lon)
+        stored_at = time.time()
+        self.memory.set(key, address, stored_at)
+        self._stats['stored'] += 1
+        
+        if self.db is not None:
+            try:
+                await self.db.execute(Queries.SAVE_REVERSE_GEOCODE, (key, address, stored_at))
+                # Периодически обрезаем таблицу до max_rows самых свежих записей
+                if self._stats['stored'] % max(1, self.max_rows // 10) == 0:
+                    await self.db.execute(Queries.TRIM_REVERSE_GEOCODES, (self.max_rows,))
+                await self.db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи кэша обратного геокодирования: {e}")
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        stats = dict(self._stats)
+        stats['memory_size'] = len(self.memory)
+        return stats
+
+# Общие кэши процесса: постоянный уровень подключается в main.py
+geocode_cache = GeocodeCache()
+reverse_geocode_cache = ReverseGeocodeCache()
@@ -0,0 +1,159 @@
+"""
+Асинхронный клиент геокодера Nominatim для Рай-Такси
+
+Все запросы идут через одну общую HTTP-сессию aiohttp с пулом
+keep-alive соединений. Число одновременных запросов ограничено,
+а к каждому хосту запросы отправляются не чаще заданной частоты
+(политика Nominatim - не более 1 запроса в секунду).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'RaiTaxiBot/1.0 (https://github.com/your-username/raitaxi)' # Replace with actual repo URL
+
+class HostRateLimiter:
+    """Ограничение частоты запросов к каждому хосту"""
+    
+    def __init__(self, requests_per_second: float = 1.0):
+        """
+        Args:
+            requests_per_second: допустимая частота запросов к одному хосту
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        # Время, раньше которого нельзя отправить следующий запрос: {хост: monotonic}
+        self._next_allowed: Dict[str, float] = {}
+    
+    async def acquire(self, host: str):
+        """Ожидание своей очереди на запрос к хосту"""
+        if self.interval <= 0:
+            return
+        
+        # Резервируем слот сразу, чтобы параллельные запросы выстроились по очереди
+        now = time.monotonic()
+        slot = max(now, self._next_allowed.get(host, 0.0))
+        self._next_allowed[host] = slot + self.interval
+        
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class GeocodingClient:
+    """Клиент Nominatim на общей пуловой HTTP-сессии"""
+    
+    def __init__(self, base_url: str = None, timeout: float = None,
+                 max_concurrent: int = None, requests_per_second: float = None):
+        """
+        Args:
+            base_url: адрес сервера Nominatim
+            timeout: общий таймаут запроса в секундах
+            max_concurrent: максимум одновременных запросов
+            requests_per_second: частота запросов к одному хосту
+        """
+        self.base_url = (base_url or Config.NOMINATIM_URL).rstrip('/')
+        self.timeout = timeout if timeout is not None else Config.GEOCODER_TIMEOUT
+        self.max_concurrent = max(1, max_concurrent or Config.GEOCODER_MAX_CONCURRENT)
+        self.rate_limiter = HostRateLimiter(
+            requests_per_second if requests_per_second is not None else Config.GEOCODER_RATE_LIMIT
+        )
+        
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._stats = {'requests': 0, 'errors': 0, 'timeouts': 0}
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия (создается при первом запросе)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrent,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': USER_AGENT}
+            )
+        return self._session
+    
+    async def close(self):
+        """Закрытие HTTP-сессии"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _request(self, path: str, params: Dict[str, Any]) -> Optional[Any]:
+        """
+        GET-запрос к Nominatim
+        
+        Returns:
+            Разобранный JSON или None при ошибке
+        """
+        url = self.base_url + path
+        async with self._semaphore:
+            await self.rate_limiter.acquire(urlsplit(url).netloc)
+            self._stats['requests'] += 1
+            try:
+                async with self._get_session().get(url, params=params) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except asyncio.TimeoutError:
+                self._stats['timeouts'] += 1
+                logger.error(f"Таймаут запроса к геокодеру {path} ({self.timeout} с)")
+                return None
+            except (aiohttp.ClientError, ValueError) as e:
+                self._stats['errors'] += 1
+                logger.error(f"Ошибка запроса к геокодеру {path}: {e}")
+                return None
+    
+    async def search(self, address: str) -> Optional[Tuple[float, float]]:
+        """
+        Геокодирование адреса
+        
+        Returns:
+            (lat, lon) или None, если адрес не найден
+        """
+        data = await self._request('/search', {
+            'q': address,
+            'format': 'json',
+            'limit': 1,
+            'addressdetails': 0,
+            'extratags': 0,
+            'namedetails': 0
+        })
+        try:
+            if data:
+                return float(data[0]['lat']), float(data[0]['lon'])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.error(f"Ошибка парсинга ответа геокодера: {e}")
+        return None
+    
+    async def reverse(self, lat: float, lon: float) -> Optional[str]:
+        """
+        Обратное геокодирование координат
+        
+        Returns:
+            Адрес или None, если он не найден
+        """
+        data = await self._request('/reverse', {
+            'lat': lat,
+            'lon': lon,
+            'format': 'json',
+            'zoom': 18, # Уровень детализации адреса
+            'addressdetails': 1
+        })
+        if isinstance(data, dict):
+            return data.get('display_name')
+        return None
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика запросов"""
+        return dict(self._stats)
@@ -0,0 +1,106 @@
+"""
+Кэш file_id отправленных карт Рай-Такси
+
+Telegram возвращает file_id для каждой загруженной фотографии, и по нему
+ту же фотографию можно отправить повторно без загрузки. Ключ карты
+вычисляется из ее содержимого (округленные точки, зум, размер), поэтому
+повторное превью того же маршрута отправляется по file_id - без
+отрисовки и без передачи изображения. Соответствие хранится в памяти
+и в SQLite и переживает перезапуск бота.
+"""
+
+import hashlib
+import logging
+import time
+from typing import Dict, Optional
+
+from config import Config
+from database.queries import Queries
+from utils.geocode_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+class MapCache:
+    """Кэш "ключ карты -> file_id Telegram" в памяти и в SQLite"""
+    
+    def __init__(self, max_size: int = None, max_rows: int = None):
+        """
+        Args:
+            max_size: максимум ключей в памяти
+            max_rows: максимум записей в таблице SQLite
+        """
+        self.max_rows = max_rows or Config.MAP_CACHE_MAX_ROWS
+        self.memory = LRUCache(max_size or Config.MAX_CACHE_SIZE, 0)
+        self.db = None
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'forgotten': 0}
+    
+    async def start(self, db_manager) -> int:
+        """
+        Подключение постоянного уровня кэша
+        
+        Returns:
+            Количество удаленных лишних записей
+        """
+        self.db = db_manager
+        await self.db.execute(Queries.CREATE_MAP_FILE_IDS)
+        cursor = await self.db.execute(Queries.TRIM_MAP_FILE_IDS, (self.max_rows,))
+        await self.db.commit()
+        return cursor.rowcount
+    
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Ключ карты по параметрам, полностью определяющим изображение"""
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+    
+    async def get_file_id(self, key: str) -> Optional[str]:
+        """file_id карты или None, если она еще не отправлялась"""
+        file_id = self.memory.get(key)
+        if file_id is None and self.db is not None:
+            try:
+                cursor = await self.db.execute(Queries.MAP_FILE_ID_BY_KEY, (key,))
+                row = cursor.fetchone()
+            except Exception as e:
+                logger.error(f"Ошибка чтения кэша карт: {e}")
+                row = None
+            if row:
+                file_id = row[0]
+                self.memory.set(key, file_id)
+        
+        self._stats['hits' if file_id is not None else 'misses'] += 1
+        return file_id
+    
+    async def set_file_id(self, key: str, file_id: str):
+        """Сохранение file_id отправленной карты"""
+        self.memory.set(key, file_id)
+        self._stats['stored'] += 1
+        
+        if self.db is not None:
+            try:
+                await self.db.execute(Queries.SAVE_MAP_FILE_ID, (key, file_id, time.time()))
+                # Периодически обрезаем таблицу до max_rows самых свежих записей
+                if self._stats['stored'] % max(1, self.max_rows // 10) == 0:
+                    await self.db.execute(Queries.TRIM_MAP_FILE_IDS, (self.max_rows,))
+                await self.db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи кэша карт: {e}")
+    
+    async def forget_file_id(self, key: str):
+        """Удаление file_id, который Telegram больше не принимает"""
+        self.memory.delete(key)
+        self._stats['forgotten'] += 1
+        
+        if self.db is not None:
+            try:
+                await self.db.execute(Queries.DELETE_MAP_FILE_ID, (key,))
+                await self.db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи кэша карт: {e}")
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        stats = dict(self._stats)
+        stats['memory_size'] = len(self.memory)
+        return stats
+
+# Общий кэш процесса: постоянный уровень подключается в main.py
+map_cache = MapCache()
@@ -0,0 +1,397 @@
+"""
+Локальная отрисовка карт Рай-Такси
+
+Карта склеивается из заранее скачанных растровых тайлов OSM, которые
+лежат на диске в виде {MAP_TILES_DIR}/{zoom}/{x}/{y}.png. Маркеры,
+линия маршрута и подписи рисуются за один проход Pillow, а картинка
+кодируется один раз, поэтому превью карты строится без сети за
+десятки миллисекунд.
+
+Загрузка тайлов зоны обслуживания:
+    python -m utils.map_renderer <min_lat> <min_lon> <max_lat> <max_lon> [min_zoom] [max_zoom]
+"""
+
+import asyncio
+import io
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# Цвет фона на месте отсутствующих тайлов
+BACKGROUND_COLOR = (232, 228, 216)
+ROUTE_COLOR = (30, 100, 220)
+
+# Форматы изображения карты и расширения их файлов
+IMAGE_EXTENSIONS = {'png': 'png', 'png8': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+# Цветов в палитре для png8: тайлы OSM укладываются в нее без заметных потерь
+PALETTE_COLORS = 128
+
+# Шрифты с кириллицей в порядке предпочтения
+FONT_NAMES = ("DejaVuSans.ttf", "arial.ttf")
+
+def lat_lon_to_pixel(lat: float, lon: float, zoom: int) -> Tuple[float, float]:
+    """Глобальные пиксельные координаты точки (проекция Web Mercator)"""
+    scale = TILE_SIZE * (2 ** zoom)
+    lat = max(min(lat, 85.0511), -85.0511)
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0 * scale
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+def load_font(size: int = 16):
+    """Шрифт для подписей на карте"""
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+def encode_image(image: Image.Image, image_format: str = 'png', quality: int = 80) -> bytes:
+    """
+    Кодирование изображения карты
+    
+    Args:
+        image: изображение RGB
+        image_format: png (полноцветный), png8 (палитра), jpeg или webp
+        quality: качество для jpeg и webp (1-100)
+    
+    Returns:
+        Закодированное изображение
+    """
+    output = io.BytesIO()
+    if image_format == 'png8':
+        image.quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE).save(output, format='PNG', optimize=True)
+    elif image_format == 'jpeg':
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+    elif image_format == 'webp':
+        image.save(output, format='WEBP', quality=quality, method=4)
+    else:
+        image.save(output, format='PNG')
+    return output.getvalue()
+
+class TileStore:
+    """Тайлы на диске с кэшем декодированных изображений в памяти"""
+    
+    def __init__(self, tiles_dir: str = None, cache_size: int = None):
+        """
+        Args:
+            tiles_dir: папка с тайлами {zoom}/{x}/{y}.png
+            cache_size: максимум декодированных тайлов в памяти
+        """
+        self.tiles_dir = tiles_dir or Config.MAP_TILES_DIR
+        self.cache_size = max(1, cache_size or Config.MAP_TILE_CACHE_SIZE)
+        self._tiles: 'OrderedDict[Tuple[int, int, int], Optional[Image.Image]]' = OrderedDict()
+    
+    def tile_path(self, zoom: int, x: int, y: int) -> str:
+        """Путь к файлу тайла"""
+        return os.path.join(self.tiles_dir, str(zoom), str(x), f"{y}.png")
+    
+    def get(self, zoom: int, x: int, y: int) -> Optional[Image.Image]:
+        """Декодированный тайл или None, если его нет на диске"""
+        key = (zoom, x, y)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+        
+        tile = None
+        path = self.tile_path(zoom, x, y)
+        if os.path.exists(path):
+            try:
+                with Image.open(path) as image:
+                    tile = image.convert('RGB')
+            except OSError as e:
+                logger.error(f"Поврежденный тайл {path}: {e}")
+        
+        # Отсутствие тайла тоже кэшируем, чтобы не проверять диск каждый раз
+        self._tiles[key] = tile
+        while len(self._tiles) > self.cache_size:
+            self._tiles.popitem(last=False)
+        return tile
+    
+    def clear(self):
+        """Очистка кэша тайлов (после загрузки новых)"""
+        self._tiles.clear()
+
+class MapRenderer:
+    """Сборка карты из локальных тайлов"""
+    
+    def __init__(self, tile_store: TileStore = None):
+        self.tiles = tile_store or TileStore()
+        self.font = load_font(16)
+        self.label_font = load_font(14)
+    
+    def render(self, center_lat: float, center_lon: float, zoom: int,
+               width: int, height: int,
+               markers: Sequence[tuple] = (),
+               route: Sequence[Tuple[float, float]] = (),
+               captions: Sequence[str] = (),
+               image_format: str = 'png', quality: int = 80) -> Optional[bytes]:
+        """
+        Отрисовка и кодирование карты
+        
+        Args:
+            image_format, quality: формат и качество (см. encode_image),
+            остальные - как у compose
+        
+        Returns:
+            Изображение или None, если для этого места нет ни одного тайла
+        """
+        image = self.compose(center_lat, center_lon, zoom, width, height, markers, route, captions)
+        if image is None:
+            return None
+        return encode_image(image, image_format, quality)
+    
+    def compose(self, center_lat: float, center_lon: float, zoom: int,
+                width: int, height: int,
+                markers: Sequence[tuple] = (),
+                route: Sequence[Tuple[float, float]] = (),
+                captions: Sequence[str] = ()) -> Optional[Image.Image]:
+        """
+        Отрисовка карты
+        
+        Args:
+            center_lat, center_lon: координаты центра карты
+            zoom: уровень зума
+            width, height: размер изображения
+            markers: маркеры [(lat, lon, color, label), ...]
+            route: точки линии маршрута [(lat, lon), ...]
+            captions: строки подписи в левом верхнем углу
+        
+        Returns:
+            Изображение RGB или None, если для этого места нет ни одного тайла
+        """
+        center_x, center_y = lat_lon_to_pixel(center_lat, center_lon, zoom)
+        left = center_x - width / 2
+        top = center_y - height / 2
+        
+        image = Image.new('RGB', (width, height), BACKGROUND_COLOR)
+        if not self._paste_tiles(image, zoom, left, top):
+            logger.warning(f"Нет тайлов для карты в точке {center_lat:.4f}, {center_lon:.4f} (папка {self.tiles.tiles_dir})")
+            return None
+        
+        draw = ImageDraw.Draw(image)
+        
+        def to_image(lat: float, lon: float) -> Tuple[float, float]:
+            x, y = lat_lon_to_pixel(lat, lon, zoom)
+            return x - left, y - top
+        
+        if len(route) >= 2:
+            draw.line([to_image(lat, lon) for lat, lon in route], fill=ROUTE_COLOR, width=4, joint='curve')
+        
+        for lat, lon, color, label in markers:
+            self._draw_marker(draw, to_image(lat, lon), color, label)
+        
+        for number, caption in enumerate(captions):
+            self._draw_text(draw, (10, 10 + number * 20), caption, 'black')
+        self._draw_text(draw, (10, height - 26), "Рай-Такси", 'red')
+        return image
+    
+    def _paste_tiles(self, image: Image.Image, zoom: int, left: float, top: float) -> int:
+        """
+        Вклейка тайлов, покрывающих изображение
+        
+        Returns:
+            Количество найденных тайлов
+        """
+        tiles_per_side = 2 ** zoom
+        first_x, first_y = int(left // TILE_SIZE), int(top // TILE_SIZE)
+        last_x = int((left + image.width - 1) // TILE_SIZE)
+        last_y = int((top + image.height - 1) // TILE_SIZE)
+        
+        found = 0
+        for tile_y in range(first_y, last_y + 1):
+            if tile_y < 0 or tile_y >= tiles_per_side:
+                continue
+            for tile_x in range(first_x, last_x + 1):
+                # По долготе карта замкнута
+                tile = self.tiles.get(zoom, tile_x % tiles_per_side, tile_y)
+                if tile is None:
+                    continue
+                image.paste(tile, (int(round(tile_x * TILE_SIZE - left)), int(round(tile_y * TILE_SIZE - top))))
+                found += 1
+        return found
+    
+    def _draw_marker(self, draw: ImageDraw.ImageDraw, point: Tuple[float, float], color: str, label: str):
+        """Маркер: цветной круг с белой обводкой и подписью"""
+        x, y = point
+        radius = 11
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color, outline='white', width=2)
+        if label:
+            draw.text((x, y), label, fill='white', font=self.label_font, anchor='mm')
+    
+    def _draw_text(self, draw: ImageDraw.ImageDraw, position: Tuple[int, int], text: str, color: str):
+        """Подпись с белой обводкой, читаемая на любом фоне"""
+        draw.text(position, text, fill=color, font=self.font, stroke_width=2, stroke_fill='white')
+
+# Отрисовщик текущего рабочего потока (процесса) пула: шрифты и кэш
+# тайлов загружаются один раз на рабочий и не делятся между потоками
+_worker = threading.local()
+
+def _init_worker():
+    """Подготовка рабочего пула отрисовки"""
+    _worker.renderer = MapRenderer()
+
+def _render_in_worker(kwargs: dict) -> Optional[bytes]:
+    """Отрисовка карты в рабочем пула"""
+    renderer = getattr(_worker, 'renderer', None)
+    if renderer is None:
+        _init_worker()
+        renderer = _worker.renderer
+    return renderer.render(**kwargs)
+
+class RenderPool:
+    """
+    Ограниченный пул отрисовки карт
+    
+    Отрисовка выполняется вне цикла событий. Если в очереди уже
+    max_pending карт, новая не ставится в очередь: ответ уйдет без карты.
+    """
+    
+    def __init__(self, workers: int = None, max_pending: int = None, mode: str = None):
+        """
+        Args:
+            workers: число рабочих потоков (процессов)
+            max_pending: максимум карт в работе и в очереди
+            mode: "thread" или "process" (процессы недоступны в Termux)
+        """
+        self.workers = max(1, workers or Config.MAP_RENDER_WORKERS)
+        self.max_pending = max(1, max_pending or Config.MAP_RENDER_QUEUE_LIMIT)
+        self.mode = mode or Config.MAP_RENDER_MODE
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._stats = {'rendered': 0, 'rejected': 0, 'errors': 0}
+    
+    def _get_executor(self) -> Executor:
+        """Пул (создается при первой отрисовке)"""
+        if self._executor is None:
+            if self.mode == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker, thread_name_prefix='map-render'
+                )
+        return self._executor
+    
+    @property
+    def is_saturated(self) -> bool:
+        """Заполнена ли очередь отрисовки"""
+        return self._pending >= self.max_pending
+    
+    async def render(self, **kwargs) -> Optional[bytes]:
+        """
+        Отрисовка карты в пуле (аргументы - как у MapRenderer.render)
+        
+        Returns:
+            PNG или None, если пул перегружен, тайлов нет или произошла ошибка
+        """
+        if self.is_saturated:
+            self._stats['rejected'] += 1
+            logger.warning(f"Очередь отрисовки карт заполнена ({self._pending}), ответ без карты")
+            return None
+        
+        self._pending += 1
+        try:
+            map_data = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _render_in_worker, kwargs
+            )
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Ошибка отрисовки карты: {e}")
+            return None
+        finally:
+            self._pending -= 1
+        
+        self._stats['rendered'] += 1
+        return map_data
+    
+    def close(self):
+        """Остановка пула"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика пула"""
+        stats = dict(self._stats)
+        stats['pending'] = self._pending
+        return stats
+
+def tiles_for_area(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                   zoom: int) -> Iterator[Tuple[int, int]]:
+    """Номера тайлов (x, y), покрывающих область на уровне зума"""
+    left, top = lat_lon_to_pixel(max_lat, min_lon, zoom)
+    right, bottom = lat_lon_to_pixel(min_lat, max_lon, zoom)
+    for x in range(int(left // TILE_SIZE), int(right // TILE_SIZE) + 1):
+        for y in range(int(top // TILE_SIZE), int(bottom // TILE_SIZE) + 1):
+            yield x, y
+
+def download_tiles(bbox: Tuple[float, float, float, float], zooms: List[int],
+                   tiles_dir: str = None, delay: float = 1.0) -> int:
+    """
+    Загрузка тайлов области с сервера MAP_TILE_URL (уже скачанные пропускаются)
+    
+    Args:
+        bbox: (min_lat, min_lon, max_lat, max_lon)
+        zooms: уровни зума
+        tiles_dir: папка для тайлов
+        delay: пауза между запросами в секундах (политика тайл-серверов OSM)
+    
+    Returns:
+        Количество скачанных тайлов
+    """
+    import requests
+    from utils.geocoder import USER_AGENT
+    
+    store = TileStore(tiles_dir)
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    
+    downloaded = 0
+    for zoom in zooms:
+        for x, y in tiles_for_area(*bbox, zoom):
+            path = store.tile_path(zoom, x, y)
+            if os.path.exists(path):
+                continue
+            
+            try:
+                response = session.get(Config.MAP_TILE_URL.format(z=zoom, x=x, y=y), timeout=10)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Ошибка загрузки тайла {zoom}/{x}/{y}: {e}")
+                continue
+            
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(response.content)
+            downloaded += 1
+            time.sleep(delay)
+    return downloaded
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        print("Использование: python -m utils.map_renderer <min_lat> <min_lon> <max_lat> <max_lon> [min_zoom] [max_zoom]")
+        sys.exit(1)
+    
+    bbox = tuple(float(value) for value in sys.argv[1:5])
+    min_zoom = int(sys.argv[5]) if len(sys.argv) > 5 else 12
+    max_zoom = int(sys.argv[6]) if len(sys.argv) > 6 else 16
+    
+    print(f"📥 Загрузка тайлов в {Config.MAP_TILES_DIR} (зум {min_zoom}-{max_zoom})...")
+    count = download_tiles(bbox, list(range(min_zoom, max_zoom + 1)))
+    print(f"✅ Загружено тайлов: {count}")
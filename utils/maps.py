@@ -1,95 +1,123 @@
 """
-Сервис для работы с картами OSM Static Maps
+Сервис для работы с картами (локальные тайлы OSM)
 """
 
-import requests
+import asyncio
 import os
+import time
 from typing import Tuple, Optional
-from PIL import Image, ImageDraw, ImageFont
-import io
 from config import Config
+from utils.map_renderer import RenderPool, IMAGE_EXTENSIONS
+from utils.geocoder import GeocodingClient
+from utils.geocode_cache import geocode_cache, reverse_geocode_cache
+from utils.gazetteer import gazetteer
+from utils.address_autocomplete import address_autocomplete
+from utils.map_cache import map_cache
+from services.routing import road_router
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Размеры карты по уровням качества: (ширина, высота)
+MAP_SIZE_TIERS = {
+    'high': (Config.MAP_WIDTH, Config.MAP_HEIGHT),
+    'medium': (480, 320),
+    'low': (360, 240),
+}
+
+# Минимальная скорость загрузки фото в Telegram (байт/с) для уровня
+TIER_MIN_UPLOAD_SPEED = (('high', 150 * 1024), ('medium', 40 * 1024), ('low', 0))
+
+# Вес последнего замера в скользящей средней скорости загрузки
+UPLOAD_SPEED_SMOOTHING = 0.3
+
+# Период очистки папки построенных карт (с) и возраст удаляемых файлов (ч):
+# отправленная карта удаляется сразу, здесь убираются неотправленные
+MAP_CLEANUP_INTERVAL = 3600
+MAP_FILE_MAX_AGE_HOURS = 1
+
 class MapService:
     """Сервис для работы с картами"""
     
     def __init__(self):
-        self.base_url = Config.OSM_STATIC_MAPS_URL
         self.width = Config.MAP_WIDTH
         self.height = Config.MAP_HEIGHT
         self.zoom = Config.MAP_ZOOM
         
+        # Кодирование карт: формат, качество и уровень размера (auto - по скорости сети)
+        self.image_format = Config.MAP_IMAGE_FORMAT if Config.MAP_IMAGE_FORMAT in IMAGE_EXTENSIONS else 'png'
+        self.image_quality = Config.MAP_IMAGE_QUALITY
+        self.size_tier = Config.MAP_SIZE_TIER
+        self._upload_speed: Optional[float] = None
+        
+        # Общий асинхронный клиент геокодера
+        self.geocoder = GeocodingClient()
+        
+        # Карты собираются из тайлов на диске в пуле вне цикла событий
+        self.render_pool = RenderPool()
+        
         # Создаем папку для кэша карт
         self.cache_dir = "static/images/maps"
         os.makedirs(self.cache_dir, exist_ok=True)
+        self._cleanup_task = None
 
-    def geocode_address(self, address: str) -> Optional[Tuple[float, float]]:
+    async def geocode_address(self, address: str) -> Optional[Tuple[float, float]]:
         """
         Геокодирование адреса (преобразование адреса в координаты)
         Использует Nominatim OpenStreetMap API.
         """
-        nominatim_url = Config.NOMINATIM_URL + "/search"
-        params = {
-            'q': address,
-            'format': 'json',
-            'limit': 1,
-            'addressdetails': 0,
-            'extratags': 0,
-            'namedetails': 0
-        }
-        headers = {
-            'User-Agent': 'RaiTaxiBot/1.0 (https://github.com/your-username/raitaxi)' # Replace with actual repo URL
-        }
-        try:
-            response = requests.get(nominatim_url, params=params, headers=headers, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            if data and len(data) > 0:
-                lat = float(data[0]['lat'])
-                lon = float(data[0]['lon'])
-                return lat, lon
-            return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка геокодирования адреса '{address}': {e}")
-            return None
-        except ValueError as e:
-            logger.error(f"Ошибка парсинга ответа геокодера: {e}")
-            return None
+        coords = await geocode_cache.get(address)
+        if coords is None:
+            # Локальный справочник адресов работает и без сети
+            coords = await gazetteer.geocode(address)
+        if coords is None:
+            coords = await self.geocoder.search(address)
+            if coords is not None:
+                await geocode_cache.set(address, coords)
+        
+        if coords is not None:
+            # Найденный адрес будет предлагаться в подсказках
+            address_autocomplete.add(address, *coords)
+        return coords
 
-    def reverse_geocode_coords(self, lat: float, lon: float) -> Optional[str]:
+    async def reverse_geocode_coords(self, lat: float, lon: float) -> Optional[str]:
         """
         Обратное геокодирование координат (преобразование координат в адрес)
         Использует Nominatim OpenStreetMap API.
         """
-        nominatim_url = Config.NOMINATIM_URL + "/reverse"
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'format': 'json',
-            'zoom': 18, # Уровень детализации адреса
-            'addressdetails': 1
-        }
-        headers = {
-            'User-Agent': 'RaiTaxiBot/1.0 (https://github.com/your-username/raitaxi)'
-        }
-        try:
-            response = requests.get(nominatim_url, params=params, headers=headers, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            if data and 'display_name' in data:
-                return data['display_name']
-            return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка обратного геокодирования координат ({lat}, {lon}): {e}")
-            return None
-        except ValueError as e:
-            logger.error(f"Ошибка парсинга ответа обратного геокодера: {e}")
-            return None
+        address = await reverse_geocode_cache.get(lat, lon)
+        if address is not None:
+            return address
+        
+        address = await self.geocoder.reverse(lat, lon)
+        if address is not None:
+            await reverse_geocode_cache.set(lat, lon, address)
+        return address
+    
+    def start(self):
+        """Запуск периодической очистки папки построенных карт"""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
     
-    def get_static_map(self, center_lat: float, center_lon: float,
-                       markers: list = None, routes: list = None) -> Optional[bytes]:
+    async def _cleanup_loop(self):
+        """Удаление неотправленных карт, начиная с оставшихся от прошлого запуска"""
+        while True:
+            await self.clear_cache(MAP_FILE_MAX_AGE_HOURS)
+            await asyncio.sleep(MAP_CLEANUP_INTERVAL)
+    
+    async def close(self):
+        """Остановка очистки, закрытие HTTP-сессии геокодера и пула отрисовки"""
+        task, self._cleanup_task = self._cleanup_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.geocoder.close()
+        self.render_pool.close()
+    
+    async def get_static_map(self, center_lat: float, center_lon: float,
+                       markers: list = None, routes: list = None,
+                       zoom: int = None, captions: list = None,
+                       size: Tuple[int, int] = None, route_points: list = None) -> Optional[bytes]:
         """
         Получение статической карты
         
@@ -97,62 +125,31 @@ class MapService:
             center_lat, center_lon: координаты центра карты
             markers: список маркеров [(lat, lon, color, label), ...]
             routes: список маршрутов [(lat1, lon1, lat2, lon2), ...]
+            zoom: уровень зума (по умолчанию MAP_ZOOM)
+            captions: строки подписи на карте
+            size: размер изображения (по умолчанию MAP_WIDTH x MAP_HEIGHT)
+            route_points: линия маршрута по дорогам [(lat, lon), ...]
         
         Returns:
-            Изображение карты в формате bytes или None при ошибке
+            Изображение карты в формате bytes или None, если карту
+            построить не удалось или пул отрисовки перегружен
         """
-        try:
-            # Формируем параметры запроса
-            params = {
-                'center': f"{center_lat},{center_lon}",
-                'zoom': self.zoom,
-                'size': f"{self.width}x{self.height}",
-                'maptype': 'mapnik',  # Стандартная карта OSM
-                'format': 'png'
-            }
-            
-            # Добавляем маркеры
-            if markers:
-                marker_params = []
-                for lat, lon, color, label in markers:
-                    marker_str = f"{color},{lat},{lon}"
-                    if label:
-                        marker_str += f",{label}"
-                    marker_params.append(marker_str)
-                
-                params['markers'] = marker_params
-            
-            # Добавляем маршруты (если поддерживаются)
-            if routes:
-                # OSM Static Maps API doesn't directly support drawing routes via a 'routes' parameter
-                # This would typically require a routing service (e.g., OSRM, GraphHopper)
-                # and then drawing the polyline on the map.
-                # For simplicity, we'll just add markers for start/end of route for now.
-                # A more advanced implementation would fetch polyline data and add it as an overlay.
-                logger.warning("Warning: 'routes' parameter is not directly supported by OpenStreetMap static maps for drawing polylines.")
-                logger.warning("Consider using a routing service (e.g., OSRM, GraphHopper) and drawing the polyline as an overlay.")
-            
-            # Выполняем запрос
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            return response.content
-            
-        except requests.exceptions.RequestException as e:
-            if isinstance(e, requests.exceptions.ConnectionError) and "NameResolutionError" in str(e):
-                logger.error(f"Ошибка получения карты: Не удалось разрешить доменное имя '{self.base_url}'. Проверьте подключение к интернету, настройки DNS или брандмауэр. Детали: {e}")
-            elif isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 404:
-                logger.error(f"Ошибка получения карты: Ресурс не найден (404). Возможно, URL статического сервиса карт некорректен. Текущий URL: {self.base_url}. Детали: {e}")
-            else:
-                logger.error(f"Ошибка получения карты: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Неизвестная ошибка при получении карты: {e}")
-            return None
+        route = list(route_points or [])
+        for lat1, lon1, lat2, lon2 in routes or []:
+            route.extend([(lat1, lon1), (lat2, lon2)])
+        
+        width, height = size or (self.width, self.height)
+        return await self.render_pool.render(
+            center_lat=center_lat, center_lon=center_lon, zoom=zoom or self.zoom,
+            width=width, height=height,
+            markers=markers or [], route=route, captions=captions or [],
+            image_format=self.image_format, quality=self.image_quality
+        )
     
-    def create_simple_map(self, pickup_lat: float, pickup_lon: float,
+    async def create_simple_map(self, pickup_lat: float, pickup_lon: float,
                          destination_lat: float = None, destination_lon: float = None,
-                         driver_lat: float = None, driver_lon: float = None) -> Optional[bytes]:
+                         driver_lat: float = None, driver_lon: float = None,
+                         size: Tuple[int, int] = None, route_points: list = None) -> Optional[bytes]:
         """
         Создание простой карты с маркерами
         
@@ -160,6 +157,8 @@ class MapService:
             pickup_lat, pickup_lon: координаты точки отправления
             destination_lat, destination_lon: координаты точки назначения
             driver_lat, driver_lon: координаты водителя
+            size: размер изображения
+            route_points: линия маршрута по дорогам (по умолчанию - прямая)
         
         Returns:
             Изображение карты в формате bytes
@@ -168,76 +167,121 @@ class MapService:
         if destination_lat and destination_lon:
             center_lat = (pickup_lat + destination_lat) / 2
             center_lon = (pickup_lon + destination_lon) / 2
-            self.zoom = self.calculate_optimal_zoom(pickup_lat, pickup_lon, destination_lat, destination_lon)
+            zoom = self.calculate_optimal_zoom(pickup_lat, pickup_lon, destination_lat, destination_lon)
         else:
             center_lat, center_lon = pickup_lat, pickup_lon
-            self.zoom = Config.MAP_ZOOM # Reset to default if only one point
+            zoom = Config.MAP_ZOOM
 
-        # Формируем маркеры
+        # Формируем маркеры и подписи
         markers = [
             (pickup_lat, pickup_lon, 'red', 'A'),  # Точка отправления
         ]
+        captions = [f"Откуда: {pickup_lat:.4f}, {pickup_lon:.4f}"]
+        routes = []
         
         if destination_lat and destination_lon:
             markers.append((destination_lat, destination_lon, 'green', 'B'))  # Точка назначения
+            captions.append(f"Куда: {destination_lat:.4f}, {destination_lon:.4f}")
+            if not route_points:
+                routes.append((pickup_lat, pickup_lon, destination_lat, destination_lon))
         
         if driver_lat and driver_lon:
-            markers.append((driver_lat, driver_lon, 'blue', '🚗'))  # Водитель
-        
-        # Получаем карту
-        map_data = self.get_static_map(center_lat, center_lon, markers=markers)
+            markers.append((driver_lat, driver_lon, 'blue', 'T'))  # Водитель
         
-        if map_data:
-            # Добавляем дополнительную информацию на карту
-            return self.add_map_overlay(map_data, pickup_lat, pickup_lon,
-                                      destination_lat, destination_lon)
-        
-        return map_data
+        return await self.get_static_map(center_lat, center_lon, markers=markers,
+                                   routes=routes, zoom=zoom, captions=captions, size=size,
+                                   route_points=route_points)
     
-    def add_map_overlay(self, map_data: bytes, pickup_lat: float, pickup_lon: float,
-                        destination_lat: float = None, destination_lon: float = None) -> bytes:
+    async def get_map(self, pickup_lat: float, pickup_lon: float,
+                      destination_lat: float = None, destination_lon: float = None) -> Tuple[str, Optional[str], Optional[bytes]]:
         """
-        Добавление дополнительной информации на карту
+        Карта маршрута из кэша или новая
+        
+        Координаты округляются до MAP_CACHE_PRECISION знаков, поэтому
+        одинаковые маршруты дают одну и ту же карту и один ключ.
         
         Args:
-            map_data: исходное изображение карты
             pickup_lat, pickup_lon: координаты точки отправления
             destination_lat, destination_lon: координаты точки назначения
         
         Returns:
-            Изображение с наложенной информацией
+            (ключ карты, file_id уже отправленной карты или None,
+             изображение или None, если file_id известен или карту построить не удалось)
         """
-        try:
-            # Открываем изображение
-            image = Image.open(io.BytesIO(map_data))
-            draw = ImageDraw.Draw(image)
-            
-            # Простой шрифт (если доступен)
-            try:
-                font = ImageFont.truetype("arial.ttf", 16)
-            except:
-                font = ImageFont.load_default()
-            
-            # Добавляем информацию о координатах
-            info_text = f"Откуда: {pickup_lat:.4f}, {pickup_lon:.4f}"
-            draw.text((10, 10), info_text, fill='black', font=font)
-            
-            if destination_lat and destination_lon:
-                info_text2 = f"Куда: {destination_lat:.4f}, {destination_lon:.4f}"
-                draw.text((10, 30), info_text2, fill='black', font=font)
-            
-            # Добавляем логотип Рай-Такси
-            logo_text = "🚗 Рай-Такси"
-            draw.text((10, image.height - 30), logo_text, fill='red', font=font)
-            
-            # Сохраняем в bytes
-            output = io.BytesIO()
-            image.save(output, format='PNG')
-            return output.getvalue()
-            
-        except Exception as e:
-            logger.error(f"Ошибка добавления оверлея: {e}")
-            return map_data
+        precision = Config.MAP_CACHE_PRECISION
+        pickup_lat, pickup_lon = round(pickup_lat, precision), round(pickup_lon, precision)
+        if destination_lat and destination_lon:
+            destination_lat, destination_lon = round(destination_lat, precision), round(destination_lon, precision)
+            zoom = self.calculate_optimal_zoom(pickup_lat, pickup_lon, destination_lat, destination_lon)
+        else:
+            destination_lat = destination_lon = None
+            zoom = Config.MAP_ZOOM
+        
+        size = MAP_SIZE_TIERS[self.get_size_tier()]
+        key = map_cache.make_key(pickup_lat, pickup_lon, destination_lat, destination_lon,
+                                 zoom, size, self.image_format, self.image_quality,
+                                 road_router.is_available)
+        
+        file_id = await map_cache.get_file_id(key)
+        if file_id is not None:
+            return key, file_id, None
+        
+        # Карта могла быть построена раньше, но еще не отправлена
+        filename = self.map_filename(key)
+        map_data = await self.load_map_from_cache(filename)
+        if map_data is None:
+            route = None
+            if destination_lat is not None:
+                route = await road_router.get_route(pickup_lat, pickup_lon, destination_lat, destination_lon)
+            map_data = await self.create_simple_map(
+                pickup_lat, pickup_lon, destination_lat, destination_lon,
+                size=size, route_points=route.points if route else None
+            )
+            if map_data:
+                await self.save_map_to_cache(map_data, filename)
+        return key, None, map_data
+    
+    def map_filename(self, key: str) -> str:
+        """Имя файла карты с расширением текущего формата"""
+        return f"{key}.{IMAGE_EXTENSIONS[self.image_format]}"
+    
+    def get_size_tier(self) -> str:
+        """Уровень размера карты: заданный в настройках или по скорости загрузки"""
+        if self.size_tier in MAP_SIZE_TIERS:
+            return self.size_tier
+        if self._upload_speed is None:
+            return 'medium'
+        for tier, min_speed in TIER_MIN_UPLOAD_SPEED:
+            if self._upload_speed >= min_speed:
+                return tier
+        return 'low'
+    
+    def report_upload(self, size_bytes: int, seconds: float):
+        """
+        Учет времени загрузки карты в Telegram для выбора уровня размера
+        
+        Args:
+            size_bytes: размер отправленного изображения
+            seconds: время отправки
+        """
+        speed = size_bytes / max(seconds, 0.001)
+        if self._upload_speed is None:
+            self._upload_speed = speed
+        else:
+            self._upload_speed += UPLOAD_SPEED_SMOOTHING * (speed - self._upload_speed)
+    
+    async def remember_file_id(self, key: str, file_id: str):
+        """
+        Сохранение file_id, полученного от Telegram после отправки карты
+        
+        Дальше карта отправляется по file_id, поэтому ее файл удаляется.
+        """
+        await map_cache.set_file_id(key, file_id)
+        await self.remove_map_from_cache(self.map_filename(key))
+    
+    async def forget_file_id(self, key: str):
+        """Удаление file_id карты, который Telegram отклонил"""
+        await map_cache.forget_file_id(key)
     
     def get_map_url(self, lat: float, lon: float, zoom: int = None) -> str:
         """
@@ -253,7 +297,7 @@ class MapService:
         if zoom is None:
             zoom = self.zoom
         
-        return f"{self.base_url}?center={lat},{lon}&zoom={zoom}&size={self.width}x{self.height}&maptype=mapnik"
+        return f"https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map={zoom}/{lat}/{lon}"
     
     def calculate_optimal_zoom(self, pickup_lat: float, pickup_lon: float,
                                destination_lat: float = None, destination_lon: float = None) -> int:
@@ -288,9 +332,9 @@ class MapService:
         else:
             return 12  # Очень далеко
     
-    def save_map_to_cache(self, map_data: bytes, filename: str) -> str:
+    async def save_map_to_cache(self, map_data: bytes, filename: str) -> str:
         """
-        Сохранение карты в кэш
+        Сохранение карты в кэш (запись идет вне цикла событий)
         
         Args:
             map_data: данные карты
@@ -301,31 +345,80 @@ class MapService:
         """
         try:
             filepath = os.path.join(self.cache_dir, filename)
-            with open(filepath, 'wb') as f:
-                f.write(map_data)
+            await asyncio.to_thread(self._write_file, filepath, map_data)
             return filepath
         except Exception as e:
             logger.error(f"Ошибка сохранения карты в кэш: {e}")
             return ""
     
-    def clear_cache(self, max_age_hours: int = 24):
+    async def load_map_from_cache(self, filename: str) -> Optional[bytes]:
         """
-        Очистка старых файлов кэша
+        Загрузка карты из кэша (чтение идет вне цикла событий)
+        
+        Args:
+            filename: имя файла
+        
+        Returns:
+            Данные карты или None, если файла нет
+        """
+        filepath = os.path.join(self.cache_dir, filename)
+        try:
+            return await asyncio.to_thread(self._read_file, filepath)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка чтения карты из кэша: {e}")
+            return None
+    
+    async def remove_map_from_cache(self, filename: str):
+        """Удаление файла карты из кэша"""
+        try:
+            await asyncio.to_thread(os.remove, os.path.join(self.cache_dir, filename))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка удаления карты из кэша: {e}")
+    
+    @staticmethod
+    def _write_file(filepath: str, data: bytes):
+        """Запись файла (выполняется в потоке)"""
+        with open(filepath, 'wb') as f:
+            f.write(data)
+    
+    @staticmethod
+    def _read_file(filepath: str) -> bytes:
+        """Чтение файла (выполняется в потоке)"""
+        with open(filepath, 'rb') as f:
+            return f.read()
+    
+    async def clear_cache(self, max_age_hours: int = 24):
+        """
+        Очистка старых файлов кэша (вне цикла событий)
         
         Args:
             max_age_hours: максимальный возраст файлов в часах
         """
         try:
-            import time
-            current_time = time.time()
-            max_age_seconds = max_age_hours * 3600
-            
-            for filename in os.listdir(self.cache_dir):
-                filepath = os.path.join(self.cache_dir, filename)
-                if os.path.isfile(filepath):
-                    file_age = current_time - os.path.getmtime(filepath)
-                    if file_age > max_age_seconds:
-                        os.remove(filepath)
-                        logger.info(f"Удален старый файл кэша: {filename}")
+            removed = await asyncio.to_thread(self._remove_old_files, max_age_hours * 3600)
+            if removed:
+                logger.info(f"Удалено старых файлов кэша карт: {removed}")
         except Exception as e:
             logger.error(f"Ошибка очистки кэша: {e}")
+    
+    def _remove_old_files(self, max_age_seconds: float) -> int:
+        """Удаление файлов старше max_age_seconds, возвращает их количество"""
+        current_time = time.time()
+        removed = 0
+        for filename in os.listdir(self.cache_dir):
+            filepath = os.path.join(self.cache_dir, filename)
+            try:
+                if os.path.isfile(filepath) and current_time - os.path.getmtime(filepath) > max_age_seconds:
+                    os.remove(filepath)
+                    removed += 1
+            except FileNotFoundError:
+                # Файл уже удален после отправки карты
+                pass
+        return removed
+
+# Общий сервис карт процесса
+map_service = MapService()
@@ -0,0 +1,146 @@
+"""
+Кэш рассчитанных цен поездок Рай-Такси
+
+Рассчитанная цена (стоимость, расстояние, время в пути, file_id карты)
+живет QUOTE_TTL секунд. Ключ расчета - ячейки точек подачи и назначения,
+вид услуги, ставки действующего тарифа и коэффициент спроса, поэтому
+повторный ввод того же маршрута не пересчитывает маршрут, цену и карту,
+а смена тарифа по времени, дню недели или после правки сразу дает новый
+расчет. Каждому клиенту выдается своя котировка с коротким ID:
+подтверждение заказа создает заказ прямо по ней. Котировки живут только
+в памяти: если котировка устарела или бот перезапускался, цена
+пересчитывается по точкам, сохраненным в состоянии диалога.
+"""
+
+import secrets
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+
+from config import Config
+from utils.geocode_cache import LRUCache
+
+@dataclass(frozen=True)
+class FareQuote:
+    """Рассчитанная цена поездки"""
+    quote_id: str
+    user_id: int
+    service_type: str
+    pickup_lat: float
+    pickup_lon: float
+    pickup_address: Optional[str]
+    destination_lat: float
+    destination_lon: float
+    destination_address: Optional[str]
+    price: float
+    distance: float
+    duration: Optional[float]  # время в пути, мин
+    surge: float
+    tariff_rates: Tuple[float, float, float]  # посадка, за км, минимум
+    map_file_id: Optional[str] = None
+
+class QuoteCache:
+    """Котировки по ID и расчеты по маршруту"""
+    
+    def __init__(self, max_size: int = None, ttl: float = None):
+        """
+        Args:
+            max_size: максимум котировок в памяти
+            ttl: время жизни котировки в секундах
+        """
+        self.ttl = ttl if ttl is not None else Config.QUOTE_TTL
+        max_size = max_size or Config.QUOTE_CACHE_SIZE
+        # {ID: котировка} и {ключ маршрута: последняя котировка с этим расчетом}
+        self.quotes = LRUCache(max_size, self.ttl)
+        self.fares = LRUCache(max_size, self.ttl)
+        self._stats = {'hits': 0, 'misses': 0, 'issued': 0, 'expired': 0}
+    
+    @staticmethod
+    def make_key(service_type: str, pickup_lat: float, pickup_lon: float,
+                 destination_lat: float, destination_lon: float,
+                 tariff_rates: Tuple[float, float, float], surge: float) -> Tuple:
+        """Ключ расчета: ячейки точек (~10 м), услуга, ставки тарифа и спрос"""
+        precision = Config.MAP_CACHE_PRECISION
+        return (service_type,
+                round(pickup_lat, precision), round(pickup_lon, precision),
+                round(destination_lat, precision), round(destination_lon, precision),
+                tuple(tariff_rates), surge)
+    
+    def lookup(self, user_id: int, service_type: str,
+               pickup_lat: float, pickup_lon: float, pickup_address: Optional[str],
+               destination_lat: float, destination_lon: float, destination_address: Optional[str],
+               tariff_rates: Tuple[float, float, float], surge: float) -> Optional[FareQuote]:
+        """
+        Новая котировка из уже выполненного расчета того же маршрута
+        
+        Returns:
+            Котировка для клиента или None, если маршрут нужно рассчитать
+        """
+        key = self.make_key(service_type, pickup_lat, pickup_lon,
+                            destination_lat, destination_lon, tariff_rates, surge)
+        fare = self.fares.get(key)
+        if fare is None:
+            self._stats['misses'] += 1
+            return None
+        
+        self._stats['hits'] += 1
+        return self._issue(replace(
+            fare, user_id=user_id,
+            pickup_lat=pickup_lat, pickup_lon=pickup_lon, pickup_address=pickup_address,
+            destination_lat=destination_lat, destination_lon=destination_lon,
+            destination_address=destination_address
+        ))
+    
+    def store(self, user_id: int, service_type: str,
+              pickup_lat: float, pickup_lon: float, pickup_address: Optional[str],
+              destination_lat: float, destination_lon: float, destination_address: Optional[str],
+              price: float, distance: float, duration: Optional[float],
+              tariff_rates: Tuple[float, float, float], surge: float) -> FareQuote:
+        """Котировка по новому расчету"""
+        return self._issue(FareQuote(
+            '', user_id, service_type,
+            pickup_lat, pickup_lon, pickup_address,
+            destination_lat, destination_lon, destination_address,
+            price, distance, duration, surge, tuple(tariff_rates)
+        ))
+    
+    def _issue(self, quote: FareQuote) -> FareQuote:
+        """Выдача котировки с новым ID"""
+        quote = replace(quote, quote_id=secrets.token_urlsafe(6))
+        self._remember(quote)
+        self._stats['issued'] += 1
+        return quote
+    
+    def _remember(self, quote: FareQuote):
+        """Сохранение котировки по ID и ее расчета по ключу маршрута"""
+        self.quotes.set(quote.quote_id, quote)
+        self.fares.set(self.make_key(
+            quote.service_type, quote.pickup_lat, quote.pickup_lon,
+            quote.destination_lat, quote.destination_lon, quote.tariff_rates, quote.surge
+        ), quote)
+    
+    def attach_map(self, quote: FareQuote, file_id: str) -> FareQuote:
+        """Сохранение file_id отправленной с котировкой карты"""
+        quote = replace(quote, map_file_id=file_id)
+        self._remember(quote)
+        return quote
+    
+    def get(self, quote_id: str, user_id: int) -> Optional[FareQuote]:
+        """Действующая котировка клиента или None"""
+        quote = self.quotes.get(quote_id)
+        if quote is None or quote.user_id != user_id:
+            self._stats['expired'] += 1
+            return None
+        return quote
+    
+    def forget(self, quote_id: str):
+        """Удаление котировки (заказ по ней уже создан)"""
+        self.quotes.delete(quote_id)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        stats = dict(self._stats)
+        stats['quotes'] = len(self.quotes)
+        return stats
+
+# Общий кэш процесса
+quote_cache = QuoteCache()
@@ -1,12 +1,85 @@
 """
 Система защиты от спама для Рай-Такси
+
+Запросы считаются скользящими окнами на кольцах корзин фиксированного
+размера: минута - 60 корзин по секунде, час - 60 корзин по минуте.
+Проверка запроса - O(1), память на пользователя не зависит от частоты
+его запросов. Пользователи без запросов за окно удаляются понемногу при
+каждой проверке.
 """
 
 import time
-from typing import Dict, Tuple
-from collections import defaultdict
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from config import Config
 
+# Корзин в кольце скользящего окна
+WINDOW_SLOTS = 60
+
+# Сколько неактивных пользователей удаляется за одну проверку
+EVICTION_BATCH = 4
+
+class SlidingWindowCounter:
+    """Счетчик запросов за скользящее окно из WINDOW_SLOTS корзин"""
+    
+    __slots__ = ('counts', 'total', 'last_slot')
+    
+    def __init__(self, slot: int = 0):
+        """
+        Args:
+            slot: номер текущей корзины (время, деленное на ширину корзины)
+        """
+        self.counts = array('I', [0]) * WINDOW_SLOTS
+        self.total = 0
+        self.last_slot = slot
+    
+    def advance(self, slot: int):
+        """Сдвиг окна к корзине slot: вышедшие из окна корзины обнуляются"""
+        steps = slot - self.last_slot
+        if steps <= 0:
+            return
+        
+        if steps >= WINDOW_SLOTS:
+            self.counts = array('I', [0]) * WINDOW_SLOTS
+            self.total = 0
+        else:
+            for passed in range(self.last_slot + 1, slot + 1):
+                index = passed % WINDOW_SLOTS
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.last_slot = slot
+    
+    def add(self):
+        """Учет запроса в текущей корзине"""
+        self.counts[self.last_slot % WINDOW_SLOTS] += 1
+        self.total += 1
+    
+    def oldest_slot(self) -> Optional[int]:
+        """Самая старая непустая корзина окна"""
+        for slot in range(self.last_slot - WINDOW_SLOTS + 1, self.last_slot + 1):
+            if self.counts[slot % WINDOW_SLOTS]:
+                return slot
+        return None
+    
+    def is_idle(self, slot: int) -> bool:
+        """Нет ли запросов в окне, заканчивающемся корзиной slot"""
+        return self.total == 0 or slot - self.last_slot >= WINDOW_SLOTS
+
+class UserLimits:
+    """Счетчики запросов пользователя за минуту и за час"""
+    
+    __slots__ = ('minute', 'hour')
+    
+    def __init__(self, now: float):
+        self.minute = SlidingWindowCounter(int(now))
+        self.hour = SlidingWindowCounter(int(now // 60))
+    
+    def advance(self, now: float):
+        """Сдвиг окон к текущему времени"""
+        self.minute.advance(int(now))
+        self.hour.advance(int(now // 60))
+
 class RateLimiter:
     """Система ограничения количества запросов"""
     
@@ -14,12 +87,8 @@ class RateLimiter:
         self.requests_per_minute = Config.MAX_REQUESTS_PER_MINUTE
         self.requests_per_hour = Config.MAX_REQUESTS_PER_HOUR
         
-        # Хранилище запросов: {user_id: [(timestamp, action), ...]}
-        self.user_requests = defaultdict(list)
-        
-        # Очистка старых записей каждые 10 минут
-        self.last_cleanup = time.time()
-        self.cleanup_interval = 600
+        # Счетчики пользователей в порядке последнего запроса: {user_id: UserLimits}
+        self.users: 'OrderedDict[int, UserLimits]' = OrderedDict()
     
     def is_allowed(self, user_id: int, action: str = "default") -> Tuple[bool, str]:
         """
@@ -33,92 +102,75 @@ class RateLimiter:
             Tuple[разрешено, сообщение_об_ошибке]
         """
         current_time = time.time()
+        self._evict_idle(current_time)
         
-        # Периодическая очистка старых записей
-        if current_time - self.last_cleanup > self.cleanup_interval:
-            self._cleanup_old_requests()
-            self.last_cleanup = current_time
-        
-        # Получаем список запросов пользователя
-        user_requests = self.user_requests[user_id]
-        
-        # Удаляем старые записи (старше часа)
-        user_requests = [req for req in user_requests if current_time - req[0] < 3600]
-        self.user_requests[user_id] = user_requests
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserLimits(current_time)
+        else:
+            user.advance(current_time)
+            self.users.move_to_end(user_id)
         
         # Проверяем ограничение в минуту
-        minute_ago = current_time - 60
-        requests_last_minute = len([req for req in user_requests if req[0] > minute_ago])
-        
-        if requests_last_minute >= self.requests_per_minute:
+        if user.minute.total >= self.requests_per_minute:
             return False, f"Слишком много запросов в минуту. Подождите немного."
         
         # Проверяем ограничение в час
-        hour_ago = current_time - 3600
-        requests_last_hour = len([req for req in user_requests if req[0] > hour_ago])
-        
-        if requests_last_hour >= self.requests_per_hour:
+        if user.hour.total >= self.requests_per_hour:
             return False, f"Слишком много запросов в час. Подождите немного."
         
-        # Запрос разрешен, добавляем в историю
-        self.user_requests[user_id].append((current_time, action))
+        # Запрос разрешен, учитываем его
+        user.minute.add()
+        user.hour.add()
         
         return True, ""
     
-    def _cleanup_old_requests(self):
-        """Очистка старых записей"""
-        current_time = time.time()
-        cutoff_time = current_time - 3600  # Удаляем записи старше часа
-        
-        for user_id in list(self.user_requests.keys()):
-            self.user_requests[user_id] = [
-                req for req in self.user_requests[user_id] 
-                if req[0] > cutoff_time
-            ]
-            
-            # Удаляем пользователей без запросов
-            if not self.user_requests[user_id]:
-                del self.user_requests[user_id]
+    def _evict_idle(self, current_time: float):
+        """Удаление нескольких пользователей без запросов за последний час"""
+        hour_slot = int(current_time // 60)
+        for _ in range(EVICTION_BATCH):
+            if not self.users:
+                return
+            # Первым идет пользователь с самым давним запросом
+            user_id, user = next(iter(self.users.items()))
+            if not user.hour.is_idle(hour_slot):
+                return
+            del self.users[user_id]
     
     def get_user_stats(self, user_id: int) -> Dict:
         """Получение статистики пользователя"""
-        current_time = time.time()
-        user_requests = self.user_requests[user_id]
-        
-        minute_ago = current_time - 60
-        hour_ago = current_time - 3600
-        
-        requests_last_minute = len([req for req in user_requests if req[0] > minute_ago])
-        requests_last_hour = len([req for req in user_requests if req[0] > hour_ago])
+        requests_last_minute = requests_last_hour = 0
+        user = self.users.get(user_id)
+        if user is not None:
+            user.advance(time.time())
+            requests_last_minute = user.minute.total
+            requests_last_hour = user.hour.total
         
         return {
             'requests_last_minute': requests_last_minute,
             'requests_last_hour': requests_last_hour,
             'limit_per_minute': self.requests_per_minute,
             'limit_per_hour': self.requests_per_hour,
-            'can_make_request': requests_last_minute < self.requests_per_minute and 
+            'can_make_request': requests_last_minute < self.requests_per_minute and
                                requests_last_hour < self.requests_per_hour
         }
     
     def reset_user_limits(self, user_id: int):
         """Сброс ограничений для пользователя"""
-        if user_id in self.user_requests:
-            del self.user_requests[user_id]
+        self.users.pop(user_id, None)
     
     def get_system_stats(self) -> Dict:
         """Получение общей статистики системы"""
         current_time = time.time()
-        total_users = len(self.user_requests)
         
         # Подсчитываем общее количество запросов за последний час
         total_requests_last_hour = 0
-        for user_requests in self.user_requests.values():
-            hour_ago = current_time - 3600
-            requests_last_hour = len([req for req in user_requests if req[0] > hour_ago])
-            total_requests_last_hour += requests_last_hour
+        for user in self.users.values():
+            user.advance(current_time)
+            total_requests_last_hour += user.hour.total
         
         return {
-            'total_users': total_users,
+            'total_users': len(self.users),
             'total_requests_last_hour': total_requests_last_hour,
             'requests_per_minute_limit': self.requests_per_minute,
             'requests_per_hour_limit': self.requests_per_hour
@@ -137,25 +189,41 @@ class ActionRateLimiter:
         self.action_name = action_name
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests = defaultdict(list)
+        # Ширина корзины окна в секундах
+        self.slot_seconds = time_window / WINDOW_SLOTS
+        # Счетчики в порядке последнего запроса: {user_id: SlidingWindowCounter}
+        self.requests: 'OrderedDict[int, SlidingWindowCounter]' = OrderedDict()
     
     def is_allowed(self, user_id: int) -> Tuple[bool, str]:
         """Проверка разрешения для конкретного действия"""
         current_time = time.time()
-        cutoff_time = current_time - self.time_window
-        
-        # Очищаем старые записи
-        self.requests[user_id] = [
-            req for req in self.requests[user_id] if req > cutoff_time
-        ]
+        slot = int(current_time // self.slot_seconds)
+        
+        # Удаляем несколько пользователей без запросов за окно
+        for _ in range(EVICTION_BATCH):
+            if not self.requests:
+                break
+            idle_user_id, counter = next(iter(self.requests.items()))
+            if not counter.is_idle(slot):
+                break
+            del self.requests[idle_user_id]
+        
+        counter = self.requests.get(user_id)
+        if counter is None:
+            counter = self.requests[user_id] = SlidingWindowCounter(slot)
+        else:
+            counter.advance(slot)
+            self.requests.move_to_end(user_id)
         
         # Проверяем лимит
-        if len(self.requests[user_id]) >= self.max_requests:
-            remaining_time = self.time_window - (current_time - self.requests[user_id][0])
+        if counter.total >= self.max_requests:
+            # Самая старая корзина выйдет из окна через WINDOW_SLOTS корзин после своей
+            release_time = (counter.oldest_slot() + WINDOW_SLOTS) * self.slot_seconds
+            remaining_time = max(0.0, release_time - current_time)
             return False, f"Слишком много запросов {self.action_name}. Подождите {int(remaining_time)} сек."
         
         # Добавляем запрос
-        self.requests[user_id].append(current_time)
+        counter.add()
         return True, ""
 
 # Специализированные ограничители для разных действий